@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Manage the local artifact cache used by `qibuild make --artifact-cache`.
+* stats: display the number of entries, their size and the hit rate
+* prune: remove the least recently used entries
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import qibuild.artifact_cache
+from qisys import ui
+
+
+def configure_parser(parser):
+    """ Configure parser for this action. """
+    parser.add_argument("command", choices=["stats", "prune"])
+    parser.add_argument("--max-size", type=int, metavar="MB",
+                        help="prune: size to shrink the cache to, in megabytes. "
+                        "Defaults to $QIBUILD_ARTIFACT_CACHE_MAX_SIZE, or %i" %
+                        qibuild.artifact_cache.DEFAULT_MAX_SIZE)
+    parser.add_argument("--all", action="store_true",
+                        help="prune: remove every entry")
+
+
+def do(args):
+    """ Main entry point. """
+    artifact_cache = qibuild.artifact_cache.ArtifactCache()
+    if args.command == "stats":
+        show_stats(artifact_cache)
+    else:
+        max_size = args.max_size
+        if args.all:
+            max_size = 0
+        removed = artifact_cache.prune(max_size=max_size)
+        ui.info(ui.green, "Removed", ui.reset, ui.bold, len(removed),
+                ui.green, "entries from", ui.blue, artifact_cache.root)
+
+
+def show_stats(artifact_cache):
+    """ Display the statistics of the artifact cache """
+    entries = artifact_cache.get_entries()
+    total_size = sum(x[2] for x in entries)
+    stats = artifact_cache.read_stats()
+    lookups = stats["hits"] + stats["misses"]
+    ui.info(ui.green, "Artifact cache in", ui.blue, artifact_cache.root)
+    ui.info(ui.green, " * entries:", ui.reset, len(entries))
+    ui.info(ui.green, " * size:", ui.reset, "%.1f MB" % (total_size / 1024.0 / 1024.0),
+            "(max: %i MB)" % artifact_cache.max_size)
+    if lookups:
+        ui.info(ui.green, " * hits:", ui.reset, stats["hits"], "/", lookups,
+                "(%i%%)" % (100 * stats["hits"] // lookups))
+    else:
+        ui.info(ui.green, " * hits:", ui.reset, "none")
+    return entries
@@ -17,6 +17,12 @@ def configure_parser(parser):
     qibuild.parsers.cmake_configure_parser(parser)
     qibuild.parsers.cmake_build_parser(parser)
     qibuild.parsers.project_parser(parser)
+    group = parser.add_argument_group("configure options")
+    group.add_argument("--num-workers", "-J", dest="num_workers", type=int,
+                       help="Number of projects to be configured in parallel")
+    group.add_argument("--force", action="store_true", default=False,
+                       help="Run cmake even for the projects for which "
+                       "nothing changed since the last configure")
     if not parser.epilog:
         parser.epilog = ""
     parser.epilog += """
@@ -40,4 +46,6 @@ def do(args):
                             trace_cmake=args.trace_cmake,
                             profiling=args.profiling,
                             summarize_options=args.summarize_options,
-                            single=args.single)
+                            single=args.single,
+                            num_workers=args.num_workers,
+                            force=args.force)
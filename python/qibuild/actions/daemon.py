@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Run a daemon serving the read-only qibuild, qisrc and qitoolchain actions.
+
+While it is running, commands such as `qibuild find`, `qisrc status` or
+`qitoolchain info` are run by the daemon, which keeps the Python modules,
+the worktrees and the toolchains loaded.
+Set QI_NO_DAEMON=1 to run the commands in-process anyway.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import qisys.daemon
+import qisys.parsers
+from qisys import ui
+
+
+def configure_parser(parser):
+    """ Configure parser for this action """
+    qisys.parsers.default_parser(parser)
+    parser.add_argument("--stop", action="store_true",
+                        help="Stop the running daemon")
+
+
+def do(args):
+    """ Main entry point """
+    if args.stop:
+        if not qisys.daemon.stop():
+            ui.info("No qi daemon running")
+        return
+    qisys.daemon.serve()
@@ -28,6 +28,10 @@ def configure_parser(parser):
                        help="Also install tests")
     group.add_argument("--no-packages", action="store_false", dest="install_tc_packages",
                        help="Do not install packages from toolchain")
+    group.add_argument("--num-workers", "-J", dest="num_workers", type=int,
+                       help="Number of packages or projects to be installed in parallel. "
+                       "Set $QIBUILD_INSTALL_COPY_MODE to 'copy', 'reflink' (the default) "
+                       "or 'hardlink' to choose how the files of the packages are copied")
     parser.set_defaults(prefix="/", split_debug=False, dep_types="default",
                         install_tc_packages=True)
     if not parser.epilog:
@@ -60,5 +64,6 @@ def do(args):
     res = cmake_builder.install(dest_dir, prefix=args.prefix,
                                 split_debug=args.split_debug,
                                 components=components,
-                                install_tc_packages=args.install_tc_packages)
+                                install_tc_packages=args.install_tc_packages,
+                                num_workers=args.num_workers)
     return res
@@ -8,6 +8,9 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import qibuild.parsers
+import qibuild.build_log
+import qibuild.ninja_report
+import qibuild.artifact_cache
 from qisys import ui
 
 
@@ -22,15 +25,43 @@ def configure_parser(parser):
                        "cov-analysis installed on your machine.")
     group.add_argument("--num-workers", "-J", dest="num_workers", type=int,
                        help="Number of projects to be built in parallel")
+    group.add_argument("--artifact-cache", action="store_true", default=False,
+                       help="Restore the projects whose sources, dependencies and "
+                       "build settings did not change from the local artifact cache "
+                       "instead of building them. See `qibuild cache`")
+    group.add_argument("--trace-out", dest="trace_out", metavar="TRACE_JSON",
+                       help="Write the build timings of every project to TRACE_JSON, "
+                       "in the Chrome trace event format (see chrome://tracing "
+                       "or https://ui.perfetto.dev)")
+    group.add_argument("--ninja-report", dest="ninja_report", action="store_true",
+                       default=False,
+                       help="For projects using the Ninja generator, display the "
+                       "most expensive targets, the build time of each project and "
+                       "the files which triggered the rebuilds")
+    group.add_argument("--ninja-report-top", dest="ninja_report_top", type=int,
+                       default=10, metavar="N",
+                       help="Number of targets displayed by --ninja-report. Default: 10")
 
 
 @ui.timer("qibuild make")
 def do(args):
     """ Main entry point. """
     cmake_builder = qibuild.parsers.get_cmake_builder(args)
-    if args.num_workers:
-        cmake_builder.build_parallel(rebuild=args.rebuild,
-                                     coverity=args.coverity, num_workers=args.num_workers)
-    else:
-        cmake_builder.build(rebuild=args.rebuild,
-                            coverity=args.coverity)
+    if args.artifact_cache:
+        cmake_builder.artifact_cache = qibuild.artifact_cache.ArtifactCache()
+    build_args = dict(rebuild=args.rebuild, coverity=args.coverity)
+    ninja_report = None
+    if args.ninja_report:
+        ninja_report = qibuild.ninja_report.NinjaReport()
+        build_args["ninja_report"] = ninja_report
+    try:
+        if args.num_workers:
+            cmake_builder.build_parallel(num_workers=args.num_workers, **build_args)
+        else:
+            cmake_builder.build(**build_args)
+    finally:
+        if ninja_report:
+            ninja_report.display(top=args.ninja_report_top)
+        if args.trace_out:
+            qibuild.build_log.write_chrome_trace(args.trace_out, cmake_builder.build_log.runs)
+            ui.info(ui.green, "Build trace written to", ui.blue, args.trace_out)
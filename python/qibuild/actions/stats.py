@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Display the slowest projects and the critical path of the last runs
+of `qibuild configure`, `qibuild make` and `qibuild install`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import qisys.parsers
+import qibuild.parsers
+import qibuild.build_log
+from qisys import ui
+
+
+def configure_parser(parser):
+    """ Configure parser for this action. """
+    qisys.parsers.build_parser(parser)
+    parser.add_argument("--last", type=int, default=10, metavar="N",
+                        help="Only use the last N runs. Default: %(default)s")
+    parser.add_argument("--top", type=int, default=10, metavar="N",
+                        help="Number of projects to display. Default: %(default)s")
+    parser.add_argument("--phase", choices=["configure", "build", "install"],
+                        default="build",
+                        help="Step to display the timings of. Default: %(default)s")
+
+
+def do(args):
+    """ Main entry point. """
+    build_worktree = qibuild.parsers.get_build_worktree(args)
+    log_path = qibuild.build_log.get_log_path(build_worktree)
+    runs = qibuild.build_log.read_runs(log_path, last=args.last)
+    durations = qibuild.build_log.get_durations(runs, args.phase)
+    if not durations:
+        ui.info(ui.green, "No", args.phase, "timings found in", ui.blue, log_path)
+        return None
+    ui.info(ui.green, "Using the last", ui.reset, ui.bold, len(runs),
+            ui.green, "runs from", ui.blue, log_path)
+    averages = dict((name, sum(x) / len(x)) for (name, x) in durations.items())
+    ui.info(ui.green, "Slowest projects (%s):" % args.phase)
+    slowest = sorted(averages, key=lambda x: (-averages[x], x))[:args.top]
+    max_len = max(len(x) for x in slowest)
+    for name in slowest:
+        ui.info(ui.green, " *", ui.blue, name.ljust(max_len), ui.reset,
+                "%8.2fs" % averages[name],
+                "(max: %.2fs, %i runs)" % (max(durations[name]), len(durations[name])))
+    deps = dict()
+    for project in build_worktree.build_projects:
+        deps[project.name] = sorted(project.build_depends)
+    total, path = qibuild.build_log.get_critical_path(averages, deps)
+    ui.info(ui.green, "Critical path (%.2fs):" % total)
+    for name in path:
+        ui.info(ui.green, " *", ui.blue, name, ui.reset, "%.2fs" % averages.get(name, 0))
+    return total, path
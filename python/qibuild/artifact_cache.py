@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Local cache of the sdk directories produced by ``qibuild make``.
+
+Each entry is keyed by a hash of everything the build of a project
+depends on:
+
+* the git tree of the project sources (projects with local changes
+  are never cached)
+* the contents of its ``dependencies.cmake``
+* the CMake arguments, generator and build type
+* the names and versions of the toolchain packages
+* the keys of the projects it depends on
+* the path of its sdk directory, since generated CMake files
+  contain absolute paths
+
+When the key of a project is found in the cache, its sdk directory is
+restored and the project is not built.
+The least recently used entries are removed when the cache grows
+bigger than its maximum size.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import qisys.sh
+import qisrc.git
+from qisys import ui
+
+# In megabytes
+DEFAULT_MAX_SIZE = 10 * 1024
+
+
+def get_default_max_size():
+    """ Maximum size of the cache, in megabytes """
+    from_env = os.environ.get("QIBUILD_ARTIFACT_CACHE_MAX_SIZE")
+    if from_env:
+        return int(from_env)
+    return DEFAULT_MAX_SIZE
+
+
+def get_dir_size(path):
+    """ Total size of the files in a directory, in bytes """
+    res = 0
+    for root, _dirs, files in os.walk(path):
+        for filename in files:
+            full_path = os.path.join(root, filename)
+            if not os.path.islink(full_path):
+                res += os.path.getsize(full_path)
+    return res
+
+
+class ArtifactCache(object):
+    """
+    ArtifactCache Class
+
+    :param root: where to store the artifacts,
+                 ``~/.cache/qi/artifacts`` by default
+    :param max_size: maximum size of the cache, in megabytes
+    """
+
+    def __init__(self, root=None, max_size=None):
+        """ ArtifactCache Init """
+        if root is None:
+            root = qisys.sh.get_cache_path("qi", "artifacts")
+        if max_size is None:
+            max_size = get_default_max_size()
+        self.root = root
+        self.max_size = max_size
+        self.keys = dict()
+
+    @property
+    def stats_json(self):
+        """ Path to the file storing the hits and misses counters """
+        return os.path.join(self.root, "stats.json")
+
+    def compute_keys(self, build_worktree, projects):
+        """
+        Compute the key of every project.
+        Projects must be sorted in build order.
+        The key is None for projects which cannot be cached.
+        """
+        toolchain = build_worktree.toolchain
+        packages = list()
+        if toolchain:
+            packages = [(x.name, x.version) for x in toolchain.packages]
+        project_names = set(x.name for x in build_worktree.build_projects)
+        for project in projects:
+            # the keys of the direct dependencies already depend on
+            # the indirect ones
+            dep_keys = [self.keys.get(x) for x in sorted(project.build_depends)
+                        if x in project_names]
+            if None in dep_keys:
+                ui.debug("Not caching", project.name, ": a dependency cannot be cached")
+                self.keys[project.name] = None
+                continue
+            self.keys[project.name] = self._compute_key(project, packages, dep_keys)
+        return self.keys
+
+    @staticmethod
+    def _compute_key(project, packages, dep_keys):
+        """ Compute the key of a single project """
+        git = qisrc.git.Git(project.path)
+        rc, tree = git.call("rev-parse", "HEAD:./", raises=False)
+        if rc != 0:
+            ui.debug("Not caching", project.name, ": not in a git repository")
+            return None
+        # build directories may be inside the sources
+        rc, status = git.call("status", "--porcelain", "--", ".", ":(exclude)build-*",
+                              raises=False)
+        if rc != 0 or status:
+            ui.debug("Not caching", project.name, ": sources have local changes")
+            return None
+        dep_cmake = os.path.join(project.build_directory, "dependencies.cmake")
+        if not os.path.exists(dep_cmake):
+            return None
+        with open(dep_cmake, "r") as fp:
+            dep_cmake_contents = fp.read()
+        to_hash = {
+            "name": project.name,
+            "tree": tree,
+            "dependencies.cmake": dep_cmake_contents,
+            "cmake_args": project.cmake_args,
+            "cmake_generator": project.cmake_generator,
+            "build_type": project.build_type,
+            "packages": packages,
+            "deps": dep_keys,
+            "sdk_directory": project.sdk_directory,
+        }
+        as_json = json.dumps(to_hash, sort_keys=True)
+        return hashlib.sha1(as_json.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        """ Entry Path """
+        return os.path.join(self.root, key)
+
+    def restore(self, project):
+        """
+        Restore the sdk directory of the project if it is in the cache.
+        Return True on cache hit.
+        """
+        key = self.keys.get(project.name)
+        if not key:
+            return False
+        entry = self._entry_path(key)
+        cached_sdk = os.path.join(entry, "sdk")
+        if not os.path.isdir(cached_sdk):
+            self._update_stats(misses=1)
+            return False
+        ui.info(ui.green, "Restoring", ui.blue, project.name, ui.green, "from the artifact cache")
+        # path.conf lists the sdk dirs of the whole worktree, keep it
+        path_conf = os.path.join(project.sdk_directory, "share", "qi", "path.conf")
+        path_conf_contents = None
+        if os.path.exists(path_conf):
+            with open(path_conf, "r") as fp:
+                path_conf_contents = fp.read()
+        qisys.sh.rm(project.sdk_directory)
+        shutil.copytree(cached_sdk, project.sdk_directory, symlinks=True)
+        if path_conf_contents is not None:
+            qisys.sh.mkdir(os.path.dirname(path_conf), recursive=True)
+            with open(path_conf, "w") as fp:
+                fp.write(path_conf_contents)
+        # mark the entry as recently used
+        os.utime(entry, None)
+        self._update_stats(hits=1)
+        return True
+
+    def store(self, project):
+        """ Store the sdk directory of the project in the cache """
+        key = self.keys.get(project.name)
+        if not key or not os.path.isdir(project.sdk_directory):
+            return
+        entry = self._entry_path(key)
+        if os.path.isdir(entry):
+            os.utime(entry, None)
+            return
+        ui.debug("Storing", project.name, "in the artifact cache as", key)
+        tmp_entry = entry + ".tmp-%i" % os.getpid()
+        qisys.sh.rm(tmp_entry)
+        shutil.copytree(project.sdk_directory, os.path.join(tmp_entry, "sdk"),
+                        symlinks=True, ignore=shutil.ignore_patterns("path.conf"))
+        with open(os.path.join(tmp_entry, "info.json"), "w") as fp:
+            json.dump({"project": project.name, "date": time.time()}, fp, indent=2)
+        try:
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Stored in the meantime by an other process
+            qisys.sh.rm(tmp_entry)
+
+    def get_entries(self):
+        """
+        Return a list of (key, project name, size in bytes, last use)
+        for every entry, the most recently used first.
+        """
+        res = list()
+        if not os.path.isdir(self.root):
+            return res
+        for key in os.listdir(self.root):
+            entry = self._entry_path(key)
+            info_json = os.path.join(entry, "info.json")
+            if not os.path.exists(info_json):
+                continue
+            with open(info_json, "r") as fp:
+                info = json.load(fp)
+            res.append((key, info.get("project"), get_dir_size(entry),
+                        os.path.getmtime(entry)))
+        res.sort(key=lambda x: x[3], reverse=True)
+        return res
+
+    def prune(self, max_size=None):
+        """
+        Remove the least recently used entries until the cache is
+        smaller than max_size (in megabytes).
+        Return the list of removed keys.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        max_bytes = max_size * 1024 * 1024
+        removed = list()
+        total = 0
+        for (key, name, size, _last_use) in self.get_entries():
+            total += size
+            if total > max_bytes:
+                ui.debug("Removing", name, "from the artifact cache")
+                qisys.sh.rm(self._entry_path(key))
+                removed.append(key)
+        return removed
+
+    def read_stats(self):
+        """ Return the number of hits and misses """
+        res = {"hits": 0, "misses": 0}
+        if os.path.exists(self.stats_json):
+            try:
+                with open(self.stats_json, "r") as fp:
+                    res.update(json.load(fp))
+            except ValueError:
+                pass
+        return res
+
+    def _update_stats(self, hits=0, misses=0):
+        """ Update the hits and misses counters """
+        stats = self.read_stats()
+        stats["hits"] += hits
+        stats["misses"] += misses
+        qisys.sh.mkdir(self.root, recursive=True)
+        with open(self.stats_json, "w") as fp:
+            json.dump(stats, fp, indent=2)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Timing telemetry of the configure, build and install steps.
+
+Every call to :py:class:`qibuild.cmake_builder.CMakeBuilder` methods
+is recorded as a "run", containing one event per project and per step
+(project name, step, worker index, start and end timestamps, status).
+
+Runs are appended to ``.qi/<config>/build_log.jsonl``, one JSON
+object per line, and can be exported to the Chrome trace event format,
+to be displayed by chrome://tracing or https://ui.perfetto.dev
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import json
+import time
+import threading
+import contextlib
+
+import qisys.sh
+import qisys.sort
+from qisys import ui
+
+# Number of runs kept in the log
+MAX_RUNS = 100
+
+
+def get_log_path(build_worktree):
+    """ Path to the build log of the active build config """
+    subdir = build_worktree.build_config.build_directory(prefix="")
+    return os.path.join(build_worktree.dot_qi, subdir, "build_log.jsonl")
+
+
+def read_runs(path, last=None):
+    """ Read the runs stored in path, the oldest first """
+    runs = list()
+    if not os.path.exists(path):
+        return runs
+    with open(path, "r") as fp:
+        for line in fp:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                runs.append(json.loads(line))
+            except ValueError:
+                ui.debug("Ignoring invalid line in", path)
+    if last:
+        runs = runs[-last:]
+    return runs
+
+
+def append_run(path, run):
+    """ Append a run to the log in path, keeping the last MAX_RUNS runs """
+    runs = read_runs(path)
+    runs.append(run)
+    qisys.sh.mkdir(os.path.dirname(path), recursive=True)
+    with open(path, "w") as fp:
+        for run in runs[-MAX_RUNS:]:
+            fp.write(json.dumps(run, sort_keys=True))
+            fp.write("\n")
+
+
+def to_chrome_trace(runs):
+    """
+    Convert runs to the Chrome trace event format:
+    one process per run, one thread per worker
+    """
+    events = list()
+    if not runs:
+        return {"traceEvents": events}
+    origin = min(run["start"] for run in runs)
+    for pid, run in enumerate(runs):
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                       "args": {"name": "qibuild %s" % run["command"]}})
+        workers = set()
+        for event in run["events"]:
+            worker = event.get("worker", 0)
+            if worker not in workers:
+                workers.add(worker)
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": worker,
+                               "args": {"name": "worker #%i" % (worker + 1)}})
+            events.append({
+                "name": event["project"],
+                "cat": event["phase"],
+                "ph": "X",
+                "pid": pid,
+                "tid": worker,
+                "ts": int((event["start"] - origin) * 1e6),
+                "dur": int((event["end"] - event["start"]) * 1e6),
+                "args": {"phase": event["phase"], "status": event["status"]},
+            })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(path, runs):
+    """ Write the runs to path, in the Chrome trace event format """
+    with open(path, "w") as fp:
+        json.dump(to_chrome_trace(runs), fp, indent=1)
+
+
+def get_durations(runs, phase):
+    """ Return a dict project name -> list of the durations of the given phase """
+    res = dict()
+    for run in runs:
+        for event in run["events"]:
+            if event["phase"] != phase or event["status"] != "ok":
+                continue
+            res.setdefault(event["project"], list()).append(event["end"] - event["start"])
+    return res
+
+
+def get_last_durations(runs, phase):
+    """
+    Return a dict project name -> duration of the given phase, the last
+    time it succeeded. Used to compute the critical path of the next build
+    """
+    return dict((name, durations[-1]) for (name, durations) in get_durations(runs, phase).items())
+
+
+def get_critical_path(durations, deps):
+    """
+    Return the longest chain of dependent projects, as a tuple
+    (total duration, list of names, the dependencies first)
+
+    :param durations: a dict name -> duration
+    :param deps: a dict name -> names of the dependencies
+    """
+    # (length of the longest chain ending with the node, previous node)
+    best = dict()
+    for name in qisys.sort.topological_sort(deps, sorted(durations)):
+        previous = None
+        length = 0
+        for dep in deps.get(name, ()):
+            if dep in best and best[dep][0] > length:
+                length, previous = best[dep][0], dep
+        best[name] = (length + durations.get(name, 0), previous)
+    if not best:
+        return 0, list()
+    last = max(sorted(best), key=lambda x: best[x][0])
+    total = best[last][0]
+    path = list()
+    while last is not None:
+        path.insert(0, last)
+        last = best[last][1]
+    return total, path
+
+
+class BuildLog(object):
+    """
+    BuildLog Class
+
+    Record the events of the current run. Thread-safe, so that the
+    workers of a :py:class:`qibuild.parallel_builder.ParallelBuilder`
+    can record their own events.
+    """
+
+    def __init__(self):
+        """ BuildLog Init """
+        # the runs recorded by this object, the oldest first
+        self.runs = list()
+        self._current = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def run(self, command, path):
+        """
+        To be used in a "with" statement, the run is appended to
+        the log in path at the end of the block.
+        Nested calls are recorded as part of the outer run.
+        """
+        if self._current is not None:
+            yield self._current
+            return
+        run = {"command": command, "start": time.time(), "status": "ok", "events": list()}
+        self._current = run
+        try:
+            yield run
+        except Exception:
+            run["status"] = "failed"
+            raise
+        finally:
+            run["end"] = time.time()
+            self._current = None
+            self.runs.append(run)
+            try:
+                append_run(path, run)
+            except (IOError, OSError) as e:
+                ui.warning("Could not write build log to", path, e)
+
+    def record(self, project, phase, start, end, worker=0, status="ok"):
+        """ Record an event in the current run """
+        with self._lock:
+            if self._current is None:
+                return
+            self._current["events"].append({
+                "project": project,
+                "phase": phase,
+                "worker": worker,
+                "start": start,
+                "end": end,
+                "status": status,
+            })
+
+    @contextlib.contextmanager
+    def measure(self, project, phase, worker=0):
+        """ Record the duration of the block as an event of the current run """
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            self.record(project, phase, start, time.time(), worker=worker, status="failed")
+            raise
+        self.record(project, phase, start, time.time(), worker=worker)
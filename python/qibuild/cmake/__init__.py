@@ -95,7 +95,7 @@ def get_cached_var(build_dir, var, default=None):
 
 def cmake(source_dir, build_dir, cmake_args, env=None,
           clean_first=True, profiling=False, debug_trycompile=False,
-          trace_cmake=False, summarize_options=False):
+          trace_cmake=False, summarize_options=False, buffer_output=False):
     """
     Call cmake with from a build dir for a source dir.
     cmake_args are added on the command line.
@@ -103,6 +103,9 @@ def cmake(source_dir, build_dir, cmake_args, env=None,
                 ``os.environ`` will remain unchanged
     :param clean_first: Clean the cmake cache
     :param summarize_options: Whether to call :py:func:`display_options` at the end
+    :param buffer_output: Do not print the output of ``cmake`` but return it
+                          (it is also stored in the ``stdout`` attribute of the
+                          exception raised when ``cmake`` fails)
     For qibuild/CMake hackers:
     :param profiling: Profile CMake executions
     :param debug_trycompile: Call ``cmake`` with ``--debug-trycompile``
@@ -136,10 +139,17 @@ def cmake(source_dir, build_dir, cmake_args, env=None,
     # the current working dir.
     cmake_args += [source_dir]
     if not profiling and not trace_cmake:
-        qisys.command.call(["cmake"] + cmake_args, cwd=build_dir, env=env)
+        output = None
+        if buffer_output:
+            output = qisys.command.check_output(["cmake"] + cmake_args, cwd=build_dir, env=env,
+                                                stderr=subprocess.STDOUT)
+            if isinstance(output, bytes):
+                output = output.decode("utf-8", "replace")
+        else:
+            qisys.command.call(["cmake"] + cmake_args, cwd=build_dir, env=env)
         if summarize_options:
             display_options(build_dir)
-        return
+        return output
     cmake_log = os.path.join(build_dir, "cmake.log")
     fp = open(cmake_log, "w")
     if profiling:
@@ -12,6 +12,7 @@ import sys
 import hashlib
 import operator
 import functools
+from multiprocessing.pool import ThreadPool
 
 import qisys.sh
 import qisys.remote
@@ -19,8 +20,36 @@ from qisys import ui
 from qisys.abstractbuilder import AbstractBuilder
 import qibuild.deps
 import qibuild.deploy
+import qibuild.jobserver
+import qibuild.build_log
 from qibuild.project import write_qi_path_conf
-from qibuild.parallel_builder import ParallelBuilder
+from qibuild.parallel_builder import ParallelBuilder, ConfigureJob
+
+
+def get_install_copy_mode():
+    """
+    How the files of the packages are copied by install(),
+    read from $QIBUILD_INSTALL_COPY_MODE. See :py:class:`qisys.sh.FileCopier`
+    """
+    return os.environ.get("QIBUILD_INSTALL_COPY_MODE", "reflink")
+
+
+def is_lib_to_deduplicate(path):
+    """ Whether path is a shared library which can be replaced by a symlink """
+    return os.path.basename(os.path.dirname(path)) == "lib" and \
+        ".so" in os.path.basename(path) and not os.path.islink(path)
+
+
+def run_in_parallel(func, items, num_workers=1):
+    """ Return [func(x) for x in items], with up to num_workers calls at the same time """
+    if num_workers <= 1 or len(items) <= 1:
+        return [func(x) for x in items]
+    pool = ThreadPool(min(num_workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def md5_checksum(file_path):
@@ -54,6 +83,11 @@ class CMakeBuilder(AbstractBuilder):
             self.projects = projects
         self.deps_solver = qibuild.deps.DepsSolver(build_worktree)
         self.dep_types = ["build", "runtime", "test"]
+        # a qibuild.artifact_cache.ArtifactCache, if set, used by build()
+        # and build_parallel() to skip the build of unchanged projects
+        self.artifact_cache = None
+        # timings of the configure, build and install steps
+        self.build_log = qibuild.build_log.BuildLog()
 
     @property
     def dep_types(self):
@@ -80,6 +114,28 @@ class CMakeBuilder(AbstractBuilder):
         """ The :py:class:`.Toolchain` to use when building """
         return self.build_config.toolchain
 
+    @property
+    def build_log_jsonl(self):
+        """ Path to the file storing the timings of the last runs """
+        return qibuild.build_log.get_log_path(self.build_worktree)
+
+    def get_durations(self, phase):
+        """ The last durations of the given phase for each project, read from the build log """
+        runs = qibuild.build_log.read_runs(self.build_log_jsonl)
+        return qibuild.build_log.get_last_durations(runs, phase)
+
+    def log_run(command):
+        """ Decorator recording the timings of the projects in the build log """
+        def decorator(func):
+            """ Decorator """
+            @functools.wraps(func)
+            def new_func(self, *args, **kwargs):
+                """ Function Wrapper """
+                with self.build_log.run(command, self.build_log_jsonl):
+                    return func(self, *args, **kwargs)
+            return new_func
+        return decorator
+
     def need_configure(func):
         """ Decorator for every function that expects a build directory to exist. """
         @functools.wraps(func)
@@ -175,8 +231,15 @@ Or configure the project with no config
         paths.extend([package.path for package in packages])
         project.fix_shared_libs(paths)
 
+    @log_run("configure")
     def configure(self, *args, **kwargs):
-        """ Configure the projects in the correct order. """
+        """
+        Configure the projects in the correct order.
+        When ``num_workers`` is greater than 1, independent projects
+        are configured in parallel.
+        Projects for which nothing changed since their last successful
+        configure are skipped, unless ``force`` is True.
+        """
         self.bootstrap_projects()
         if kwargs.get("single"):
             projects = self.projects
@@ -185,17 +248,47 @@ Or configure the project with no config
                                                          ["build", "runtime", "test"])
         # Make sure to not pass the 'single' option to project.configure()
         kwargs.pop("single", None)
+        num_workers = kwargs.pop("num_workers", None) or 1
+        # the user wants to see cmake running in these cases
+        debug_options = ["profiling", "trace_cmake", "debug_trycompile", "summarize_options"]
+        if any(kwargs.get(x) for x in debug_options):
+            kwargs["force"] = True
+        # cmake output cannot be buffered when profiling or tracing
+        if num_workers > 1 and not kwargs.get("profiling") and not kwargs.get("trace_cmake"):
+            self.configure_parallel(projects, num_workers, **kwargs)
+            return
+        force = kwargs.pop("force", False)
         for i, project in enumerate(projects):
+            # checked right before configuring, since the fingerprint
+            # depends on the configure of the dependencies
+            if not force and project.is_configure_up_to_date():
+                ui.info_count(i, len(projects),
+                              ui.green, "Reusing configuration of",
+                              ui.blue, project.name)
+                continue
             ui.info_count(i, len(projects),
                           ui.green, "Configuring",
                           ui.blue, project.name)
-            project.configure(**kwargs)
+            with self.build_log.measure(project.name, "configure"):
+                project.configure(**kwargs)
 
+    def configure_parallel(self, projects, num_workers, **kwargs):
+        """ Configure the projects, up to num_workers at the same time """
+        parallel_builder = ParallelBuilder(durations=self.get_durations("configure"),
+                                           job_class=ConfigureJob, build_log=self.build_log)
+        parallel_builder.prepare_build_jobs(projects)
+        parallel_builder.build(num_workers=num_workers, **kwargs)
+
+    @log_run("make")
     @need_configure
     def build(self, *args, **kwargs):
         """ Build the projects in the correct order. """
         projects = self.deps_solver.get_dep_projects(self.projects, self.dep_types)
+        if self.artifact_cache:
+            self.artifact_cache.compute_keys(self.build_worktree, projects)
         for i, project in enumerate(projects):
+            if self._restore_from_cache(project, **kwargs):
+                continue
             ui.info_count(i, len(projects),
                           ui.green, "Building",
                           ui.blue, project.name,
@@ -203,22 +296,62 @@ Or configure the project with no config
                           ui.blue, project.build_type,
                           update_title=True)
             self.pre_build(project)
-            project.build(**kwargs)
+            with self.build_log.measure(project.name, "build"):
+                project.build(**kwargs)
+            if self.artifact_cache:
+                self.artifact_cache.store(project)
+        if self.artifact_cache:
+            self.artifact_cache.prune()
 
+    @log_run("make")
     def build_parallel(self, *args, **kwargs):
         """ Build the projects (in parallel) in the correct order. """
         projects = self.deps_solver.get_dep_projects(self.projects, self.dep_types)
+        if self.artifact_cache:
+            self.artifact_cache.compute_keys(self.build_worktree, projects)
+            # restored projects are not built, the parallel builder
+            # ignores the dependencies on them
+            projects = [x for x in projects if not self._restore_from_cache(x, **kwargs)]
         # do the prebuild step here (it is fast enough)
         for project in projects:
             self.pre_build(project)
-        parallel_builder = ParallelBuilder()
+        parallel_builder = ParallelBuilder(durations=self.get_durations("build"),
+                                           build_log=self.build_log)
         parallel_builder.prepare_build_jobs(projects)
-        parallel_builder.build(*args, **kwargs)
+        job_server = None
+        if qibuild.jobserver.is_supported():
+            # share a single -j budget between all the workers
+            num_jobs = self.build_config.num_jobs or qibuild.jobserver.default_num_jobs()
+            job_server = qibuild.jobserver.JobServer(num_jobs,
+                                                     num_workers=kwargs.get("num_workers", 1))
+            job_server.start()
+            kwargs["job_server"] = job_server
+        try:
+            parallel_builder.build(*args, **kwargs)
+        finally:
+            if job_server:
+                job_server.stop()
+            if self.artifact_cache:
+                for project in parallel_builder.built_projects:
+                    self.artifact_cache.store(project)
+                self.artifact_cache.prune()
+
+    def _restore_from_cache(self, project, rebuild=False, **_kwargs):
+        """ Restore the project from the artifact cache, return True on success """
+        if not self.artifact_cache or rebuild:
+            return False
+        return self.artifact_cache.restore(project)
 
+    @log_run("install")
     @need_configure
     def install(self, dest, *args, **kwargs):
-        """ Install the projects and the packages to the dest dir """
+        """
+        Install the projects and the packages to the dest dir.
+        Up to ``num_workers`` packages, then projects, are installed
+        at the same time.
+        """
         installed = list()
+        num_workers = kwargs.pop("num_workers", None) or 1
         projects = self.deps_solver.get_dep_projects(self.projects, self.dep_types)
         packages = self.deps_solver.get_dep_packages(self.projects, self.dep_types)
         if "install_tc_packages" in kwargs:
@@ -246,15 +379,47 @@ Or configure the project with no config
                 ui.info(ui.green, "(runtime components only)")
             build_type = projects[0].build_type
         release = build_type == "Release"
-        if packages:
-            ui.info(ui.green, ":: Installing packages")
-        for i, package in enumerate(packages):
+        replace_dup_lib_simlinks = True
+        if sys.platform.startswith("win"):
+            replace_dup_lib_simlinks = False
+        elif os.environ.get('QIBUILD_DONT_OPTIMIZE_PKG_SIZE'):
+            replace_dup_lib_simlinks = False
+        # the checksums of the libraries are computed while they are copied
+        copier = qisys.sh.FileCopier(
+            mode=get_install_copy_mode(),
+            fingerprint_filter=is_lib_to_deduplicate if replace_dup_lib_simlinks else None)
+
+        def install_package(args):
+            """ Install one package """
+            i, package = args
             ui.info_count(i, len(packages),
                           ui.green, "Installing", ui.blue, package.name,
                           ui.green, "to", ui.blue, dest,
                           update_title=True)
-            files = package.install(real_dest, components=components,
-                                    release=release)
+            with self.build_log.measure(package.name, "install"):
+                return package.install(real_dest, components=components,
+                                       release=release, copier=copier)
+
+        def install_project(args):
+            """ Install one project """
+            i, project = args
+            ui.info_count(i, len(projects),
+                          ui.green, "Installing", ui.blue, project.name,
+                          ui.green, "to", ui.blue, dest,
+                          update_title=True)
+            with self.build_log.measure(project.name, "install"):
+                files = project.install(dest, **kwargs)
+            if replace_dup_lib_simlinks:
+                # files installed by cmake, hashed by the worker
+                for fic in files:
+                    full_path = os.path.join(dest, fic)
+                    if is_lib_to_deduplicate(full_path):
+                        copier.add_fingerprint(full_path)
+            return files
+
+        if packages:
+            ui.info(ui.green, ":: Installing packages")
+        for files in run_in_parallel(install_package, list(enumerate(packages)), num_workers):
             installed.extend(files)
         # Remove qitest.json so that we don't append tests twice
         # when running qibuild install --with-tests twice
@@ -262,27 +427,19 @@ Or configure the project with no config
         qisys.sh.rm(qitest_json)
         if projects:
             ui.info(ui.green, ":: Installing projects")
-            for i, project in enumerate(projects):
-                ui.info_count(i, len(projects),
-                              ui.green, "Installing", ui.blue, project.name,
-                              ui.green, "to", ui.blue, dest,
-                              update_title=True)
-                files = project.install(dest, **kwargs)
+            for files in run_in_parallel(install_project, list(enumerate(projects)), num_workers):
                 installed.extend(files)
-        replace_dup_lib_simlinks = True
-        if sys.platform.startswith("win"):
-            replace_dup_lib_simlinks = False
-        elif os.environ.get('QIBUILD_DONT_OPTIMIZE_PKG_SIZE'):
-            replace_dup_lib_simlinks = False
         return self.post_install(
             dest,
             installed,
             replace_duplicated_lib_by_symlink=replace_dup_lib_simlinks,
-            remove_python_bytecode=not os.environ.get("QIBUILD_KEEP_PYTHON_BYTECODE")
+            remove_python_bytecode=not os.environ.get("QIBUILD_KEEP_PYTHON_BYTECODE"),
+            fingerprints=copier.fingerprints
         )
 
     @staticmethod
-    def post_install(dest, installed, replace_duplicated_lib_by_symlink=False, remove_python_bytecode=False):
+    def post_install(dest, installed, replace_duplicated_lib_by_symlink=False, remove_python_bytecode=False,
+                     fingerprints=None):
         """
         Run post install optimizations like:
             - replace duplicated libs by a symlink
@@ -291,6 +448,8 @@ Or configure the project with no config
         :param list installed: List on installed files (path is relative to installation directory
         :param bool replace_duplicated_lib_by_symlink: If False, skip the symlink optimization
         :param bool remove_python_bytecode: If False, skrip the python bytecode removal
+        :param dict fingerprints: md5 checksums of the libraries (full path -> checksum)
+                                  computed while installing them
         """
         ui.info("Post install step")
         if replace_duplicated_lib_by_symlink and sys.platform.startswith("win"):
@@ -302,7 +461,11 @@ Or configure the project with no config
             full_path = os.path.join(dest, fic)
             if replace_duplicated_lib_by_symlink and os.path.split(fic)[0] == 'lib' and '.so' in os.path.basename(fic)\
                     and not os.path.islink(full_path):
-                fingerprint = md5_checksum(full_path)
+                fingerprint = None
+                if fingerprints:
+                    fingerprint = fingerprints.get(full_path)
+                if not fingerprint:
+                    fingerprint = md5_checksum(full_path)
                 if fingerprint not in duplicated:
                     duplicated[fingerprint] = set()
                 duplicated[fingerprint].add(fic)
@@ -13,6 +13,7 @@ import operator
 
 import qisys.sh
 import qisys.qixml
+import qisys.daemon
 import qisys.envsetter
 from qisys import ui
 from qisys.qixml import etree
@@ -24,6 +25,15 @@ def get_global_cfg_path():
     return qisys.sh.get_config_path("qi", "qibuild.xml")
 
 
+def parse_cfg(cfg_path):
+    """
+    Parse a qibuild.xml file. The tree is kept by a qi daemon, so it
+    is never modified: write() builds a new one
+    """
+    return qisys.daemon.cached(("qibuild_xml", cfg_path), [cfg_path],
+                               lambda: etree.parse(cfg_path))
+
+
 class Env(object):
     """ Env Class """
 
@@ -521,7 +531,7 @@ class QiBuildConfig(object):
                     fp.write('<qibuild />\n')
         ui.debug("Reading config from", cfg_path)
         try:
-            self.tree.parse(cfg_path)
+            self.tree = parse_cfg(cfg_path)
         except Exception as e:
             mess = "Could not parse config from %s\n" % cfg_path
             mess += "Error was: %s" % str(e)
@@ -567,7 +577,7 @@ class QiBuildConfig(object):
 
     def read_local_config(self, local_xml_path):
         """ Apply a local configuration. """
-        local_tree = etree.parse(local_xml_path)
+        local_tree = parse_cfg(local_xml_path)
         self.local.parse(local_tree)
         default_config = self.local.defaults.config
         if default_config:
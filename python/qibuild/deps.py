@@ -7,12 +7,19 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import os
+import json
 import six
 
+import qisys.sh
 import qisys.sort
+from qisys import ui
 from qisys.qixml import etree
 
 
+DEP_TYPES = ["build", "runtime", "test"]
+
+
 class DepsSolver(object):
     """ Solve dependencies across projects in a build worktree and packages in a toolchain. """
 
@@ -20,6 +27,11 @@ class DepsSolver(object):
         """ DepsSolver Init """
         self.build_worktree = build_worktree
 
+    @property
+    def graph(self):
+        """ The :py:class:`DepsGraph` of the build worktree """
+        return self.build_worktree.deps_graph
+
     def get_dep_projects(self, projects, dep_types, reverse=False):
         """
         Solve the dependencies of the list of projects
@@ -44,19 +56,19 @@ class DepsSolver(object):
                 (``["build"]``, ``["runtime", "test"]``, etc.)
         :return: a list of packages in the build worktree's toolchain
         """
-        sorted_names = self._get_sorted_names(projects, dep_types)
         toolchain = self.build_worktree.toolchain
         if not toolchain:
             return list()
-        build_project_names = [x.name for x in
-                               self.build_worktree.build_projects]
-        dep_packages = list()
-        for name in sorted_names:
-            dep_package = toolchain.get_package(name, raises=False)
-            if dep_package:
-                dep_packages.append(dep_package)
-        res = toolchain.solve_deps(dep_packages, dep_types=dep_types)
-        res = [p for p in res if p.name not in build_project_names]
+        sorted_names = self._get_sorted_names(projects, dep_types)
+        graph = self.graph
+        package_names = [x for x in sorted_names if x in graph.package_deps]
+        res = list()
+        for name in graph.get_sorted_package_names(package_names, dep_types):
+            if name in graph.project_deps:
+                continue
+            package = toolchain.get_package(name, raises=False)
+            if package:
+                res.append(package)
         return res
 
     def get_sdk_dirs(self, project, dep_types):
@@ -89,31 +101,147 @@ class DepsSolver(object):
 
     def _get_sorted_names(self, projects, dep_types, reverse=False):
         """ Helper for get_dep_* functions. """
+        names = [x.name for x in projects]
         if reverse:
-            reverse_deps = set()
-            for project in self.build_worktree.build_projects:
-                if "build" in dep_types:
-                    if any(x.name in project.build_depends for x in projects):
-                        reverse_deps.add(project.name)
-                if "runtime" in dep_types:
-                    if any(x.name in project.run_depends for x in projects):
-                        reverse_deps.add(project.name)
-                if "test" in dep_types:
-                    if any(x.name in project.test_depends for x in projects):
-                        reverse_deps.add(project.name)
-            return sorted(list(reverse_deps))
-        to_sort = dict()
-        # first, fill up dict with packages dependencies ...
-        toolchain = self.build_worktree.toolchain
-        if toolchain:
-            for package in toolchain.packages:
-                package.load_deps()
-            package_deps = gen_deps(toolchain.packages, dep_types)
-            to_sort.update(package_deps)
-        # then with project dependencies
-        project_deps = gen_deps(self.build_worktree.build_projects, dep_types)
-        to_sort.update(project_deps)
-        return qisys.sort.topological_sort(to_sort, [x.name for x in projects])
+            return sorted(self.graph.get_reverse_names(names, dep_types))
+        return self.graph.get_sorted_names(names, dep_types)
+
+
+class DepsGraph(object):
+    """
+    The dependency graph of the projects of a build worktree and of
+    the packages of its toolchain.
+    It is computed once, and the adjacency lists for each combination
+    of dependency types are only computed the first time they are needed.
+    Project dependencies override package dependencies when a project
+    and a package have the same name.
+    """
+
+    def __init__(self, projects, packages=None):
+        """ DepsGraph Init """
+        self.project_deps = _deps_by_type(projects)
+        self.package_deps = _deps_by_type(packages or list())
+        self._adjacency = dict()
+        self._package_adjacency = dict()
+        self._reverse_adjacency = dict()
+
+    def get_sorted_names(self, names, dep_types):
+        """
+        Return the names of the given projects and of all their dependencies,
+        sorted in build order.
+        """
+        adjacency = self._get_adjacency(self._adjacency, dep_types, with_projects=True)
+        return qisys.sort.topological_sort(dict(adjacency), list(names))
+
+    def get_sorted_package_names(self, names, dep_types):
+        """
+        Same as :py:meth:`get_sorted_names`, but only following the
+        dependencies between the packages
+        """
+        adjacency = self._get_adjacency(self._package_adjacency, dep_types, with_projects=False)
+        return qisys.sort.topological_sort(dict(adjacency), list(names))
+
+    def get_reverse_names(self, names, dep_types, transitive=False):
+        """
+        Return the set of names of the projects depending on the given names.
+        If transitive is True, also return the projects depending on
+        those, and so on.
+        """
+        key = frozenset(dep_types)
+        reverse_adjacency = self._reverse_adjacency.get(key)
+        if reverse_adjacency is None:
+            reverse_adjacency = dict()
+            for name, deps in self.project_deps.items():
+                for dep_type in key:
+                    for dep_name in deps[dep_type]:
+                        reverse_adjacency.setdefault(dep_name, set()).add(name)
+            self._reverse_adjacency[key] = reverse_adjacency
+        res = set()
+        to_visit = list(names)
+        while to_visit:
+            name = to_visit.pop()
+            for parent in reverse_adjacency.get(name, ()):
+                if parent in res:
+                    continue
+                res.add(parent)
+                if transitive:
+                    to_visit.append(parent)
+        return res
+
+    def _get_adjacency(self, cache, dep_types, with_projects):
+        """ Get the dict name -> dependencies for the given dependency types """
+        key = frozenset(dep_types)
+        res = cache.get(key)
+        if res is not None:
+            return res
+        res = dict()
+        sources = [self.package_deps]
+        if with_projects:
+            sources.append(self.project_deps)
+        for source in sources:
+            for name, deps in source.items():
+                res[name] = set()
+                for dep_type in key:
+                    res[name].update(deps[dep_type])
+        cache[key] = res
+        return res
+
+
+def _deps_by_type(objects_with_dependencies):
+    """ Return a dict name -> {dep_type -> dependencies} """
+    res = dict()
+    for object_with_dependencies in objects_with_dependencies:
+        res[object_with_dependencies.name] = {
+            "build": set(object_with_dependencies.build_depends),
+            "runtime": set(object_with_dependencies.run_depends),
+            "test": set(object_with_dependencies.test_depends),
+        }
+    return res
+
+
+def load_packages_deps(packages, cache_path):
+    """
+    Set the dependencies of the packages, reading their package.xml only
+    when it changed since the last time its dependencies were stored in
+    the cache file. Only the current packages are kept in the cache, so each
+    build config must use its own cache file.
+    """
+    cache = dict()
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r") as fp:
+                cache = json.load(fp)
+        except (IOError, ValueError) as e:
+            ui.debug("Ignoring invalid dependencies cache", cache_path, e)
+            cache = dict()
+    new_cache = dict()
+    for package in packages:
+        package_xml = os.path.join(package.path or "", "package.xml")
+        try:
+            mtime = os.stat(package_xml).st_mtime
+        except OSError:
+            continue
+        entry = cache.get(package_xml)
+        if not entry or entry.get("mtime") != mtime:
+            package.load_deps()
+            entry = {
+                "mtime": mtime,
+                "build": sorted(package.build_depends),
+                "runtime": sorted(package.run_depends),
+                "test": sorted(package.test_depends),
+            }
+        else:
+            package.build_depends.update(entry["build"])
+            package.run_depends.update(entry["runtime"])
+            package.test_depends.update(entry["test"])
+        new_cache[package_xml] = entry
+    if new_cache != cache:
+        try:
+            qisys.sh.mkdir(os.path.dirname(cache_path), recursive=True)
+            with open(cache_path, "w") as fp:
+                json.dump(new_cache, fp, indent=2, sort_keys=True)
+        except IOError as e:
+            ui.debug("Could not write dependencies cache", cache_path, e)
 
 
 def read_deps_from_xml(target, xml_elem):
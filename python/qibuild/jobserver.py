@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+A GNU make compatible job server, shared by all the projects built
+in parallel by ``qibuild make -J``, so that the total number of
+compilation processes never exceeds the ``-j`` budget.
+
+The server owns a FIFO containing one token per job slot.
+Each project build first takes one token (the implicit slot GNU make
+assumes it owns), then:
+
+* GNU make reads additional tokens from the FIFO by itself, through
+  the ``--jobserver-auth`` option set in ``MAKEFLAGS``
+* Ninja cannot use a job server, so it takes as many extra tokens as
+  are available (up to a fair share of the budget), and is called with
+  the matching ``-j`` option.
+
+Tokens are given back when the build of the project ends.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import errno
+import select
+import shutil
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+
+from qisys import ui
+
+TOKEN = b"+"
+
+
+def is_supported():
+    """ Return True if a job server can be used on this platform """
+    return hasattr(os, "mkfifo")
+
+
+def default_num_jobs():
+    """ Number of jobs to use when -j is not given """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+class JobServer(object):
+    """
+    JobServer Class
+
+    :param num_jobs: total number of jobs allowed to run at the same time
+    :param num_workers: number of projects which can be built at the same
+                        time, used to compute the share of each Ninja build
+    """
+
+    def __init__(self, num_jobs, num_workers=1):
+        """ JobServer Init """
+        self.num_jobs = num_jobs
+        self.num_workers = max(1, num_workers)
+        self.fifo_path = None
+        self._tmpdir = None
+        # private read end, non-blocking
+        self._read_fd = None
+        # read end given to the make processes, blocking
+        self._client_read_fd = None
+        self._write_fd = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """ Enter """
+        self.start()
+        return self
+
+    def __exit__(self, *_args):
+        """ Exit """
+        self.stop()
+
+    @property
+    def fair_share(self):
+        """ Maximum number of slots a single Ninja build may take """
+        return max(1, -(-self.num_jobs // self.num_workers))
+
+    @property
+    def pass_fds(self):
+        """ The file descriptors which must be inherited by make processes """
+        return (self._client_read_fd, self._write_fd)
+
+    def make_flags(self):
+        """ The value of MAKEFLAGS to use for GNU make builds """
+        auth = "%i,%i" % self.pass_fds
+        return "-j%i --jobserver-auth=%s --jobserver-fds=%s" % (self.num_jobs, auth, auth)
+
+    def start(self):
+        """ Create the FIFO and fill it with one token per slot """
+        self._tmpdir = tempfile.mkdtemp(prefix="qibuild-jobserver-")
+        self.fifo_path = os.path.join(self._tmpdir, "fifo")
+        os.mkfifo(self.fifo_path)
+        self._read_fd = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        self._write_fd = os.open(self.fifo_path, os.O_WRONLY)
+        # Does not block: there is already a writer
+        self._client_read_fd = os.open(self.fifo_path, os.O_RDONLY)
+        os.write(self._write_fd, TOKEN * self.num_jobs)
+        ui.debug("Job server started with", self.num_jobs, "slots in", self.fifo_path)
+
+    def stop(self):
+        """ Close the FIFO """
+        for fd in (self._read_fd, self._client_read_fd, self._write_fd):
+            if fd is not None:
+                os.close(fd)
+        self._read_fd = self._client_read_fd = self._write_fd = None
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def _try_acquire(self):
+        """ Try to take one token, without blocking """
+        try:
+            return len(os.read(self._read_fd, 1)) == 1
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return False
+            raise
+
+    def acquire(self):
+        """ Take one token, blocking until one is available """
+        while not self._try_acquire():
+            select.select([self._read_fd], [], [])
+
+    def release(self, count=1):
+        """ Give back some tokens """
+        if count:
+            os.write(self._write_fd, TOKEN * count)
+
+    @contextlib.contextmanager
+    def slots(self, max_slots=1):
+        """
+        To be used in a "with" statement::
+            with job_server.slots(max_slots=4) as num_slots:
+                build_with(num_slots)
+        Block until one slot is free, then take as many free slots
+        as possible, up to max_slots, and give them back when done.
+        """
+        self.acquire()
+        num_slots = 1
+        with self._lock:
+            while num_slots < max_slots and self._try_acquire():
+                num_slots += 1
+        try:
+            yield num_slots
+        finally:
+            self.release(num_slots)
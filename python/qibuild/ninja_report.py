@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Report of the targets built by Ninja, used by ``qibuild make --ninja-report``.
+
+For every project using the Ninja generator:
+
+* before the build, ``ninja -d explain -n`` tells which outputs are
+  out of date, and which files made them out of date
+* after the build, the lines appended to ``.ninja_log`` give the
+  duration of every target which was built
+
+The results are aggregated across all the projects of the build.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import re
+import subprocess
+import threading
+
+import qisys.command
+from qisys import ui
+
+EXPLAIN_PREFIX = "ninja explain: "
+OLDER_THAN_RE = re.compile(r"^(?:output|recorded mtime of) (.+) older than most recent input (.+) \(")
+MISSING_RE = re.compile(r"^output (.+) doesn't exist$")
+COMMAND_CHANGED_RE = re.compile(r"^command line changed for (.+)$")
+
+# Used instead of a file name when a target was rebuilt for an other reason
+MISSING_OUTPUT = "<missing output>"
+COMMAND_LINE_CHANGED = "<command line changed>"
+
+
+def is_ninja_project(project):
+    """ Return True if the project is built with Ninja """
+    return "Ninja" in (project.cmake_generator or "")
+
+
+def read_ninja_log(path, offset=0):
+    """
+    Parse the entries of a ``.ninja_log`` file, starting at offset.
+    Return a tuple (list of (output, duration in seconds), new offset)
+    """
+    res = list()
+    if not os.path.exists(path):
+        return res, 0
+    if os.path.getsize(path) < offset:
+        # the log was recompacted by ninja
+        offset = 0
+    with open(path, "rb") as fp:
+        fp.seek(offset)
+        contents = fp.read()
+        new_offset = fp.tell()
+    for line in contents.decode("utf-8", "replace").splitlines():
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split("\t")
+        if len(fields) < 4:
+            continue
+        try:
+            start, end = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue
+        res.append((fields[3], (end - start) / 1000.0))
+    return res, new_offset
+
+
+def parse_explain(output):
+    """
+    Parse the output of ``ninja -d explain``.
+    Return a list of (output, trigger), trigger being the input file
+    which is newer than the output, or the reason of the rebuild.
+    """
+    res = list()
+    for line in output.splitlines():
+        if not line.startswith(EXPLAIN_PREFIX):
+            continue
+        message = line[len(EXPLAIN_PREFIX):].strip()
+        match = OLDER_THAN_RE.match(message)
+        if match:
+            res.append((match.group(1), match.group(2)))
+            continue
+        match = MISSING_RE.match(message)
+        if match:
+            res.append((match.group(1), MISSING_OUTPUT))
+            continue
+        match = COMMAND_CHANGED_RE.match(message)
+        if match:
+            res.append((match.group(1), COMMAND_LINE_CHANGED))
+    return res
+
+
+def explain(project, target=None, env=None):
+    """ Return the outputs which will be rebuilt, with what triggered their rebuild """
+    ninja = qisys.command.find_program("ninja", env=env)
+    if not ninja:
+        ui.debug("ninja not found, cannot explain the build of", project.name)
+        return list()
+    cmd = [ninja, "-C", project.build_directory, "-d", "explain", "-n"]
+    if target:
+        cmd.append(target)
+    try:
+        output = qisys.command.check_output(cmd, env=env, stderr=subprocess.STDOUT)
+    except qisys.command.CommandFailedException as e:
+        output = e.stdout or ""
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+    return parse_explain(output)
+
+
+class NinjaReport(object):
+    """
+    NinjaReport Class
+
+    Thread-safe, so that it can be shared by the projects built in parallel.
+    """
+
+    def __init__(self):
+        """ NinjaReport Init """
+        # list of (project name, target, duration in seconds)
+        self.targets = list()
+        # trigger -> list of (project name, output)
+        self.triggers = dict()
+        # project name -> offset of .ninja_log before the build
+        self._offsets = dict()
+        self._lock = threading.Lock()
+
+    def before_build(self, project, target=None, env=None, rebuild=False):
+        """ Collect the reasons of the rebuilds, and remember where the log ends """
+        if not is_ninja_project(project):
+            return
+        explained = list()
+        # everything is rebuilt with --rebuild
+        if not rebuild:
+            explained = explain(project, target=target, env=env)
+        ninja_log = os.path.join(project.build_directory, ".ninja_log")
+        _entries, offset = read_ninja_log(ninja_log)
+        with self._lock:
+            self._offsets[project.name] = offset
+            for output, trigger in explained:
+                trigger = self._relpath(project, trigger)
+                self.triggers.setdefault(trigger, list()).append((project.name, output))
+
+    def after_build(self, project):
+        """ Collect the durations of the targets which were built """
+        with self._lock:
+            offset = self._offsets.pop(project.name, None)
+        if offset is None:
+            return
+        ninja_log = os.path.join(project.build_directory, ".ninja_log")
+        entries, _offset = read_ninja_log(ninja_log, offset=offset)
+        with self._lock:
+            for output, duration in entries:
+                self.targets.append((project.name, output, duration))
+
+    @staticmethod
+    def _relpath(project, path):
+        """
+        Display paths relatively to the worktree, since a rebuild may be
+        triggered by a library built by an other project
+        """
+        if not os.path.isabs(path):
+            return path
+        root = project.build_worktree.root
+        if path.startswith(root + os.sep):
+            return os.path.relpath(path, root)
+        return path
+
+    def get_project_durations(self):
+        """ Return a list of (project name, total duration), the slowest first """
+        durations = dict()
+        for (name, _output, duration) in self.targets:
+            durations[name] = durations.get(name, 0) + duration
+        return sorted(durations.items(), key=lambda x: (-x[1], x[0]))
+
+    def get_top_targets(self, top=10):
+        """ Return the top most expensive (project name, target, duration) """
+        return sorted(self.targets, key=lambda x: (-x[2], x[0], x[1]))[:top]
+
+    def get_top_triggers(self, top=10):
+        """ Return the top (trigger, number of rebuilt outputs) """
+        counts = [(trigger, len(outputs)) for (trigger, outputs) in self.triggers.items()]
+        return sorted(counts, key=lambda x: (-x[1], x[0]))[:top]
+
+    def display(self, top=10):
+        """ Display the report """
+        if not self.targets and not self.triggers:
+            ui.info(ui.green, "Ninja report: nothing was built with Ninja")
+            return
+        ui.info(ui.green, "Most expensive targets:")
+        for (name, output, duration) in self.get_top_targets(top=top):
+            ui.info(ui.green, " *", ui.reset, "%8.2fs" % duration, ui.blue, name, ui.reset, output)
+        ui.info(ui.green, "Build time per project:")
+        for (name, duration) in self.get_project_durations()[:top]:
+            ui.info(ui.green, " *", ui.reset, "%8.2fs" % duration, ui.blue, name)
+        ui.info(ui.green, "Files which triggered rebuilds:")
+        for (trigger, count) in self.get_top_triggers(top=top):
+            ui.info(ui.green, " *", ui.blue, trigger, ui.reset,
+                    "(%i target%s)" % (count, "s" if count > 1 else ""))
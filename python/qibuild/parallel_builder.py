@@ -2,40 +2,64 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
 # Use of this source code is governed by a BSD-style license (see the COPYING file).
-""" Parallel Builder """
+"""
+Parallel Builder
+
+Jobs are scheduled as soon as all their build dependencies are built.
+Among the jobs ready to be built, the ones with the longest remaining
+critical path (computed from the durations recorded during previous
+builds) are started first.
+
+The same scheduler is used to configure projects in parallel,
+with :py:class:`ConfigureJob` jobs.
+"""
 from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
 import io
 import sys
+import time
+import heapq
 import traceback
 import threading
-import six
 
-import qibuild.project
+import qibuild.build
 from qisys import ui
 
-if six.PY3:
-    import queue as Queue
-else:
-    import Queue
+# Duration used for projects which were never built before
+DEFAULT_DURATION = 1.0
+
+# Prevents the buffered outputs of the configure jobs from being interleaved
+OUTPUT_LOCK = threading.Lock()
 
 
 class BuildJob(object):
     """ BuildJob Class """
 
+    # name of the step in the build log
+    phase = "build"
+
     def __init__(self, project):
         """ BuildJob Init """
         self.project = project
         self.index = 0
         self.num_projects = 0
+        # position of the job in the build order
+        self.position = 0
         # forward dependencies (children this project depends on)
         self.deps = []
         # backward dependencies (parents which depend on this project)
         self.back_deps = []
-        # lock which protects deps and back_deps lists
-        self.lock = threading.Lock()
+        # number of dependencies not built yet
+        self.remaining_deps = 0
+        # expected duration of the build of this project
+        self.duration = DEFAULT_DURATION
+        # expected duration of the longest chain of builds starting
+        # with this project
+        self.priority = DEFAULT_DURATION
+        # set by execute() when there was nothing to do
+        self.skipped = False
 
     def __str__(self):
         """ String Representation """
@@ -43,14 +67,22 @@ class BuildJob(object):
 
     def add_dependency(self, job):
         """ Add Dependency """
-        with self.lock:
-            self.deps.append(job)
-            job.add_back_dependency(self)
+        self.deps.append(job)
+        self.remaining_deps += 1
+        job.add_back_dependency(self)
 
     def add_back_dependency(self, job):
         """ Add Back Depedency """
         self.back_deps.append(job)
 
+    def dependency_names(self):
+        """ Names of the projects which must be processed before this one """
+        return self.project.build_depends
+
+    def error(self, _exception):
+        """ The exception raised by the builder when this job failed """
+        return qibuild.build.BuildFailed(self.project)
+
     def execute(self, *_args, **kwargs):
         """ Execute """
         ui.info_count(self.index, self.num_projects,
@@ -60,33 +92,97 @@ class BuildJob(object):
                       ui.blue, self.project.build_type,
                       update_title=True)
         self.project.build(**kwargs)
-        # job ended, say that to dependants
-        with self.lock:
-            for parent_job in self.back_deps:
-                ui.debug("Signaling end to job", ui.reset, ui.bold, parent_job.project.name)
-                parent_job.on_dependent_job_finished(self)
-
-    def on_dependent_job_finished(self, job):
-        """ On Depend Job Finished """
-        with self.lock:
-            try:
-                self.deps.remove(job)
-            except ValueError:
-                ui.debug(ui.red, "Job not in the deps list!", self.deps, job)
+
+
+class ConfigureJob(BuildJob):
+    """
+    ConfigureJob Class
+
+    The output of cmake is buffered, and displayed in one block
+    when the project is configured.
+    """
+
+    phase = "configure"
+
+    def __str__(self):
+        """ String Representation """
+        return "<ConfigureJob %s>" % self.project.name
+
+    def dependency_names(self):
+        """
+        Configuring a project reads the cmake files installed by
+        the configure step of its build and test dependencies.
+        """
+        return self.project.build_depends | self.project.test_depends
+
+    def error(self, exception):
+        """ Same exception as when configuring serially """
+        return exception
+
+    def execute(self, *_args, **kwargs):
+        """ Execute """
+        force = kwargs.pop("force", False)
+        if not force and self.project.is_configure_up_to_date():
+            ui.info_count(self.index, self.num_projects,
+                          ui.green, "Reusing configuration of",
+                          ui.blue, self.project.name)
+            self.skipped = True
+            return
+        ui.info_count(self.index, self.num_projects,
+                      ui.green, "Configuring",
+                      ui.blue, self.project.name,
+                      update_title=True)
+        try:
+            output = self.project.configure(buffer_output=True, **kwargs)
+        except qibuild.build.ConfigureFailed as e:
+            self.display_output(e.exception.stdout)
+            raise
+        self.display_output(output)
+
+    def display_output(self, output):
+        """ Display the buffered output of cmake """
+        if not output:
+            return
+        if isinstance(output, bytes):
+            output = output.decode("utf-8", "replace")
+        with OUTPUT_LOCK:
+            ui.info(ui.bold, "-- Output of cmake for", self.project.name, "--\n",
+                    ui.reset, output.rstrip())
 
 
 class ParallelBuilder(object):
-    """ ParallelBuilder Builder Class """
+    """
+    ParallelBuilder Builder Class
 
-    def __init__(self):
+    :param durations: a dict project name -> build duration in seconds,
+                      used to compute the critical path of the build.
+                      It is updated with the durations of the jobs
+                      built successfully.
+    :param job_class: :py:class:`BuildJob` or :py:class:`ConfigureJob`
+    :param build_log: a :py:class:`qibuild.build_log.BuildLog` in which
+                      the jobs are recorded
+    """
+
+    def __init__(self, durations=None, job_class=BuildJob, build_log=None):
         """ ParallelBuilder Init """
+        self.job_class = job_class
+        self.build_log = build_log
         self.all_jobs = []
-        self.pending_jobs = []
-        self.running_jobs = Queue.Queue()
-        self._workers = list()
+        # projects successfully built, in the order they were built
+        self.built_projects = []
+        self.durations = durations if durations is not None else dict()
         self.failed_project = None
+        self.failed_job = None
+        self.failed_exception = None
         self.job_current_index = 0
         self.num_projects = 0
+        self._jobs_by_name = dict()
+        # heap of (-priority, position, job) for the jobs ready to be built
+        self._ready = []
+        self._num_done = 0
+        self._failed = False
+        self._condition = threading.Condition()
+        self._workers = list()
 
     def prepare_build_jobs(self, projects):
         """ Prepare Build Job """
@@ -94,60 +190,89 @@ class ParallelBuilder(object):
         # this means, no project can depend on projects which
         # come after it in the list!!!!
         self.num_projects = len(projects)
-        for project in projects:
-            job = BuildJob(project)
+        for position, project in enumerate(projects):
+            job = self.job_class(project)
+            job.position = position
+            job.duration = self.durations.get(project.name, DEFAULT_DURATION)
             self.all_jobs.append(job)
+            self._jobs_by_name[project.name] = job
             self._resolve_job_build_dependencies(job)
-            # job has dependencies => pending
-            if job.deps:
-                self.pending_jobs.append(job)
-            # job has no dependencies => running
-            else:
-                self._schedule_job(job)
+        # Dependants always come after their dependencies, so walking the
+        # list backwards computes every critical path in one pass
+        for job in reversed(self.all_jobs):
+            longest = max([x.priority for x in job.back_deps] or [0])
+            job.priority = job.duration + longest
+        for job in self.all_jobs:
+            if not job.remaining_deps:
+                self._push_ready(job)
 
     def build(self, *args, **kwargs):
         """ Build """
-        num_workers = kwargs.get("num_workers", 1)
-        kwargs.pop("num_workers", None)
-        # start workers
+        num_workers = kwargs.pop("num_workers", 1)
         for i in range(0, num_workers):
-            worker = BuildWorker(self.running_jobs, i, *args, **kwargs)
+            worker = BuildWorker(self, i, *args, **kwargs)
             self._workers.append(worker)
             worker.start()
-        all_ok = True
-        while all_ok and (self.pending_jobs or not self.running_jobs.empty()):
-            # parse pending_jobs to see if any needs to be moved to running
-            for job in self.pending_jobs:
-                if not job.deps:
-                    self._schedule_job(job)
-                    self.pending_jobs.remove(job)
-            # check if any worker failed
-            for worker in self._workers:
-                if not worker.result.ok:
-                    all_ok = False
-                    self.failed_project = worker.result.failed_project
-                    break
-        # end (all done or error)
-        # say to all workers to stop
         for worker in self._workers:
-            worker.stop()
-        # join all workers before quitting
-        for worker_thread in self._workers:
-            worker_thread.join()
-        # compilation failed
-        if not all_ok:
-            raise qibuild.build.BuildFailed(self.failed_project)
-
-    def _schedule_job(self, job):
-        """ Schedule Job """
-        job.index = self.job_current_index
-        self.job_current_index += 1
-        job.num_projects = self.num_projects
-        self.running_jobs.put(job)
+            worker.join()
+        if self._failed:
+            raise self.failed_job.error(self.failed_exception)
+
+    def get_next_job(self):
+        """
+        Block until a job is ready to be built, and return it.
+        Return None when there is nothing left to do, either
+        because everything was built or because a build failed.
+        """
+        with self._condition:
+            while True:
+                if self._failed or self._num_done == len(self.all_jobs):
+                    return None
+                if self._ready:
+                    job = heapq.heappop(self._ready)[2]
+                    job.index = self.job_current_index
+                    job.num_projects = self.num_projects
+                    self.job_current_index += 1
+                    return job
+                self._condition.wait()
+
+    def on_job_done(self, job, duration=None):
+        """
+        Called by the workers when a job has been built successfully.
+        duration is None when the job had nothing to do.
+        """
+        with self._condition:
+            if duration is not None:
+                self.durations[job.project.name] = duration
+            self.built_projects.append(job.project)
+            self._num_done += 1
+            for parent_job in job.back_deps:
+                parent_job.remaining_deps -= 1
+                if not parent_job.remaining_deps:
+                    ui.debug("Scheduling", ui.reset, ui.bold, parent_job.project.name)
+                    self._push_ready(parent_job)
+            self._condition.notify_all()
+
+    def on_job_failed(self, job, exception=None):
+        """ Called by the workers when a job failed: cancel pending jobs """
+        with self._condition:
+            if not self._failed:
+                self._failed = True
+                self.failed_project = job.project
+                self.failed_job = job
+                self.failed_exception = exception
+            if self._ready:
+                ui.debug("Cancelling", len(self._ready), "ready jobs")
+            self._ready = []
+            self._condition.notify_all()
+
+    def _push_ready(self, job):
+        """ Mark the job as ready to be built """
+        heapq.heappush(self._ready, (-job.priority, job.position, job))
 
     def _resolve_job_build_dependencies(self, job):
         """ Resolve Job Build Dependencies """
-        for p in job.project.build_depends:
+        for p in job.dependency_names():
             dep_job = self._find_job_by_name(p)
             if dep_job:
                 job.add_dependency(dep_job)
@@ -157,10 +282,7 @@ class ParallelBuilder(object):
 
     def _find_job_by_name(self, name):
         """ Find Job By Name """
-        for job in self.all_jobs:
-            if job.project.name == name:
-                return job
-        return None
+        return self._jobs_by_name.get(name)
 
 
 class BuildResult(object):
@@ -175,39 +297,47 @@ class BuildResult(object):
 class BuildWorker(threading.Thread):
     """ BuildWorker Class """
 
-    def __init__(self, queue, worker_index, *args, **kwargs):
+    def __init__(self, builder, worker_index, *args, **kwargs):
         """ BuildWorker Init """
         super(BuildWorker, self).__init__(name="BuildWorker#%i" % worker_index)
         self.index = worker_index
-        self.queue = queue
+        self.builder = builder
         self.args = args
         self.kwargs = kwargs
-        self._should_stop = False
         self.result = BuildResult()
 
-    def stop(self):
-        """ Tell the worker it should stop trying to read items from the queue """
-        self._should_stop = True
-
     def run(self):
         """ Run """
-        while not self._should_stop and self.result.ok:
-            job = None
+        while True:
+            job = self.builder.get_next_job()
+            if not job:
+                return
+            ui.info(ui.green, "Worker #%i starts working on " % (self.index + 1),
+                    ui.reset, ui.bold, job.project.name)
+            start = time.time()
             try:
-                job = self.queue.get(True, 1)
-            except Queue.Empty:
-                # ignore empty exception, this can happen
-                pass
-            if job:
-                try:
-                    ui.info(ui.green, "Worker #%i starts working on " % (self.index + 1),
-                            ui.reset, ui.bold, job.project.name)
-                    job.execute(*self.args, **self.kwargs)
-                    self.queue.task_done()
-                except Exception as e:
-                    self.result.ok = False
-                    self.result.failed_project = job.project
-                    ui.error(*self.message_for_exception(e))
+                job.execute(*self.args, **self.kwargs)
+            except Exception as e:
+                self.record(job, start, "failed")
+                self.result.ok = False
+                self.result.failed_project = job.project
+                ui.error(*self.message_for_exception(e))
+                self.builder.on_job_failed(job, e)
+                return
+            if job.skipped:
+                # the duration of a no-op says nothing about the next real run
+                self.builder.on_job_done(job)
+                continue
+            end = self.record(job, start, "ok")
+            self.builder.on_job_done(job, end - start)
+
+    def record(self, job, start, status):
+        """ Record the job in the build log, return the end timestamp """
+        end = time.time()
+        if self.builder.build_log:
+            self.builder.build_log.record(job.project.name, job.phase, start, end,
+                                          worker=self.index, status=status)
+        return end
 
     @staticmethod
     def message_for_exception(exception):
@@ -8,10 +8,13 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
+import re
 import sys
 import json
+import hashlib
 import argparse
 import platform
+import threading
 from xml.etree import ElementTree as etree
 import six
 
@@ -36,6 +39,48 @@ from qisys import ui
 TARGET = "{}-{}".format(platform.system().lower(),
                         platform.processor().lower())
 
+# Projects may be installed in parallel to the same destination
+QITEST_JSON_LOCK = threading.Lock()
+
+# Environment variables read by CMake when it detects the compilers
+CONFIGURE_ENV_VARS = ["CC", "CXX", "CFLAGS", "CXXFLAGS", "CPPFLAGS", "LDFLAGS"]
+
+
+def _get_mtime(path):
+    """ Modification time of path, or None if it does not exist """
+    if path and os.path.exists(path):
+        return os.path.getmtime(path)
+    return None
+
+
+def _read_cmake_inputs(build_directory):
+    """
+    Return the absolute paths of the files read by the last run of cmake
+    in the build directory, as listed by the Makefile or Ninja generators
+    to know when to run cmake again, or None if they cannot be found
+    """
+    makefile_cmake = os.path.join(build_directory, "CMakeFiles", "Makefile.cmake")
+    build_ninja = os.path.join(build_directory, "build.ninja")
+    res = None
+    if os.path.exists(makefile_cmake):
+        with open(makefile_cmake, "r") as fp:
+            contents = fp.read()
+        match = re.search(r"set\(CMAKE_MAKEFILE_DEPENDS\s(.*?)\)", contents, re.DOTALL)
+        if match:
+            res = re.findall(r'"([^"]*)"', match.group(1))
+    elif os.path.exists(build_ninja):
+        with open(build_ninja, "r") as fp:
+            for line in fp:
+                if line.startswith("build build.ninja:") and "RERUN_CMAKE" in line:
+                    # spaces in paths are escaped as "$ "
+                    line = line.rstrip("\n").replace("$ ", "\0").replace("$:", ":").replace("$$", "$")
+                    inputs = line.partition("|")[2].split()
+                    res = [x.replace("\0", " ") for x in inputs]
+                    break
+    if res is None:
+        return None
+    return [os.path.join(build_directory, x) for x in res]
+
 
 def read_install_manifest(filepath):
     """ Read Install Manifest """
@@ -217,6 +262,11 @@ class BuildProject(object):
             cmake_vars = dict()
         return cmake_vars
 
+    @property
+    def configure_fingerprint_path(self):
+        """ Where the fingerprint of the last successful configure is stored """
+        return os.path.join(self.build_directory, "qibuild-configure.sha1")
+
     @property
     def qitest_json(self):
         """ QiTest JSON """
@@ -331,8 +381,27 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         qisys.sh.write_file_if_different(to_write, dep_cmake)
 
     def configure(self, **kwargs):
-        """ Delegate to :py:func:`qibuild.cmake.cmake`. """
+        """
+        Delegate to :py:func:`qibuild.cmake.cmake`.
+        Return the output of cmake when called with ``buffer_output=True``
+        """
         qisys.sh.mkdir(self.sdk_directory, recursive=True)
+        cmake_args = self.get_configure_args()
+        # cmake may fail after having modified the cache
+        qisys.sh.rm(self.configure_fingerprint_path)
+        try:
+            # cmake() appends the source directory to the list
+            output = qibuild.cmake.cmake(self.path, self.build_directory,
+                                         list(cmake_args), env=self.build_env, **kwargs)
+        except qisys.command.CommandFailedException as error:
+            raise qibuild.build.ConfigureFailed(self, error)
+        self.generate_qitest_json()
+        with open(self.configure_fingerprint_path, "w") as fp:
+            fp.write(self.get_configure_fingerprint(cmake_args))
+        return output
+
+    def get_configure_args(self):
+        """ The arguments passed to cmake when configuring the project """
         cmake_args = self.cmake_args
         # only required the first time, afterwards this setting is
         # written in the cache by dependencies.cmake
@@ -342,19 +411,115 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         cmake_args.append("-Dqibuild_DIR=%s" % cmake_qibuild_dir)
         if self.build_config.toolchain:
             cmake_args.append("-DQI_TOOLCHAIN_TARGET=%s" % self.build_config.toolchain.target)
-        try:
-            qibuild.cmake.cmake(self.path, self.build_directory,
-                                cmake_args, env=self.build_env, **kwargs)
-        except qisys.command.CommandFailedException as error:
-            raise qibuild.build.ConfigureFailed(self, error)
-        self.generate_qitest_json()
+        return cmake_args
+
+    def get_configure_fingerprint(self, cmake_args=None):
+        """
+        Return a hash of everything running cmake depends on:
+        the cmake arguments, the toolchain, the contents of
+        ``dependencies.cmake``, the modification times of the cmake
+        files of the project and of the cmake cache, and the fingerprints
+        of the dependencies (which generate the cmake files the project reads).
+        """
+        if cmake_args is None:
+            cmake_args = self.get_configure_args()
+        toolchain = self.build_config.toolchain
+        toolchain_file = None
+        packages = list()
+        if toolchain:
+            toolchain_file = toolchain.toolchain_file
+            packages = [(x.name, x.version) for x in toolchain.packages]
+        build_env = self.build_env
+        to_hash = {
+            "cmake_args": cmake_args,
+            "toolchain_file": toolchain_file,
+            "toolchain_file_mtime": _get_mtime(toolchain_file),
+            "packages": packages,
+            "env": [(x, build_env.get(x)) for x in CONFIGURE_ENV_VARS],
+            "dependencies.cmake": None,
+            "sources": self._get_cmake_files_mtimes(),
+            "cmake_cache_mtime": _get_mtime(self.cmake_cache),
+            "deps": self._get_deps_fingerprints(),
+        }
+        dep_cmake = os.path.join(self.build_directory, "dependencies.cmake")
+        if os.path.exists(dep_cmake):
+            with open(dep_cmake, "r") as fp:
+                to_hash["dependencies.cmake"] = fp.read()
+        as_json = json.dumps(to_hash, sort_keys=True)
+        return hashlib.sha1(as_json.encode("utf-8")).hexdigest()
+
+    def _get_deps_fingerprints(self):
+        """ Fingerprints of the last configure of the build and test dependencies """
+        res = list()
+        for name in sorted(self.build_depends | self.test_depends):
+            dep_project = self.build_worktree.get_build_project(name, raises=False)
+            if not dep_project:
+                continue
+            fingerprint = None
+            if os.path.exists(dep_project.configure_fingerprint_path):
+                with open(dep_project.configure_fingerprint_path, "r") as fp:
+                    fingerprint = fp.read().strip()
+            res.append((name, fingerprint))
+        return res
+
+    def _get_cmake_files_mtimes(self):
+        """
+        Modification times of the files read by cmake in the project sources.
+        Only the files listed by the generator are looked at, the whole
+        sources are walked when there is no such list.
+        """
+        res = list()
+        build_directory = os.path.abspath(self.build_directory)
+        inputs = _read_cmake_inputs(build_directory)
+        if inputs is not None:
+            paths = set([self.qiproject_xml])
+            for path in inputs:
+                path = os.path.normpath(path)
+                if path.startswith(self.path + os.sep) and \
+                   not path.startswith(build_directory + os.sep):
+                    paths.add(path)
+            for path in sorted(paths):
+                res.append((os.path.relpath(path, self.path), _get_mtime(path)))
+            return res
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(x for x in dirs
+                             if not x.startswith((".", "build-")) and
+                             os.path.join(root, x) != build_directory)
+            for filename in sorted(files):
+                if filename in ("CMakeLists.txt", "qiproject.xml", "package.xml") or \
+                   filename.endswith((".cmake", ".in")):
+                    full_path = os.path.join(root, filename)
+                    res.append((os.path.relpath(full_path, self.path), _get_mtime(full_path)))
+        return res
+
+    def is_configure_up_to_date(self):
+        """
+        Return True if the project was successfully configured
+        and nothing running cmake depends on changed since then.
+        """
+        if not os.path.exists(self.configure_fingerprint_path):
+            return False
+        if not os.path.exists(self.qitest_json):
+            return False
+        with open(self.configure_fingerprint_path, "r") as fp:
+            previous = fp.read().strip()
+        return previous == self.get_configure_fingerprint()
 
     def generate_qitest_json(self):
         """ Generate QiTest JSON """
         convert_qitest_cmake_to_json(os.path.join(self.build_directory, "qitest.cmake"), self.qitest_json)
 
-    def build(self, rebuild=False, target=None, coverity=False, env=None):
-        """ Build the project. """
+    def build(self, rebuild=False, target=None, coverity=False, env=None, job_server=None,
+              ninja_report=None):
+        """
+        Build the project.
+        :param job_server: a :py:class:`qibuild.jobserver.JobServer` shared with
+                           the other projects being built at the same time.
+                           When set, the number of jobs is taken from it
+                           instead of from the build config.
+        :param ninja_report: a :py:class:`qibuild.ninja_report.NinjaReport`
+                             collecting the targets built by Ninja
+        """
         timer = ui.timer("make %s" % self.name)
         timer.start()
         cmd = []
@@ -372,7 +537,8 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         if rebuild:
             cmd += ["--clean-first"]
         cmd += ["--"]
-        cmd += self.parse_num_jobs(self.build_config.num_jobs)
+        if not job_server:
+            cmd += self.parse_num_jobs(self.build_config.num_jobs)
         if not env:
             build_env = self.build_env.copy()
         else:
@@ -395,15 +561,39 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
                 key = str(key)
                 value = str(value)
             build_env_str[key] = value
+        if ninja_report:
+            ninja_report.before_build(self, target=target, env=build_env_str, rebuild=rebuild)
         try:
-            qisys.command.call(cmd, env=build_env_str)
+            if job_server:
+                self._call_with_job_server(cmd, build_env_str, job_server)
+            else:
+                qisys.command.call(cmd, env=build_env_str)
         except qisys.command.CommandFailedException:
             raise qibuild.build.BuildFailed(self)
+        finally:
+            if ninja_report:
+                ninja_report.after_build(self)
         timer.stop()
         # We need to call generate_qitest_json() here because
         # `qibuild make` may have caused a re-run of cmake
         self.generate_qitest_json()
 
+    def _call_with_job_server(self, cmd, env, job_server):
+        """ Run the build command, taking its job slots from the job server """
+        cmake_generator = self.cmake_generator or ""
+        if "Unix Makefiles" in cmake_generator:
+            with job_server.slots():
+                env["MAKEFLAGS"] = job_server.make_flags()
+                qisys.command.call(cmd, env=env, pass_fds=job_server.pass_fds)
+        elif "Ninja" in cmake_generator:
+            with job_server.slots(max_slots=job_server.fair_share) as num_slots:
+                ui.debug("Building", self.name, "with", num_slots, "jobs")
+                qisys.command.call(cmd + ["-j", str(num_slots)], env=env)
+        else:
+            with job_server.slots():
+                cmd += self.parse_num_jobs(self.build_config.num_jobs, cmake_generator=cmake_generator)
+                qisys.command.call(cmd, env=env)
+
     def parse_num_jobs(self, num_jobs, cmake_generator=None):
         """ Convert a number of jobs to a list of cmake args. """
         if not cmake_generator:
@@ -507,7 +697,8 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
             return
         tests = qitest.conf.parse_tests(self.qitest_json)
         tests = qitest.conf.relocate_tests(self, tests)
-        qitest.conf.write_tests(tests, os.path.join(destdir, "qitest.json"), append=True)
+        with QITEST_JSON_LOCK:
+            qitest.conf.write_tests(tests, os.path.join(destdir, "qitest.json"), append=True)
 
     def run_tests(self, **kwargs):
         """ Run Tests """
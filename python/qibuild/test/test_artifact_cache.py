@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Test Artifact Cache """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import mock
+
+import qisrc.git
+import qisys.sh
+import qibuild.project
+import qibuild.artifact_cache
+
+
+def commit_sources(project):
+    """ Put the sources of the project in a git repository """
+    git = qisrc.git.Git(project.path)
+    git.init()
+    with open(os.path.join(project.path, ".gitignore"), "w") as fp:
+        fp.write("build-*\n")
+    git.add(".")
+    git.commit("--message", "initial commit")
+
+
+def test_restore_unchanged_projects(qibuild_action):
+    """ Test Restore Unchanged Projects """
+    world = qibuild_action.add_test_project("world")
+    hello = qibuild_action.add_test_project("hello")
+    commit_sources(world)
+    commit_sources(hello)
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "hello", "--artifact-cache")
+    artifact_cache = qibuild.artifact_cache.ArtifactCache()
+    assert len(artifact_cache.get_entries()) == 2
+    qisys.sh.rm(world.sdk_directory)
+    with mock.patch.object(qibuild.project.BuildProject, "build") as build:
+        qibuild_action("make", "hello", "--artifact-cache")
+        assert not build.called
+    assert os.path.exists(os.path.join(world.sdk_directory, "lib", "libworld.so"))
+    assert artifact_cache.read_stats()["hits"] == 2
+
+
+def test_local_changes_are_not_cached(qibuild_action):
+    """ Test Local Changes Are Not Cached """
+    world = qibuild_action.add_test_project("world")
+    hello = qibuild_action.add_test_project("hello")
+    commit_sources(world)
+    commit_sources(hello)
+    with open(os.path.join(world.path, "world", "world.cpp"), "a") as fp:
+        fp.write("\n// local change\n")
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "hello", "-J2", "--artifact-cache")
+    artifact_cache = qibuild.artifact_cache.ArtifactCache()
+    # hello depends on world, so it cannot be cached either
+    assert not artifact_cache.get_entries()
+
+
+def test_prune(qibuild_action):
+    """ Test Prune """
+    world = qibuild_action.add_test_project("world")
+    commit_sources(world)
+    qibuild_action("configure", "world")
+    qibuild_action("make", "world", "-J2", "--artifact-cache")
+    artifact_cache = qibuild.artifact_cache.ArtifactCache()
+    assert len(artifact_cache.get_entries()) == 1
+    qibuild_action("cache", "stats")
+    qibuild_action("cache", "prune", "--all")
+    assert not artifact_cache.get_entries()
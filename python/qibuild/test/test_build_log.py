@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Test Build Log """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import json
+
+import qibuild.build_log
+from qibuild.test.conftest import TestBuildWorkTree
+
+
+def test_critical_path():
+    """ Test Critical Path """
+    durations = {"a": 1.0, "b": 5.0, "c": 2.0, "d": 1.0}
+    deps = {"d": ["b", "c"], "b": ["a"], "c": ["a"]}
+    total, path = qibuild.build_log.get_critical_path(durations, deps)
+    assert total == 7.0
+    assert path == ["a", "b", "d"]
+
+
+def test_chrome_trace():
+    """ Test Chrome Trace """
+    run = {"command": "make", "start": 10.0, "end": 13.0, "status": "ok", "events": [
+        {"project": "world", "phase": "build", "worker": 0,
+         "start": 10.0, "end": 11.5, "status": "ok"},
+        {"project": "hello", "phase": "build", "worker": 1,
+         "start": 11.5, "end": 13.0, "status": "failed"},
+    ]}
+    trace = qibuild.build_log.to_chrome_trace([run])
+    slices = [x for x in trace["traceEvents"] if x["ph"] == "X"]
+    assert [(x["name"], x["tid"], x["ts"], x["dur"]) for x in slices] == [
+        ("world", 0, 0, 1500000),
+        ("hello", 1, 1500000, 1500000),
+    ]
+    assert slices[1]["args"]["status"] == "failed"
+
+
+def test_make_records_timings(qibuild_action, tmpdir):
+    """ Test Make Records Timings """
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    trace_json = tmpdir.join("trace.json")
+    qibuild_action("make", "-J2", "hello", "--trace-out", trace_json.strpath)
+    build_worktree = TestBuildWorkTree()
+    runs = qibuild.build_log.read_runs(qibuild.build_log.get_log_path(build_worktree))
+    assert [x["command"] for x in runs] == ["configure", "make"]
+    assert [(x["project"], x["phase"], x["status"]) for x in runs[1]["events"]] == [
+        ("world", "build", "ok"),
+        ("hello", "build", "ok"),
+    ]
+    trace = json.loads(trace_json.read())
+    assert [x["name"] for x in trace["traceEvents"] if x["ph"] == "X"] == ["world", "hello"]
+    total, path = qibuild_action("stats")
+    assert path == ["world", "hello"]
+    assert total > 0
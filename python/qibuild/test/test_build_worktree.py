@@ -9,9 +9,13 @@ from __future__ import print_function
 
 import os
 import sys
+import time
+import mock
 import pytest
 
+import qisys.worktree
 import qibuild.config
+import qibuild.worktree
 from qibuild.test.conftest import TestBuildWorkTree
 from qitoolchain.test.conftest import toolchains
 from qipy.test.conftest import qipy_action
@@ -127,3 +131,26 @@ def test_venv_path(qipy_action):
     venv_path = build_worktree.venv_path
     activate = os.path.join(venv_path, "bin", "activate")
     assert os.path.exists(activate)
+
+
+def test_build_projects_snapshot(build_worktree):
+    """ Test Build Projects Snapshot """
+    world = build_worktree.create_project("world")
+    hello = build_worktree.create_project("hello", build_depends=["world"], run_depends=["foo"])
+    past = time.time() - 10
+    for path in [build_worktree.worktree.worktree_xml, world.qiproject_xml, hello.qiproject_xml]:
+        os.utime(path, (past, past))
+    build_worktree.worktree.reload()
+    worktree = qisys.worktree.WorkTree(build_worktree.root)
+    assert worktree.snapshot.load()
+    # Stores the build model
+    qibuild.worktree.BuildWorkTree(worktree)
+    worktree = qisys.worktree.WorkTree(build_worktree.root)
+    with mock.patch("qibuild.worktree.new_build_project") as mock_new:
+        build_worktree2 = qibuild.worktree.BuildWorkTree(worktree)
+        assert not mock_new.called
+    hello2 = build_worktree2.get_build_project("hello")
+    assert hello2.path == hello.path
+    assert hello2.build_depends == set(["world"])
+    assert hello2.run_depends == set(["foo"])
+    assert [p.name for p in build_worktree2.build_projects] == ["hello", "world"]
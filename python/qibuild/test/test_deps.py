@@ -7,7 +7,14 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import os
+import json
+import mock
+
+import qibuild.deps
 import qibuild.config
+import qibuild.worktree
+import qitoolchain.qipackage
 from qibuild.deps import DepsSolver
 
 
@@ -153,3 +160,74 @@ def test_read_host_deps(build_worktree):
     _footool_proj = build_worktree.add_test_project("footool")
     usefootool_proj = build_worktree.add_test_project("usefootool")
     assert usefootool_proj.host_depends == {"footool"}
+
+
+def test_transitive_reverse_deps(build_worktree):
+    """ Test Transitive Reverse Deps """
+    build_worktree.create_project("libworld")
+    build_worktree.create_project("libhello", build_depends=["libworld"])
+    build_worktree.create_project("hello", run_depends=["libhello"])
+    graph = build_worktree.deps_graph
+    assert graph.get_reverse_names(["libworld"], ["build"]) == set(["libhello"])
+    assert graph.get_reverse_names(["libworld"], ["build"], transitive=True) == set(["libhello"])
+    assert graph.get_reverse_names(["libworld"], ["build", "runtime"], transitive=True) == \
+        set(["libhello", "hello"])
+
+
+def test_graph_is_computed_once(build_worktree):
+    """ Test the graph is only computed again when the projects change """
+    build_worktree.create_project("world")
+    graph = build_worktree.deps_graph
+    assert build_worktree.deps_graph is graph
+    build_worktree.create_project("hello", build_depends=["world"])
+    assert build_worktree.deps_graph is not graph
+    assert build_worktree.deps_graph.get_sorted_names(["hello"], ["build"]) == ["world", "hello"]
+    graph = build_worktree.deps_graph
+    # same number of projects, but they were read again
+    build_worktree.reload()
+    assert build_worktree.deps_graph is not graph
+
+
+def test_packages_deps_are_cached(build_worktree, toolchains):
+    """ Test package.xml files are only read when they change """
+    toolchains.create("foo")
+    qibuild.config.add_build_config("foo", toolchain="foo")
+    toolchains.add_package("foo", "libqi")
+    toolchains.add_package("foo", "hal", run_depends=["libqi"])
+    build_worktree.set_active_config("foo")
+    packages = build_worktree.toolchain.packages
+    cache_path = os.path.join(build_worktree.dot_qi, "deps_cache.json")
+    qibuild.deps.load_packages_deps(packages, cache_path)
+    with open(cache_path, "r") as fp:
+        cache = json.load(fp)
+    hal_xml = os.path.join(build_worktree.toolchain.get_package("hal").path, "package.xml")
+    assert cache[hal_xml]["runtime"] == ["libqi"]
+    with mock.patch.object(qitoolchain.qipackage.QiPackage, "load_deps") as load_deps:
+        for package in packages:
+            package.run_depends = set()
+        qibuild.deps.load_packages_deps(packages, cache_path)
+        assert not load_deps.called
+    assert build_worktree.toolchain.get_package("hal").run_depends == set(["libqi"])
+    libqi = build_worktree.toolchain.get_package("libqi")
+    qibuild.deps.load_packages_deps([libqi], cache_path)
+    with open(cache_path, "r") as fp:
+        cache = json.load(fp)
+    assert hal_xml not in cache
+
+
+def test_packages_deps_cache_per_config(build_worktree, toolchains):
+    """ Test each build config keeps its own cache of the package dependencies """
+    for name in ["foo", "bar"]:
+        toolchains.create(name)
+        qibuild.config.add_build_config(name, toolchain=name)
+        toolchains.add_package(name, "lib%s" % name)
+    for name in ["foo", "bar", "foo"]:
+        other_worktree = qibuild.worktree.BuildWorkTree(build_worktree.worktree)
+        other_worktree.set_active_config(name)
+        assert "lib%s" % name in other_worktree.deps_graph.package_deps
+    with open(os.path.join(build_worktree.dot_qi, "foo", "deps_cache.json"), "r") as fp:
+        foo_cache = json.load(fp)
+    with open(os.path.join(build_worktree.dot_qi, "bar", "deps_cache.json"), "r") as fp:
+        bar_cache = json.load(fp)
+    assert ["libfoo"] == [os.path.basename(os.path.dirname(x)) for x in foo_cache]
+    assert ["libbar"] == [os.path.basename(os.path.dirname(x)) for x in bar_cache]
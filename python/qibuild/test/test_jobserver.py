@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Test Job Server """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import sys
+import pytest
+
+import qibuild.jobserver
+
+pytestmark = pytest.mark.skipif(not qibuild.jobserver.is_supported(),
+                                reason="no FIFO on this platform")
+
+
+def test_slots_are_shared():
+    """ Test Slots Are Shared """
+    with qibuild.jobserver.JobServer(4, num_workers=2) as job_server:
+        assert job_server.fair_share == 2
+        with job_server.slots(max_slots=job_server.fair_share) as first:
+            assert first == 2
+            with job_server.slots(max_slots=8) as second:
+                assert second == 2
+                assert not job_server._try_acquire()
+        # every token is back
+        with job_server.slots(max_slots=8) as num_slots:
+            assert num_slots == 4
+
+
+def test_make_flags():
+    """ Test Make Flags """
+    with qibuild.jobserver.JobServer(3) as job_server:
+        (read_fd, write_fd) = job_server.pass_fds
+        assert "-j3" in job_server.make_flags()
+        assert "--jobserver-auth=%i,%i" % (read_fd, write_fd) in job_server.make_flags()
+
+
+COMPILER_LAUNCHER = """\
+import os
+import sys
+import time
+import subprocess
+
+running = {running!r}
+marker = os.path.join(running, str(os.getpid()))
+open(marker, "w").close()
+with open({log!r}, "a") as fp:
+    fp.write("%i %s\\n" % (len(os.listdir(running)), os.environ.get("MAKEFLAGS", "")))
+# give the other jobs a chance to start
+time.sleep(0.5)
+try:
+    rc = subprocess.call(sys.argv[1:])
+finally:
+    os.remove(marker)
+sys.exit(rc)
+"""
+
+
+def test_make_parallel_with_jobs(qibuild_action, tmpdir):
+    """ Test qibuild make -J2 -j3 """
+    running = tmpdir.mkdir("running")
+    log = tmpdir.join("compiler.log")
+    launcher = tmpdir.join("launcher.py")
+    launcher.write(COMPILER_LAUNCHER.format(running=running.strpath, log=log.strpath))
+    launcher_arg = "%s;%s" % (sys.executable, launcher.strpath)
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello", "-G", "Unix Makefiles",
+                   "-DCMAKE_C_COMPILER_LAUNCHER=%s" % launcher_arg,
+                   "-DCMAKE_CXX_COMPILER_LAUNCHER=%s" % launcher_arg)
+    qibuild_action("make", "hello", "-J2", "-j3")
+    jobs = [x.split(" ", 1) for x in log.read().splitlines()]
+    assert jobs
+    # Every compiler ran under make, which got its slots from the job server
+    assert all("--jobserver-auth" in makeflags for (_, makeflags) in jobs)
+    # Never more than 3 compilers at the same time, in both projects
+    assert max(int(num_running) for (num_running, _) in jobs) <= 3
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Test Ninja Report """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import pytest
+
+import qisys.command
+import qibuild.ninja_report
+
+
+def test_parse_explain():
+    """ Test Parse Explain """
+    output = """\
+ninja explain: output CMakeFiles/world.dir/world.cpp.o older than most recent input /src/world/world.cpp (1 vs 2)
+ninja explain: CMakeFiles/world.dir/world.cpp.o is dirty
+ninja explain: output sdk/lib/libworld.so doesn't exist
+ninja explain: command line changed for sdk/bin/hello
+[1/3] Building CXX object CMakeFiles/world.dir/world.cpp.o
+"""
+    assert qibuild.ninja_report.parse_explain(output) == [
+        ("CMakeFiles/world.dir/world.cpp.o", "/src/world/world.cpp"),
+        ("sdk/lib/libworld.so", qibuild.ninja_report.MISSING_OUTPUT),
+        ("sdk/bin/hello", qibuild.ninja_report.COMMAND_LINE_CHANGED),
+    ]
+
+
+def test_read_ninja_log(tmpdir):
+    """ Test Read Ninja Log """
+    ninja_log = tmpdir.join(".ninja_log")
+    ninja_log.write("# ninja log v5\n0\t1500\t0\tworld.o\tabc\n")
+    entries, offset = qibuild.ninja_report.read_ninja_log(ninja_log.strpath)
+    assert entries == [("world.o", 1.5)]
+    ninja_log.write("100\t350\t0\thello.o\tdef\n", mode="a")
+    entries, _offset = qibuild.ninja_report.read_ninja_log(ninja_log.strpath, offset=offset)
+    assert entries == [("hello.o", 0.25)]
+
+
+@pytest.mark.skipif(not qisys.command.find_program("ninja"), reason="ninja not found")
+def test_make_with_ninja_report(qibuild_action, record_messages):
+    """ Test Make With Ninja Report """
+    world_proj = qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello", "-G", "Ninja")
+    # the project names are not taken as the number of targets
+    qibuild_action("make", "--ninja-report", "hello")
+    assert record_messages.find("Most expensive targets")
+    world_cpp = os.path.join(world_proj.path, "world", "world.cpp")
+    with open(world_cpp, "a") as fp:
+        fp.write("\n// a change\n")
+    record_messages.reset()
+    qibuild_action("make", "hello", "--ninja-report", "--ninja-report-top", "3")
+    assert record_messages.find(r"world\.cpp.*\(1 target\)")
+    assert record_messages.find(r"world/world\.cpp\.o")
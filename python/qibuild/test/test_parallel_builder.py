@@ -7,6 +7,10 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import pytest
+
+import qibuild.build
+import qibuild.cmake_builder
 import qibuild.parallel_builder
 
 
@@ -47,3 +51,52 @@ def test_simple():
     build_log = FakeProject.build_log
     assert is_before(build_log, "a", "c")
     assert is_before(build_log, "b", "c")
+
+
+class FailingProject(FakeProject):
+    """ FailingProject Class """
+
+    def build(self, *args, **kwargs):
+        """ Build """
+        raise Exception("Build failed")
+
+
+def test_critical_path_first():
+    """ Test the job with the longest remaining chain is built first """
+    FakeProject.build_log = list()
+    short = FakeProject("short")
+    long_start = FakeProject("long_start")
+    long_end = FakeProject("long_end", deps=["long_start"])
+    durations = {"short": 10, "long_start": 5, "long_end": 20}
+    builder = qibuild.parallel_builder.ParallelBuilder(durations=durations)
+    builder.prepare_build_jobs([short, long_start, long_end])
+    builder.build(num_workers=1)
+    assert FakeProject.build_log == ["long_start", "long_end", "short"]
+    assert set(builder.durations.keys()) == set(["short", "long_start", "long_end"])
+
+
+def test_failure_cancels_pending_jobs():
+    """ Test jobs depending on a failed job are never built """
+    FakeProject.build_log = list()
+    a = FailingProject("a")
+    b = FakeProject("b", deps=["a"])
+    builder = qibuild.parallel_builder.ParallelBuilder()
+    builder.prepare_build_jobs([a, b])
+    with pytest.raises(qibuild.build.BuildFailed) as e:
+        builder.build(num_workers=2)
+    assert e.value.project.name == "a"
+    assert FakeProject.build_log == list()
+    assert "a" not in builder.durations
+
+
+def test_durations_are_saved(qibuild_action):
+    """ Test the build durations used by qibuild make -J are read from the build log """
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "hello", "-J2")
+    build_worktree = qibuild_action.build_worktree
+    cmake_builder = qibuild.cmake_builder.CMakeBuilder(build_worktree)
+    durations = cmake_builder.get_durations("build")
+    assert set(durations.keys()) == set(["hello", "world"])
+    assert set(cmake_builder.get_durations("configure").keys()) == set(["hello", "world"])
@@ -14,8 +14,10 @@ import pytest
 
 import qisrc.git
 import qitoolchain
+import qisys.ui
 import qisys.command
 import qibuild.find
+import qibuild.build_log
 import qibuild.cmake
 import qibuild.config
 from qibuild.test.conftest import TestBuildWorkTree
@@ -54,6 +56,79 @@ def test_single(qibuild_action, record_messages):
     assert not record_messages.find("world")
 
 
+def test_parallel(qibuild_action, record_messages):
+    """ Test Configuring Projects In Parallel """
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "-J2", "hello")
+    configuring = [x for x in qisys.ui._MESSAGES if x.startswith("* (")]
+    # world must be configured before hello, which depends on it
+    assert "world" in configuring[0]
+    assert "hello" in configuring[1]
+    # cmake output is displayed in one block per project
+    assert record_messages.find("Output of cmake for hello")
+    qibuild_action("make", "hello")
+
+
+def test_parallel_failure(qibuild_action):
+    """ Test Configuring Projects In Parallel With CMake Errors """
+    qibuild_action.add_test_project("incorrect_cmake")
+    error = qibuild_action("configure", "-J2", "incorrect_cmake", raises=True)
+    assert "incorrect_cmake" in error
+
+
+def test_skip_if_unchanged(qibuild_action, record_messages):
+    """ Test Configure Is Skipped When Nothing Changed """
+    world_proj = qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    record_messages.reset()
+    qibuild_action("configure", "hello")
+    assert record_messages.find("Reusing configuration of.*world")
+    assert record_messages.find("Reusing configuration of.*hello")
+    # only the files read by cmake matter
+    with open(os.path.join(world_proj.path, "unused.cmake"), "w") as fp:
+        fp.write("# not included\n")
+    record_messages.reset()
+    qibuild_action("configure", "hello")
+    assert record_messages.find("Reusing configuration of.*world")
+    # changing a cmake file of world reconfigures world and hello,
+    # which reads the cmake files generated by world
+    cmake_lists = os.path.join(world_proj.path, "CMakeLists.txt")
+    with open(cmake_lists, "a") as fp:
+        fp.write("\n# a change\n")
+    record_messages.reset()
+    qibuild_action("configure", "hello")
+    assert record_messages.find("Configuring.*world")
+    assert record_messages.find("Configuring.*hello")
+    # as does changing the cmake arguments
+    record_messages.reset()
+    qibuild_action("configure", "hello", "-DFOO=BAR")
+    assert not record_messages.find("Reusing configuration of")
+    record_messages.reset()
+    qibuild_action("configure", "hello", "-DFOO=BAR", "--force")
+    assert not record_messages.find("Reusing configuration of")
+    # the options are only displayed when cmake runs
+    record_messages.reset()
+    qibuild_action("configure", "hello", "-DFOO=BAR", "-DWITH_FOO=ON", "--summarize-options")
+    record_messages.reset()
+    qibuild_action("configure", "hello", "-DFOO=BAR", "-DWITH_FOO=ON", "--summarize-options")
+    assert not record_messages.find("Reusing configuration of")
+    assert record_messages.find(r"WITH_FOO\s+: ON")
+
+
+def test_skip_does_not_record_timings(qibuild_action):
+    """ Test Reused Configurations Are Not Recorded In The Build Log """
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "-J2", "hello")
+    qibuild_action("configure", "-J2", "hello")
+    qibuild_action("configure", "hello")
+    build_worktree = qibuild_action.build_worktree
+    runs = qibuild.build_log.read_runs(qibuild.build_log.get_log_path(build_worktree))
+    assert [len(x["events"]) for x in runs] == [2, 0, 0]
+
+
 def test_qi_use_lib(qibuild_action):
     """ Test Qi Use Lib """
     use_lib_proj = qibuild_action.add_test_project("uselib")
@@ -10,6 +10,7 @@ from __future__ import print_function
 import os
 
 import qitest.project
+import qitoolchain
 import qibuild.find
 import qibuild.config
 from qibuild.test.conftest import QiBuildAction
@@ -303,3 +304,24 @@ def test_install_path_conf(qibuild_action, tmpdir):
     qibuild_action("make", "installme")
     qibuild_action("install", "installme", tmpdir.strpath)
     assert tmpdir.join("share", "qi", "path.conf").check(file=True)
+
+
+def test_parallel_install_dedups_libs(cd_to_tmpdir, monkeypatch):
+    """ Test Parallel Install Deduplicates Libraries From Packages """
+    monkeypatch.setenv("QIBUILD_INSTALL_COPY_MODE", "hardlink")
+    qibuild_action = QiBuildAction()
+    qitoolchain_action = QiToolchainAction()
+    create_foo_toolchain_with_world_package(qibuild_action, qitoolchain_action)
+    qibuild_action("configure", "-c", "foo", "hello")
+    qibuild_action("make", "-c", "foo", "hello")
+    prefix = cd_to_tmpdir.mkdir("prefix")
+    # a library installed twice
+    world_package = qitoolchain.get_toolchain("foo").get_package("world")
+    libworld = os.path.join(world_package.path, "lib", "libworld.so")
+    os.link(libworld, os.path.join(world_package.path, "lib", "libworld-copy.so"))
+    qibuild_action("install", "-c", "foo", "-J2", "hello", prefix.strpath)
+    hello = qibuild.find.find_bin([prefix.strpath], "hello")
+    qisys.command.call([hello])
+    installed_libworld = prefix.join("lib", "libworld.so")
+    assert os.stat(installed_libworld.strpath).st_ino == os.stat(libworld).st_ino
+    assert prefix.join("lib", "libworld-copy.so").islink()
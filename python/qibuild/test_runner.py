@@ -10,18 +10,25 @@ from __future__ import print_function
 import os
 import re
 import sys
+import copy
+import json
 import datetime
+import threading
 import multiprocessing
-import six
 
 import qibuild
 import qitest.conf
 import qitest.runner
+import qitest.reporter
 import qisys.sh
 import qisys.command
 from qisys import ui
 from qisys.qixml import etree
 
+# Only the beginning and the end of the output of a test are kept in memory
+TEST_OUTPUT_HEAD = 1024 * 1024
+MAX_TEST_OUTPUT = 4 * 1024 * 1024
+
 
 class ProjectTestRunner(qitest.runner.TestSuiteRunner):
     """ Implements :py:class:`.TestSuiteRunner` for a qibuild/cmake project. """
@@ -34,12 +41,56 @@ class ProjectTestRunner(qitest.runner.TestSuiteRunner):
         self.break_on_failure = False
         self._num_cpus = -1
         self.ignore_timeouts = False
+        self.gtest_shards = 0
 
     @property
     def launcher(self):
         """ Implements TestSuiteRunner.launcher. """
         return ProcessTestLauncher(self)
 
+    def get_queued_tests(self):
+        """
+        Implements TestSuiteRunner.get_queued_tests.
+        When ``gtest_shards`` is set, each gtest binary with enough test
+        cases is split in shards, run as separate tests.
+        """
+        tests = self.tests
+        if self.gtest_shards < 2:
+            return tests
+        res = list()
+        for test in tests:
+            if test.get("gtest"):
+                res.extend(self.split_gtest(test))
+            else:
+                res.append(test)
+        return res
+
+    def split_gtest(self, test):
+        """ Return the shards of a gtest test, or just the test if it can not be split """
+        env = os.environ.copy()
+        if self.env:
+            env = self.env.copy()
+        env.update(test.get("environment") or dict())
+        binary = os.path.join(self.cwd, test["cmd"][0])
+        cache_path = os.path.join(self.project.sdk_directory, ".gtest-lists.json")
+        test_cases = get_gtest_list(binary, env, cache_path)
+        num_shards = min(self.gtest_shards, len(test_cases))
+        if num_shards < 2:
+            return [test]
+        shard_group = GTestShardGroup(test["name"], num_shards)
+        res = list()
+        for i in range(num_shards):
+            shard = copy.deepcopy(test)
+            shard["name"] = "%s.shard%i" % (test["name"], i)
+            shard["shard_of"] = test["name"]
+            shard["shard_group"] = shard_group
+            environment = shard.get("environment") or dict()
+            environment["GTEST_TOTAL_SHARDS"] = str(num_shards)
+            environment["GTEST_SHARD_INDEX"] = str(i)
+            shard["environment"] = environment
+            res.append(shard)
+        return res
+
     @property
     def test_results_dir(self):
         """ Tets Result Dir """
@@ -143,7 +194,7 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         return os.path.join(self.suite_runner.perf_results_dir,
                             test["name"] + ".xml")
 
-    def launch(self, test):
+    def launch(self, test, worker_index=0):
         """
         Implements :py:func:`qitest.runner.TestLauncher.launch`.
         Also make sure a Junit-like XML file is always written, even
@@ -153,11 +204,13 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         res = qitest.result.TestResult(test)
         if not test.get("timeout"):
             test["timeout"] = 20
-        self._update_test(test)
+        self._update_test(test, worker_index)
         cmd = test["cmd"]
         timeout = test["timeout"]
         cwd = test["working_directory"]
-        process = qisys.command.Process(cmd, cwd=cwd, env=qibuild.stringify_env(test["env"]), capture=self.capture)
+        process = qisys.command.Process(cmd, cwd=cwd, env=qibuild.stringify_env(test["env"]),
+                                        capture=self.capture, max_output=MAX_TEST_OUTPUT,
+                                        head_output=TEST_OUTPUT_HEAD)
         start = datetime.datetime.now()
         if self.ignore_timeouts:
             process.run(timeout=None)
@@ -166,6 +219,8 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         end = datetime.datetime.now()
         delta = end - start
         res.time = float(delta.microseconds) / 10 ** 6 + delta.seconds
+        res.timeout = process.return_type in [qisys.command.Process.TIME_OUT,
+                                              qisys.command.Process.ZOMBIE]
         res.out = process.out
         # Sometimes the process did not have any output,
         # but we still want to let the user know it ran
@@ -185,9 +240,16 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
             message = (ui.red, message)
         res.message = message
         self._post_run(process, res, test)
+        test_out = self.test_out(test)
+        if self.collect_test_cases:
+            res.test_cases = read_test_cases(test_out)
+        if test.get("shard_group"):
+            self._on_shard_done(test)
+        elif not self.suite_runner.per_test_xml:
+            qisys.sh.rm(test_out)
         return res
 
-    def _update_test(self, test):
+    def _update_test(self, test, worker_index=0):
         """ Update the test given the settings on the test suite. """
         self._update_test_cmd_for_project(test)
         self._update_test_executable(test)
@@ -201,7 +263,7 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
             self._nightmare_mode(test)
         num_cpus = self.suite_runner.num_cpus
         if num_cpus != -1:
-            self._with_num_cpus(test, num_cpus)
+            self._with_num_cpus(test, num_cpus, worker_index)
 
     def _update_test_cmd_for_project(self, test):
         """ Update Test Cmd For Project """
@@ -278,10 +340,11 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         cmd.extend(["--gtest_shuffle", "--gtest_repeat=20"])
         test["timeout"] = test["timeout"] * 20
 
-    def _with_num_cpus(self, test, num_cpus):
+    @staticmethod
+    def _with_num_cpus(test, num_cpus, worker_index):
         """ With Num CPUs """
         cpu_list = get_cpu_list(multiprocessing.cpu_count(),
-                                num_cpus, self.worker_index)
+                                num_cpus, worker_index)
         taskset_opts = ["-c", ",".join(str(i) for i in cpu_list)]
         test["cmd"] = ["taskset"] + taskset_opts + test["cmd"]
 
@@ -302,6 +365,21 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         if process_crashed or not os.path.exists(test_out):
             self._write_xml(res, test, test_out)
 
+    def _on_shard_done(self, test):
+        """ Merge the XML files of the shards of a gtest once they all ran """
+        shard_group = test["shard_group"]
+        shard_outs = [os.path.join(self.suite_runner.test_results_dir,
+                                   "%s.shard%i.xml" % (shard_group.name, i))
+                      for i in range(shard_group.num_shards)]
+        if not shard_group.on_shard_done():
+            return
+        if self.suite_runner.per_test_xml:
+            test_out = os.path.join(self.suite_runner.test_results_dir,
+                                    shard_group.name + ".xml")
+            merge_junit_xml(shard_outs, test_out)
+        for shard_out in shard_outs:
+            qisys.sh.rm(shard_out)
+
     @staticmethod
     def _write_xml(res, test, out_xml):
         """ Make sure a Junit XML compatible file is written. """
@@ -312,22 +390,10 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         else:
             encoding = "UTF-8"
 
-        # Arbitrary limit output (~700 lines) to prevent from crashing on read
-        res.out = res.out[-16384:]
-        if six.PY3:
-            res.out = re.sub(r'\x1b[^m]*m', "", str(res.out))
-            message_as_string = " ".join(str(x) for x in res.message if not isinstance(x, ui._Color))
-        else:
-            res.out = re.sub('\x1b[^m]*m', "", res.out)
-            message_as_string = " ".join(str(x) for x in res.message if not isinstance(x, ui._Color))
-            try:
-                res.out = res.out.decode(encoding, "ignore")
-                message_as_string = message_as_string.decode(encoding, "ignore")
-            except UnicodeDecodeError:
-                pass
-
-        # Make sure there are no invalid data in the XML
-        res.out = qisys.qixml.sanitize_xml(res.out)
+        # Only keep the beginning and the end of the output, without colors,
+        # and make sure there are no invalid data in the XML
+        res.out = qitest.reporter.clean_output(res.out)
+        message_as_string = qitest.reporter.message_to_string(res.message)
         if res.ok:
             num_failures = "0"
         else:
@@ -380,6 +446,122 @@ class ProcessTestLauncher(qitest.runner.TestLauncher):
         return None
 
 
+class GTestShardGroup(object):
+    """ Shared by the shards of a gtest, to know when the last one is over """
+
+    def __init__(self, name, num_shards):
+        """ GTestShardGroup Init """
+        self.name = name
+        self.num_shards = num_shards
+        self._remaining = num_shards
+        self._lock = threading.Lock()
+
+    def on_shard_done(self):
+        """ Return True if this was the last shard to run """
+        with self._lock:
+            self._remaining -= 1
+            if self._remaining:
+                return False
+            # Ready for --repeat-until-fail
+            self._remaining = self.num_shards
+            return True
+
+
+def get_gtest_list(binary, env, cache_path):
+    """
+    Return the names of the enabled test cases of a gtest binary,
+    running it with --gtest_list_tests only when it changed since
+    the last time.
+    """
+    try:
+        mtime = os.stat(binary).st_mtime
+    except OSError:
+        return list()
+    cache = dict()
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r") as fp:
+                cache = json.load(fp)
+        except ValueError:
+            pass
+    entry = cache.get(binary)
+    if entry and entry["mtime"] == mtime:
+        return entry["tests"]
+    process = qisys.command.Process([binary, "--gtest_list_tests"], env=qibuild.stringify_env(env))
+    process.run(timeout=20)
+    if process.return_type != qisys.command.Process.OK:
+        return list()
+    tests = parse_gtest_list(process.out)
+    cache[binary] = {"mtime": mtime, "tests": tests}
+    with open(cache_path, "w") as fp:
+        json.dump(cache, fp, indent=2, sort_keys=True)
+    return tests
+
+
+def parse_gtest_list(out):
+    """ Parse the output of --gtest_list_tests """
+    if isinstance(out, bytes):
+        out = out.decode("utf-8", "replace")
+    res = list()
+    test_case = None
+    for line in out.splitlines():
+        # Parametrized tests are followed by a comment
+        line = line.split("#")[0].rstrip()
+        if not line:
+            continue
+        if not line.startswith(" "):
+            test_case = line.strip()
+            continue
+        if test_case is None:
+            continue
+        name = test_case + line.strip()
+        if "DISABLED_" not in name:
+            res.append(name)
+    return res
+
+
+def read_test_cases(xml_path):
+    """ Return the <testcase> elements of a Junit XML file, or None if it can not be read """
+    if not os.path.exists(xml_path):
+        return None
+    try:
+        tree = qisys.qixml.read(xml_path)
+    except Exception as e:
+        ui.warning("Could not read", xml_path, e)
+        return None
+    return tree.getroot().findall(".//testcase")
+
+
+def merge_junit_xml(xml_paths, out_xml):
+    """
+    Merge the test suites of several Junit XML files in out_xml,
+    summing the counters of the <testsuites> root elements
+    """
+    counters = ["tests", "failures", "disabled", "errors"]
+    totals = dict((x, 0) for x in counters)
+    total_time = 0.0
+    root = etree.Element("testsuites")
+    for xml_path in xml_paths:
+        if not os.path.exists(xml_path):
+            continue
+        try:
+            tree = qisys.qixml.read(xml_path)
+        except Exception as e:
+            ui.warning("Could not read", xml_path, e)
+            continue
+        shard_root = tree.getroot()
+        for counter in counters:
+            totals[counter] += int(shard_root.get(counter, 0))
+        total_time += float(shard_root.get("time", 0))
+        for test_suite in shard_root.findall("testsuite"):
+            root.append(test_suite)
+    for counter in counters:
+        root.set(counter, str(totals[counter]))
+    root.set("time", str(total_time))
+    root.set("name", "All")
+    qisys.qixml.write(root, out_xml)
+
+
 def get_cpu_list(total_cpus, num_cpus_per_test, worker_index):
     """ Get CPU List """
     cpu_list = list()
@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
+import operator
 import sys
 
 import qibuild.deps
@@ -28,6 +29,11 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
         self.root = self.worktree.root
         self.build_config = qibuild.build_config.CMakeBuildConfig(self)
         self.build_projects = list()
+        self._build_projects_index = qisys.worktree.ProjectIndex(operator.attrgetter("name"))
+        self._deps_graph = None
+        # The build projects and the packages the graph was computed from
+        self._deps_graph_projects = None
+        self._deps_graph_packages = None
         self._load_build_projects()
         worktree.register(self)
 
@@ -58,6 +64,32 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
         """ The toolchain to use. """
         return self.build_config.toolchain
 
+    @property
+    def deps_graph(self):
+        """
+        The :py:class:`qibuild.deps.DepsGraph` of the build projects and of the
+        packages of the current toolchain.
+        Computed again when the projects are reloaded or the toolchain changes.
+        Call :py:meth:`reload` after changing the dependencies of a project.
+        """
+        toolchain = self.toolchain
+        packages = list()
+        if toolchain:
+            packages = toolchain.packages
+        package_keys = [(x.name, x.path) for x in packages]
+        if self._deps_graph is None or \
+                self.build_projects is not self._deps_graph_projects or \
+                package_keys != self._deps_graph_packages:
+            # one cache per build config, since each config has its own toolchain
+            subdir = self.build_config.build_directory(prefix="")
+            cache_path = os.path.join(self.dot_qi, subdir, "deps_cache.json")
+            qibuild.deps.load_packages_deps(packages, cache_path)
+            self._deps_graph = qibuild.deps.DepsGraph(self.build_projects, packages)
+            # Keep a reference to the list, so that it is never mistaken for a new one
+            self._deps_graph_projects = self.build_projects
+            self._deps_graph_packages = package_keys
+        return self._deps_graph
+
     @property
     def default_config(self):
         """ The default config to use. """
@@ -174,9 +206,9 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
 
     def get_build_project(self, name, raises=True):
         """ Get a :py:class:`.BuildProject` given its name. """
-        for build_project in self.build_projects:
-            if build_project.name == name:
-                return build_project
+        build_project = self._build_projects_index.get(self.build_projects, name)
+        if build_project is not None:
+            return build_project
         if raises:
             mess = ui.did_you_mean("No such qibuild project: %s" % name,
                                    name, [x.name for x in self.build_projects])
@@ -189,12 +221,25 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
 
     def _load_build_projects(self):
         """ Create BuildProject for every buildable project in the worktree. """
+        self._deps_graph = None
         self.build_projects = list()
+        model = self.worktree.snapshot.get_model("build")
+        if model is not None:
+            self.build_projects = [build_project_from_model(self, self.worktree.get_project(x["src"]), x)
+                                   for x in model]
+            return
+        cmake_lists = list()
         for wt_project in self.worktree.projects:
             build_project = new_build_project(self, wt_project)
             if build_project:
                 self.check_unique_name(build_project)
                 self.build_projects.append(build_project)
+            tree = wt_project.read_qiproject_xml()
+            if tree is not None and tree.getroot().get("version") != "3":
+                # qibuild2 projects depend on the presence of a CMakeLists.txt
+                cmake_lists.append(os.path.join(wt_project.path, "CMakeLists.txt"))
+        self.worktree.snapshot.set_model("build", [build_project_to_model(x) for x in self.build_projects],
+                                         paths=cmake_lists)
 
     def configure_build_profile(self, name, flags):
         """ Configure a build profile for the worktree. """
@@ -221,9 +266,9 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
 
     def check_unique_name(self, new_project):
         """ Check Unique Name """
-        for project in self.build_projects:
-            if project.name == new_project.name:
-                raise Exception("""\
+        project = self.get_build_project(new_project.name, raises=False)
+        if project is not None:
+            raise Exception("""\
 Found two projects with the same name ({project.name})
 In:
 * {project.path}
@@ -236,9 +281,9 @@ def new_build_project(build_worktree, project):
     Cerate a new BuildProject from a worktree project.
     Return None if there is no BuildProject here.
     """
-    if not os.path.exists(project.qiproject_xml):
+    tree = project.read_qiproject_xml()
+    if tree is None:
         return None
-    tree = qisys.qixml.read(project.qiproject_xml)
     root = tree.getroot()
     if root.get("version") == "3":
         qibuild_elem = root.find("qibuild")
@@ -260,6 +305,31 @@ def new_build_project(build_worktree, project):
     return build_project
 
 
+def build_project_to_model(build_project):
+    """ What is stored in the worktree snapshot for a BuildProject """
+    return {
+        "src": build_project.src,
+        "name": build_project.name,
+        "version": build_project.version,
+        "build_depends": sorted(build_project.build_depends),
+        "run_depends": sorted(build_project.run_depends),
+        "test_depends": sorted(build_project.test_depends),
+        "host_depends": sorted(build_project.host_depends),
+    }
+
+
+def build_project_from_model(build_worktree, project, model):
+    """ Create a BuildProject from the worktree snapshot """
+    build_project = qibuild.project.BuildProject(build_worktree, project)
+    build_project.name = model["name"]
+    build_project.version = model["version"]
+    build_project.build_depends = set(model["build_depends"])
+    build_project.run_depends = set(model["run_depends"])
+    build_project.test_depends = set(model["test_depends"])
+    build_project.host_depends = set(model["host_depends"])
+    return build_project
+
+
 class BuildWorkTreeError(Exception):
     """ BuildWorkTreeError Exception """
     pass
@@ -7,7 +7,6 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
-import os
 
 import qisys.qixml
 import qisys.worktree
@@ -25,18 +24,27 @@ class DocWorkTree(qisys.worktree.WorkTreeObserver):
         self.worktree = worktree
         self.root = worktree.root
         self.doc_projects = list()
+        # The template project is not looked up by name
+        self._doc_projects_index = qisys.worktree.ProjectIndex(
+            lambda x: None if isinstance(x, TemplateProject) else x.name)
         self._load_doc_projects()
         worktree.register(self)
 
     def _load_doc_projects(self):
         """ Load Doc Projects """
         self.doc_projects = list()
+        model = self.worktree.snapshot.get_model("doc")
+        if model is not None:
+            self.doc_projects = [doc_project_from_model(self, self.worktree.get_project(x["src"]), x)
+                                 for x in model]
+            return
         for worktree_project in self.worktree.projects:
             doc_project = new_doc_project(self, worktree_project)
             if doc_project:
                 if not isinstance(doc_project, TemplateProject):
                     self.check_unique_name(doc_project)
                 self.doc_projects.append(doc_project)
+        self.worktree.snapshot.set_model("doc", [doc_project_to_model(x) for x in self.doc_projects])
 
     @property
     def template_project(self):
@@ -57,11 +65,9 @@ class DocWorkTree(qisys.worktree.WorkTreeObserver):
 
     def get_doc_project(self, name, raises=False):
         """ Get Doc Project """
-        for project in self.doc_projects:
-            if isinstance(project, TemplateProject):
-                continue
-            if project.name == name:
-                return project
+        project = self._doc_projects_index.get(self.doc_projects, name)
+        if project is not None:
+            return project
         if raises:
             mess = ui.did_you_mean("No such qidoc project: %s\n" % name,
                                    name, [x.name for x in self.doc_projects])
@@ -89,10 +95,9 @@ In:
 
 def new_doc_project(doc_worktree, project):
     """ New Doc Project """
-    qiproject_xml = project.qiproject_xml
-    if not os.path.exists(qiproject_xml):
+    tree = project.read_qiproject_xml()
+    if tree is None:
         return None
-    tree = qisys.qixml.read(project.qiproject_xml)
     root = tree.getroot()
     if root.get("version") == "3":
         return _new_doc_project_3(doc_worktree, project)
@@ -102,7 +107,7 @@ def new_doc_project(doc_worktree, project):
 def _new_doc_project_3(doc_worktree, project):
     """ New Doc Project 3 """
     qiproject_xml = project.qiproject_xml
-    tree = qisys.qixml.read(qiproject_xml)
+    tree = project.read_qiproject_xml()
     root = tree.getroot()
     qidoc_elem = root.find("qidoc")
     if qidoc_elem is None:
@@ -122,8 +127,7 @@ def _new_doc_project_2(doc_worktree, project):
     # There is no way to be retro-compatible unless we parse
     # the 'src' attributes of 'spinxdoc' and 'doxygen' tags
     # in qisys.WorkTree ...
-    qiproject_xml = project.qiproject_xml
-    tree = qisys.qixml.read(qiproject_xml)
+    tree = project.read_qiproject_xml()
     root = tree.getroot()
     if qisys.qixml.parse_bool_attr(root, "template_repo"):
         return TemplateProject(doc_worktree, project)
@@ -191,6 +195,40 @@ def _new_doc_project(doc_worktree, project, xml_elem, doc_type):
     return doc_project
 
 
+def doc_project_to_model(doc_project):
+    """ What is stored in the worktree snapshot for a doc project """
+    if isinstance(doc_project, TemplateProject):
+        return {"src": doc_project.src, "type": "template"}
+    return {
+        "src": doc_project.src,
+        "type": doc_project.doc_type,
+        "name": doc_project.name,
+        "dest": doc_project.dest,
+        "depends": doc_project.depends,
+        "prebuild_script": doc_project.prebuild_script,
+        "examples": doc_project.examples,
+        "translated": doc_project.translated,
+        "linguas": doc_project.linguas,
+    }
+
+
+def doc_project_from_model(doc_worktree, project, model):
+    """ Create a doc project from the worktree snapshot """
+    doc_type = model["type"]
+    if doc_type == "template":
+        return TemplateProject(doc_worktree, project)
+    if doc_type == "sphinx":
+        doc_project = SphinxProject(doc_worktree, project, model["name"], dest=model["dest"])
+    else:
+        doc_project = DoxygenProject(doc_worktree, project, model["name"], dest=model["dest"])
+    doc_project.depends = model["depends"]
+    doc_project.prebuild_script = model["prebuild_script"]
+    doc_project.examples = model["examples"]
+    doc_project.translated = model["translated"]
+    doc_project.linguas = model["linguas"]
+    return doc_project
+
+
 class BadProjectConfig(Exception):
     """ BadProjectConfig Exception """
 
@@ -7,7 +7,7 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
-import os
+import operator
 
 import qisys.qixml
 import qisys.worktree
@@ -22,17 +22,26 @@ class LinguistWorkTree(qisys.worktree.WorkTreeObserver):
         self.worktree = worktree
         self.root = worktree.root
         self.linguist_projects = list()
+        self._linguist_projects_index = qisys.worktree.ProjectIndex(operator.attrgetter("name"))
         self._load_linguist_projects()
         worktree.register(self)
 
     def _load_linguist_projects(self):
         """ Load Linguist Projects """
         self.linguist_projects = list()
+        model = self.worktree.snapshot.get_model("linguist")
+        if model is not None:
+            self.linguist_projects = [linguist_project_from_model(self.worktree.get_project(x["src"]), x)
+                                      for x in model]
+            return
+        models = list()
         for worktree_project in self.worktree.projects:
             linguist_project = new_linguist_project(self, worktree_project)
             if linguist_project:
                 self.check_unique_name(linguist_project)
                 self.linguist_projects.append(linguist_project)
+                models.append(linguist_project_to_model(worktree_project, linguist_project))
+        self.worktree.snapshot.set_model("linguist", models)
 
     def reload(self):
         """ Reload """
@@ -40,9 +49,9 @@ class LinguistWorkTree(qisys.worktree.WorkTreeObserver):
 
     def get_linguist_project(self, name, raises=False):
         """ Get Linguits Project """
-        for project in self.linguist_projects:
-            if project.name == name:
-                return project
+        project = self._linguist_projects_index.get(self.linguist_projects, name)
+        if project is not None:
+            return project
         if raises:
             mess = ui.did_you_mean("No such linguist project: %s" % name,
                                    name, [x.name for x in self.linguist_projects])
@@ -66,9 +75,9 @@ class LinguistWorkTree(qisys.worktree.WorkTreeObserver):
 
 def new_linguist_project(_linguist_worktree, project):
     """ New Linguist Project """
-    if not os.path.exists(project.qiproject_xml):
+    tree = project.read_qiproject_xml()
+    if tree is None:
         return None
-    tree = qisys.qixml.read(project.qiproject_xml)
     root = tree.getroot()
     if root.get("version") != "3":
         return None
@@ -107,6 +116,34 @@ Choose between 'linguist' or 'gettext'
     return new_project
 
 
+def linguist_project_to_model(project, linguist_project):
+    """ What is stored in the worktree snapshot for a linguist project """
+    from qilinguist.qtlinguist import QtLinguistProject
+    if isinstance(linguist_project, QtLinguistProject):
+        tr_framework = "linguist"
+    else:
+        tr_framework = "gettext"
+    return {
+        "src": project.src,
+        "tr": tr_framework,
+        "name": linguist_project.name,
+        "domain": linguist_project.domain,
+        "linguas": linguist_project.linguas,
+    }
+
+
+def linguist_project_from_model(project, model):
+    """ Create a linguist project from the worktree snapshot """
+    if model["tr"] == "linguist":
+        from qilinguist.qtlinguist import QtLinguistProject
+        project_class = QtLinguistProject
+    else:
+        from qilinguist.qigettext import GettextProject
+        project_class = GettextProject
+    return project_class(model["name"], project.path, domain=model["domain"],
+                         linguas=model["linguas"])
+
+
 class BadProjectConfig(Exception):
     """ BadProjectConfig Exception """
 
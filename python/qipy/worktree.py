@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
+import operator
 import virtualenv
 
 from qisys import ui
@@ -24,6 +25,7 @@ class PythonWorkTree(qisys.worktree.WorkTreeObserver):
         """ PythonWorkTree Init """
         self.worktree = worktree
         self.python_projects = list()
+        self._python_projects_index = qisys.worktree.ProjectIndex(operator.attrgetter("name"))
         self._load_python_projects()
         self.config = config
         worktree.register(self)
@@ -41,10 +43,11 @@ class PythonWorkTree(qisys.worktree.WorkTreeObserver):
         """ Load Python Projects """
         seen_names = dict()
         self.python_projects = list()
+        model = self.worktree.snapshot.get_model("python")
+        if model is not None:
+            self.python_projects = [python_project_from_model(self, x) for x in model]
+            return
         for project in self.worktree.projects:
-            qiproject_xml = os.path.join(project.path, "qiproject.xml")
-            if not os.path.exists(qiproject_xml):
-                continue
             new_project = new_python_project(self, project)
             if not new_project:
                 continue
@@ -57,12 +60,13 @@ Found two projects with the same name. (%s)
                 raise Exception(mess)
             self.python_projects.append(new_project)
             seen_names[new_project.name] = new_project.src
+        self.worktree.snapshot.set_model("python", [python_project_to_model(x) for x in self.python_projects])
 
     def get_python_project(self, name, raises=False):
         """ Get a Python project given its name """
-        for project in self.python_projects:
-            if project.name == name:
-                return project
+        project = self._python_projects_index.get(self.python_projects, name)
+        if project is not None:
+            return project
         if raises:
             mess = ui.did_you_mean("No such python project: %s" % name,
                                    name, [x.name for x in self.python_projects])
@@ -101,7 +105,9 @@ Found two projects with the same name. (%s)
 def new_python_project(worktree, project):
     """ New Python Project """
     qiproject_xml = project.qiproject_xml
-    tree = qisys.qixml.read(qiproject_xml)
+    tree = project.read_qiproject_xml()
+    if tree is None:
+        return None
     qipython_elem = tree.find("qipython")
     if qipython_elem is None:
         return None
@@ -135,3 +141,31 @@ def new_python_project(worktree, project):
         python_project.setup_with_distutils = \
             qisys.qixml.parse_bool_attr(setup_elem, "with_distutils")
     return python_project
+
+
+def python_project_to_model(python_project):
+    """ What is stored in the worktree snapshot for a Python project """
+    return {
+        "src": python_project.src,
+        "name": python_project.name,
+        "scripts": [x.src for x in python_project.scripts],
+        "modules": [(x.name, x.src, x.qimodule) for x in python_project.modules],
+        "packages": [(x.name, x.src, x.qimodule) for x in python_project.packages],
+        "setup_with_distutils": python_project.setup_with_distutils,
+    }
+
+
+def python_project_from_model(worktree, model):
+    """ Create a Python project from the worktree snapshot """
+    python_project = qipy.project.PythonProject(worktree, model["src"], model["name"])
+    python_project.scripts = [qipy.project.Script(x) for x in model["scripts"]]
+    for (name, src, qimodule) in model["modules"]:
+        module = qipy.project.Module(name, src)
+        module.qimodule = qimodule
+        python_project.modules.append(module)
+    for (name, src, qimodule) in model["packages"]:
+        package = qipy.project.Package(name, src)
+        package.qimodule = qimodule
+        python_project.packages.append(package)
+    python_project.setup_with_distutils = model["setup_with_distutils"]
+    return python_project
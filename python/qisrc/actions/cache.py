@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Manage the machine-level cache of git mirrors used by qisrc clones.
+* update: create or update the mirrors of the projects of the worktree,
+  and update the mirrors already in the cache
+* prune: remove the mirrors which were not used recently
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import sys
+import threading
+
+import qisrc.mirror
+import qisrc.worktree
+import qisys.parsers
+import qisys.parallel
+from qisys import ui
+
+
+def configure_parser(parser):
+    """ Configure parser for this action """
+    qisys.parsers.worktree_parser(parser)
+    qisys.parsers.parallel_parser(parser, default=1)
+    parser.add_argument("command", choices=["update", "prune"])
+    parser.add_argument("--max-age", type=int, metavar="DAYS",
+                        help="prune: remove the mirrors not used for more than DAYS days "
+                        "(default: %i)" % qisrc.mirror.DEFAULT_MAX_AGE)
+    parser.add_argument("--all", action="store_true",
+                        help="prune: remove every mirror")
+
+
+def do(args):
+    """ Main entry point """
+    mirror_cache = qisrc.mirror.MirrorCache()
+    if args.command == "prune":
+        max_age = args.max_age
+        if args.all:
+            max_age = 0
+        removed = mirror_cache.prune(max_age=max_age)
+        ui.info(ui.green, "Removed", ui.reset, ui.bold, len(removed),
+                ui.green, "mirrors from", ui.blue, mirror_cache.root)
+        return
+    if not update(mirror_cache, args):
+        sys.exit(1)
+
+
+def update(mirror_cache, args):
+    """ Update the mirrors, return False if some of them failed """
+    urls = [url for (url, _path) in mirror_cache.get_mirrors()]
+    git_projects = list()
+    worktree = qisys.parsers.get_worktree(args, raises=False)
+    if worktree:
+        git_worktree = qisrc.worktree.GitWorkTree(worktree)
+        git_projects = [x for x in git_worktree.git_projects if x.default_remote]
+        urls.extend(x.clone_url for x in git_projects)
+    urls = sorted(set(urls))
+    if not urls:
+        ui.info(ui.green, "No mirror to update")
+        return True
+    failed = list()
+    lock = threading.Lock()
+    done = [0]
+
+    def update_one(url):
+        """ Update the mirror of one url """
+        ok, message = mirror_cache.update(url)
+        with lock:
+            ui.info_count(done[0], len(urls), ui.blue, url)
+            if not ok:
+                ui.info(ui.red, "  [failed]")
+                failed.append((url, message))
+            done[0] += 1
+
+    ui.info(ui.green, ":: Updating mirrors in", ui.blue, mirror_cache.root)
+    qisys.parallel.foreach(urls, update_one, n_jobs=args.num_jobs)
+    # Projects cloned before the cache was enabled use it from now on
+    for git_project in git_projects:
+        mirror_cache.borrow(git_project.clone_url, git_project.path)
+    for (url, message) in failed:
+        ui.error("Could not update the mirror of", url, "\n" + message)
+    return not failed
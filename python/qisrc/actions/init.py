@@ -22,11 +22,16 @@ def configure_parser(parser):
     """ Configure parser for this action """
     qisys.parsers.worktree_parser(parser)
     qisrc.parsers.groups_parser(parser)
+    qisys.parsers.parallel_parser(parser, default=1)
     parser.add_argument("manifest_url", nargs="?")
     parser.add_argument("-b", "--branch", dest="branch",
                         help="Use this branch for the manifest")
     parser.add_argument("--no-review", dest="review", action="store_false",
                         help="Do not sync the review remotes")
+    parser.add_argument("--depth", type=int,
+                        help="Only fetch the last DEPTH commits of the repositories")
+    parser.add_argument("--filter", dest="clone_filter", metavar="FILTER_SPEC",
+                        help="Make partial clones, for instance with --filter=blob:none")
     parser.add_argument("--all", dest="all", action="store_true",
                         help="Do not use the default group, and clone all the projects "
                         "of the manifest")
@@ -46,7 +51,10 @@ def do(args):
                                              groups=args.groups,
                                              branch=args.branch,
                                              review=args.review,
-                                             all_repos=args.all)
+                                             all_repos=args.all,
+                                             num_jobs=args.num_jobs,
+                                             depth=args.depth,
+                                             clone_filter=args.clone_filter)
         if not ok:
             sys.exit(1)
     ui.info(ui.green, "New qisrc worktree initialized in",
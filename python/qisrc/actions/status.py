@@ -9,6 +9,7 @@ from __future__ import print_function
 
 import sys
 
+import qisrc.git
 import qisrc.parsers
 import qisrc.status
 import qisrc.diff
@@ -20,6 +21,7 @@ def configure_parser(parser):
     """ Configure parser for this action """
     qisys.parsers.worktree_parser(parser)
     qisys.parsers.project_parser(parser)
+    qisys.parsers.parallel_parser(parser, default=1)
     group = parser.add_argument_group("qisrc status options")
     group.add_argument("--untracked-files", "-u",
                        dest="untracked_files",
@@ -35,6 +37,8 @@ def configure_parser(parser):
 
 def do(args):
     """ Main method. """
+    git_context = qisrc.git.get_context()
+    num_processes = git_context.num_processes
     git_worktree = qisrc.parsers.get_git_worktree(args)
     git_projects = qisrc.parsers.get_git_projects(git_worktree, args,
                                                   default_all=True,
@@ -44,16 +48,15 @@ def do(args):
         return
     num_projs = len(git_projects)
     max_len = max(len(p.src) for p in git_projects)
-    state_projects = list()
-    for (i, git_project) in enumerate(git_projects, start=1):
+
+    def on_done(num_done):
+        """ Display the progress """
         if sys.stdout.isatty():
-            src = git_project.src
-            to_write = "Checking (%d/%d) " % (i, num_projs)
-            to_write += src.ljust(max_len)
-            sys.stdout.write(to_write + "\r")
+            sys.stdout.write("Checking (%d/%d)\r" % (num_done, num_projs))
             sys.stdout.flush()
-        state_project = qisrc.status.check_state(git_project, args.untracked_files)
-        state_projects.append(state_project)
+
+    state_projects = qisrc.status.check_states(git_projects, args.untracked_files,
+                                               num_jobs=args.num_jobs, on_done=on_done)
     if sys.stdout.isatty():
         ui.info("Checking (%d/%d):" % (num_projs, num_projs), "done",
                 " " * max_len)
@@ -67,6 +70,7 @@ def do(args):
     qisrc.status.print_not_on_a_branch(state_projects)
     if not args.untracked_files:
         ui.info("Tips: use -u to show untracked files")
+    ui.debug("Spawned", git_context.num_processes - num_processes, "git processes")
     if args.destination:
         mergeable = True
         ui.info("Check the difference between %s and %s" % (git_worktree.branch, args.destination))
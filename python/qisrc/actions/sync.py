@@ -55,8 +55,10 @@ def print_overview(total, skipped, failed):
 def do(args):
     """ Main entry point """
     reset = args.reset
+    git_context = qisrc.git.get_context()
+    num_processes = git_context.num_processes
     git_worktree = qisrc.parsers.get_git_worktree(args)
-    sync_ok = git_worktree.sync()
+    sync_ok = git_worktree.sync(num_jobs=args.num_jobs)
     if not sync_ok:
         sys.exit(1)
     git_projects = qisrc.parsers.get_git_projects(git_worktree, args,
@@ -96,5 +98,6 @@ def do(args):
 
     qisys.parallel.foreach(git_projects, do_sync, n_jobs=args.num_jobs)
     print_overview(len(git_projects), len(skipped), len(failed))
+    ui.debug("Spawned", git_context.num_processes - num_processes, "git processes")
     if failed or skipped:
         sys.exit(1)
@@ -8,16 +8,31 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
+import re
 import functools
+import threading
 import contextlib
 import subprocess
 import six
 
 import qisys
+import qisys.sh
 import qisys.command
 from qisys import ui
 
 
+SHA1_RE = re.compile(r"^[0-9a-f]{40}$")
+
+# Used by Git.get_refs, fields are separated with NUL characters
+FOR_EACH_REF_FORMAT = "%00".join([
+    "%(refname)",
+    "%(objectname)",
+    "%(HEAD)",
+    "%(upstream:remotename)",
+    "%(upstream:remoteref)",
+])
+
+
 class Git(object):
     """ The Git represent a git tree """
 
@@ -71,32 +86,27 @@ class Git(object):
         keep_last_newline = kwargs.get("keep_last_newline", args[0] in keep_last_newline_whitelist)
         if "keep_last_newline" in kwargs:
             del kwargs["keep_last_newline"]
-        git = qisys.command.find_program("git", raises=True)
-        cmd = [git]
+        context = get_context()
+        cmd = [context.executable]
         cmd.extend(args)
         raises = kwargs.get("raises", True)
         if "raises" in kwargs:
             del kwargs["raises"]
-        env = os.environ.copy()
-        for key in os.environ.keys():
-            if key.startswith("GIT_"):
-                del env[key]
-        env_str = {}
-        for key, value in env.items():
-            if six.PY2:
-                if isinstance(key, unicode):
-                    key = key.encode('utf-8')
-                if isinstance(value, unicode):
-                    value = value.encode('utf-8')
-            env_str[key] = value
+        # Sent to the standard input of the command, only when raises is False
+        stdin_data = kwargs.pop("stdin_data", None)
+        env_str = context.get_env()
+        context.count_process()
         if not raises:
             del kwargs["quiet"]
+            if stdin_data is not None:
+                kwargs["stdin"] = subprocess.PIPE
+                stdin_data = stdin_data.encode("utf-8")
             process = subprocess.Popen(cmd,
                                        stdout=subprocess.PIPE,
                                        stderr=subprocess.STDOUT,
                                        env=env_str,
                                        **kwargs)
-            out, _err = process.communicate()
+            out, _err = process.communicate(stdin_data)
             out = out.decode("utf-8", "ignore")
             if not keep_last_newline:
                 # Usually, don't want useless blank lines
@@ -138,6 +148,52 @@ class Git(object):
         lines = out.splitlines()
         return lines
 
+    def get_refs(self, *patterns):
+        """
+        Return the refs matching the patterns, read by a single
+        git for-each-ref, as a list of dicts with the following keys:
+           * ref: the full name of the ref
+           * sha1: the object the ref points to
+           * head: True if this is the current branch
+           * remote, merge: the upstream of a local branch, or None
+        """
+        (status, out) = self.call("for-each-ref", "--format=" + FOR_EACH_REF_FORMAT,
+                                  *patterns, raises=False)
+        if status != 0:
+            return list()
+        res = list()
+        for line in out.splitlines():
+            fields = line.split("\0")
+            if len(fields) != 5:
+                continue
+            ref, sha1, head, remote, merge = fields
+            res.append({
+                "ref": ref,
+                "sha1": sha1,
+                "head": head == "*",
+                "remote": remote or None,
+                "merge": merge or None,
+            })
+        return res
+
+    def get_ref_sha1s(self, refs):
+        """
+        Return a dict ref -> sha1 for all the refs, using a single
+        git cat-file --batch-check. sha1 is None if the ref is not found.
+        """
+        res = dict((ref, None) for ref in refs)
+        if not refs:
+            return res
+        (status, out) = self.call("cat-file", "--batch-check=%(objectname)",
+                                  stdin_data="\n".join(refs) + "\n", raises=False)
+        if status != 0:
+            return res
+        for ref, line in zip(refs, out.splitlines()):
+            # "<ref> missing" or "<ref> ambiguous" when not found
+            if " " not in line.strip():
+                res[ref] = line.strip()
+        return res
+
     def get_current_ref(self, ref="HEAD"):
         """
         Return the current ref
@@ -154,6 +210,10 @@ class Git(object):
 
     def get_current_branch(self):
         """ return the current branch """
+        head = self._get_head_ref()
+        if head:
+            return head["ref"][11:]
+        # Detached HEAD, or branch without any commit yet
         branch = self.get_current_ref()
         if not branch:
             return branch
@@ -161,10 +221,22 @@ class Git(object):
 
     def get_tracking_branch(self, branch=None):
         """ Return the Tacking Branch """
-        if not branch:
-            branch = self.get_current_branch()
-        remote = self.get_config("branch.%s.remote" % branch)
-        merge = self.get_config("branch.%s.merge" % branch)
+        if branch:
+            refs = self.get_refs("refs/heads/%s" % branch)
+            local_ref = refs[0] if refs else None
+        else:
+            local_ref = self._get_head_ref()
+            if local_ref:
+                branch = local_ref["ref"][11:]
+            else:
+                branch = self.get_current_branch()
+        if local_ref and local_ref["remote"]:
+            remote, merge = local_ref["remote"], local_ref["merge"]
+        else:
+            # for-each-ref only knows about upstreams matching the fetch
+            # refspec of an existing remote, so look at the config too
+            remote = self.get_config("branch.%s.remote" % branch)
+            merge = self.get_config("branch.%s.merge" % branch)
         if not remote:
             return None
         if not merge:
@@ -173,6 +245,13 @@ class Git(object):
             return "%s/%s" % (remote, merge[11:])
         return "%s/%s" % (remote, merge)
 
+    def _get_head_ref(self):
+        """ Return the ref of the current branch, see get_refs """
+        for ref in self.get_refs("refs/heads"):
+            if ref["head"]:
+                return ref
+        return None
+
     def __getattr__(self, name):
         """ Generate generic wrapper for call. """
         # If you want to specialize one, remove it from whitelist and write it
@@ -321,6 +400,45 @@ class Git(object):
             return False
         return True
 
+    def is_shallow(self):
+        """ Returns true if this is a shallow clone """
+        rc, out = self._call("rev-parse", "--is-shallow-repository", raises=False)
+        return rc == 0 and out.strip() == "true"
+
+    def has_commit(self, ref):
+        """ Returns true if ref points to a commit available locally """
+        rc, _ = self._call("rev-parse", "--verify", "--quiet", ref + "^{commit}",
+                           raises=False)
+        return rc == 0
+
+    def deepen(self, remote_name, ref):
+        """
+        In a shallow clone, fetch the history needed to use ref.
+        Fetch the commit alone when ref is a sha1, the whole history
+        otherwise, or when the server does not allow it.
+        Does not fail the current transaction.
+        Return True if ref is available
+        """
+        if self.has_commit(ref):
+            return True
+        if not self.is_shallow():
+            return False
+        ui.info(ui.green, "Fetching more history in", self.repo, "to find", ref)
+        if SHA1_RE.match(ref):
+            self._call("fetch", "--quiet", "--depth=1", remote_name, ref, raises=False)
+            if self.has_commit(ref):
+                return True
+        self._call("fetch", "--quiet", "--unshallow", "--tags", remote_name, raises=False)
+        return self.has_commit(ref)
+
+    def set_sparse_checkout(self, patterns):
+        """ Only check out the files matching the patterns, in .gitignore syntax """
+        self.set_config("core.sparseCheckout", "true")
+        info_dir = os.path.join(self.repo, ".git", "info")
+        qisys.sh.mkdir(info_dir, recursive=True)
+        with open(os.path.join(info_dir, "sparse-checkout"), "w") as fp:
+            fp.write("\n".join(patterns) + "\n")
+
     def is_empty(self):
         """ Returns true if there are no commits yet (between `git init` and `git commit`) """
         rc, _ = self.call("rev-parse", "--verify", "HEAD", raises=False)
@@ -435,11 +553,7 @@ class Git(object):
 
     def get_ref_sha1(self, ref):
         """ Return the sha1 from a ref. None if not found. """
-        (ret, sha1) = self.call("show-ref", "--verify", "--hash",
-                                ref, raises=False)
-        if ret == 0:
-            return sha1
-        return None
+        return self.get_ref_sha1s([ref])[ref]
 
     def sync_branch_devel(self, master_branch, fetch_first=True):
         """
@@ -450,12 +564,14 @@ class Git(object):
         if fetch_first:
             self.fetch()
         # First check if master can be fast-forwarded
-        local_sha1 = self.get_ref_sha1("refs/heads/%s" % master_branch.name)
-        if local_sha1 is None:
-            return False
+        local_ref = "refs/heads/%s" % master_branch.name
         remote_ref = "refs/remotes/%s/%s" % \
                      (master_branch.tracks, master_branch.name)
-        remote_sha1 = self.get_ref_sha1(remote_ref)
+        sha1s = self.get_ref_sha1s([local_ref, remote_ref])
+        local_sha1 = sha1s[local_ref]
+        if local_sha1 is None:
+            return False
+        remote_sha1 = sha1s[remote_ref]
         if remote_sha1 is None:
             return False
         if local_sha1 == remote_sha1:
@@ -618,6 +734,66 @@ def name_from_url(url):
         return url.split("/")[-1]
 
 
+class GitContext(object):
+    """
+    Resolve the git executable and the environment of the git commands
+    once per process, and count the git processes spawned.
+    Use get_context() to get the instance shared by all the Git objects.
+    """
+
+    def __init__(self):
+        """ GitContext Init """
+        self.num_processes = 0
+        self._executable = None
+        self._environ = None
+        self._env = None
+        self._lock = threading.Lock()
+
+    @property
+    def executable(self):
+        """ Full path to git """
+        if self._executable is None:
+            self._executable = qisys.command.find_program("git", raises=True)
+        return self._executable
+
+    def get_env(self):
+        """
+        Return the environment of the git commands: os.environ without
+        the GIT_* variables. Only computed again when os.environ changes
+        """
+        environ = dict(os.environ)
+        with self._lock:
+            if environ == self._environ:
+                return self._env
+        env = dict()
+        for key, value in environ.items():
+            if key.startswith("GIT_"):
+                continue
+            if six.PY2:
+                if isinstance(key, unicode):
+                    key = key.encode('utf-8')
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+            env[key] = value
+        with self._lock:
+            self._environ = environ
+            self._env = env
+        return env
+
+    def count_process(self):
+        """ Called each time a git process is spawned """
+        with self._lock:
+            self.num_processes += 1
+
+
+_CONTEXT = GitContext()
+
+
+def get_context():
+    """ Return the GitContext of this process """
+    return _CONTEXT
+
+
 class Transaction(object):
     """ Used to simplify chaining git commands. """
 
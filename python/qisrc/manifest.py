@@ -249,6 +249,13 @@ class RepoConfig(object):
         self.default_remote_name = None
         self.remotes = list()
         self.remote_names = None
+        # Number of commits to fetch when cloning, None to use the
+        # setting of the worktree, 0 for the whole history
+        self.depth = None
+        # For partial clones, for instance "blob:none"
+        self.clone_filter = None
+        # Patterns of the files to check out, everything if empty
+        self.sparse = list()
 
     @property
     def review_remote(self):
@@ -460,6 +467,16 @@ class RepoConfigParser(qisys.qixml.XMLParser):
         self.target.default_remote_name = self._root.get("default_remote")
         if not self.target.default_remote_name:
             self.target.default_remote_name = remote_names[0]
+        depth = self._root.get("depth")
+        if depth is not None:
+            try:
+                self.target.depth = int(depth)
+            except ValueError:
+                mess = "Error when parsing project %s\n" % self.target.project
+                mess += "'depth' should be a number, got %s" % depth
+                raise ManifestError(mess)
+        self.target.clone_filter = self._root.get("filter")
+        self.target.sparse = qisys.qixml.parse_list_attr(self._root, "sparse")
         for upstream_elem in self._root.findall("upstream"):
             name = qisys.qixml.parse_required_attr(upstream_elem, "name")
             url = qisys.qixml.parse_required_attr(upstream_elem, "url")
@@ -481,3 +498,18 @@ class RepoConfigParser(qisys.qixml.XMLParser):
         """ Write Default Branch """
         if self.target.default_branch:
             elem.set("branch", self.target.default_branch)
+
+    def _write_depth(self, elem):
+        """ Write Depth """
+        if self.target.depth is not None:
+            elem.set("depth", str(self.target.depth))
+
+    def _write_clone_filter(self, elem):
+        """ Write Clone Filter """
+        if self.target.clone_filter:
+            elem.set("filter", self.target.clone_filter)
+
+    def _write_sparse(self, elem):
+        """ Write Sparse """
+        if self.target.sparse:
+            elem.set("sparse", " ".join(self.target.sparse))
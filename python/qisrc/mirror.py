@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Machine-level cache of the git repositories cloned by qisrc.
+
+A bare mirror is kept for every clone url, in ``~/.cache/qi/git-mirrors``
+or in ``$QISRC_MIRROR_DIR``. When the cache is enabled, cloning a
+repository first updates the mirror of its url, then borrows the objects
+of the mirror through ``.git/objects/info/alternates``: only the missing
+objects are fetched from the remote, and they are stored once per machine.
+
+The cache is enabled when its directory exists, i.e. after the first
+``qisrc cache update``.
+
+Mirrors never prune their objects, since the clones may use them. Before
+a mirror is removed by ``qisrc cache prune``, the clones still using it
+copy the objects they borrowed.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # Only the threads of this process are serialized
+    fcntl = None
+
+import qisys.sh
+import qisrc.git
+from qisys import ui
+
+# In days
+DEFAULT_MAX_AGE = 30
+
+_LOCK = threading.Lock()
+
+
+def get_default_root():
+    """ Directory of the mirrors """
+    from_env = os.environ.get("QISRC_MIRROR_DIR")
+    if from_env:
+        return from_env
+    return qisys.sh.get_cache_path("qi", "git-mirrors")
+
+
+def get_alternates_path(repo_path):
+    """ Path to the alternates file of a (non bare) git repository """
+    return os.path.join(repo_path, ".git", "objects", "info", "alternates")
+
+
+def read_alternates(repo_path):
+    """ Return the object directories borrowed by a git repository """
+    alternates = get_alternates_path(repo_path)
+    if not os.path.exists(alternates):
+        return list()
+    with open(alternates, "r") as fp:
+        return [x.strip() for x in fp.read().splitlines() if x.strip()]
+
+
+class MirrorCache(object):
+    """
+    MirrorCache Class
+
+    :param root: where to store the mirrors, see get_default_root()
+    """
+
+    def __init__(self, root=None):
+        """ MirrorCache Init """
+        if root is None:
+            root = get_default_root()
+        self.root = root
+
+    @property
+    def enabled(self):
+        """ True if the clones should use the mirrors """
+        return os.path.isdir(self.root)
+
+    def get_mirror_path(self, url):
+        """ Path to the mirror of the given url """
+        name = qisrc.git.name_from_url(url).split("/")[-1]
+        if name.endswith(".git"):
+            name = name[:-4]
+        name = re.sub(r"[^\w.-]", "_", name)
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.root, "%s-%s.git" % (name, digest))
+
+    def get_mirror_paths(self):
+        """ Return the paths of all the mirrors, even those with a broken info file """
+        res = list()
+        if not self.enabled:
+            return res
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.endswith(".git") and os.path.isdir(path):
+                res.append(path)
+        return res
+
+    def get_mirrors(self):
+        """ Return a list of (url, mirror path) """
+        res = list()
+        for path in self.get_mirror_paths():
+            info = self.read_info(path) or dict()
+            url = info.get("url")
+            if url:
+                res.append((url, path))
+        return res
+
+    @staticmethod
+    def read_info(mirror_path):
+        """
+        Read the url, last use and borrowers of a mirror.
+        Return None if the info file cannot be parsed
+        """
+        info_json = os.path.join(mirror_path, "qisrc.json")
+        if not os.path.exists(info_json):
+            return dict()
+        try:
+            with open(info_json, "r") as fp:
+                res = json.load(fp)
+        except ValueError:
+            return None
+        if not isinstance(res, dict):
+            return None
+        return res
+
+    @staticmethod
+    def write_info(mirror_path, info):
+        """
+        Write the url, last use and borrowers of a mirror.
+        The file is replaced at once, so readers never see a partial file
+        """
+        info_json = os.path.join(mirror_path, "qisrc.json")
+        tmp_json = "%s.tmp-%i-%i" % (info_json, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp_json, "w") as fp:
+                json.dump(info, fp, indent=2, sort_keys=True)
+            # os.rename() does not overwrite files on Windows
+            replace = getattr(os, "replace", os.rename)
+            replace(tmp_json, info_json)
+        except Exception:
+            qisys.sh.rm(tmp_json)
+            raise
+
+    @staticmethod
+    @contextlib.contextmanager
+    def locked(mirror_path):
+        """ Serialize the changes of the info of a mirror, across processes """
+        with _LOCK:
+            if not fcntl:
+                yield
+                return
+            with open(os.path.join(mirror_path, "qisrc.lock"), "a") as fp:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+    def update(self, url):
+        """
+        Create or update the mirror of the given url, with one fetch.
+        Return a tuple (ok, message)
+        """
+        mirror_path = self.get_mirror_path(url)
+        if os.path.isdir(mirror_path):
+            git = qisrc.git.Git(mirror_path)
+            rc, out = git.fetch("--prune", "--quiet", "origin", raises=False)
+            if rc != 0:
+                return False, out
+        else:
+            qisys.sh.mkdir(self.root, recursive=True)
+            # Clone next to the final location, and rename it when done,
+            # so that an other process never sees an incomplete mirror
+            tmp_path = "%s.tmp-%i-%i" % (mirror_path, os.getpid(),
+                                         threading.current_thread().ident)
+            git = qisrc.git.Git(tmp_path)
+            rc, out = git.call("clone", "--mirror", "--quiet", url, tmp_path,
+                               cwd=None, raises=False)
+            if rc != 0:
+                qisys.sh.rm(tmp_path)
+                return False, out
+            # Clones may borrow any object of the mirror
+            git.set_config("gc.pruneExpire", "never")
+            try:
+                os.rename(tmp_path, mirror_path)
+            except OSError:
+                # Created by an other process in the mean time
+                qisys.sh.rm(tmp_path)
+        with self.locked(mirror_path):
+            self._touch(mirror_path, url)
+        return True, ""
+
+    def borrow(self, url, repo_path):
+        """
+        Make the git repository in repo_path use the objects of the
+        mirror of url.
+        Return False if there is no mirror for this url
+        """
+        mirror_path = self.get_mirror_path(url)
+        if not os.path.isdir(mirror_path):
+            return False
+        with self.locked(mirror_path):
+            # Maybe removed by prune() while we were waiting for the lock
+            if not os.path.isdir(mirror_path):
+                return False
+            objects = os.path.join(mirror_path, "objects")
+            alternates = read_alternates(repo_path)
+            if objects not in alternates:
+                alternates.append(objects)
+                with open(get_alternates_path(repo_path), "w") as fp:
+                    fp.write("\n".join(alternates) + "\n")
+            self._touch(mirror_path, url, borrower=repo_path)
+        return True
+
+    def prune(self, max_age=None):
+        """
+        Remove the mirrors not used for more than max_age days,
+        all of them if max_age is 0.
+        Return the list of removed mirror paths
+        """
+        if max_age is None:
+            max_age = DEFAULT_MAX_AGE
+        res = list()
+        now = time.time()
+        for mirror_path in self.get_mirror_paths():
+            with self.locked(mirror_path):
+                info = self.read_info(mirror_path)
+                if info is None:
+                    # We do not know which clones still use it
+                    ui.warning("Could not parse the info of", mirror_path, "not removing it")
+                    continue
+                if not info.get("url"):
+                    # Just cloned, not touched yet
+                    continue
+                if max_age and now - info.get("last_used", 0) < max_age * 24 * 3600:
+                    continue
+                objects = os.path.join(mirror_path, "objects")
+                for borrower in info.get("borrowers", list()):
+                    if objects in read_alternates(borrower):
+                        ui.info(ui.green, "*", ui.reset, "copying objects of", ui.blue,
+                                os.path.basename(mirror_path), ui.reset, "in", borrower)
+                        self.dissociate(borrower, objects)
+                qisys.sh.rm(mirror_path)
+            res.append(mirror_path)
+        return res
+
+    @staticmethod
+    def dissociate(repo_path, objects):
+        """ Copy the borrowed objects in the repository, and stop using the mirror """
+        git = qisrc.git.Git(repo_path)
+        git.call("repack", "-a", "-d", "--quiet")
+        alternates = [x for x in read_alternates(repo_path) if x != objects]
+        alternates_path = get_alternates_path(repo_path)
+        if alternates:
+            with open(alternates_path, "w") as fp:
+                fp.write("\n".join(alternates) + "\n")
+        else:
+            os.remove(alternates_path)
+
+    def _touch(self, mirror_path, url, borrower=None):
+        """
+        Remember when the mirror was last used, and by which repos.
+        Called with the lock of the mirror held
+        """
+        info = self.read_info(mirror_path)
+        if info is None:
+            # Keep it as is, so that prune() never removes this mirror
+            ui.warning("Could not parse the info of", mirror_path)
+            return
+        info["url"] = url
+        info["last_used"] = time.time()
+        borrowers = info.get("borrowers", list())
+        if borrower:
+            borrowers = [x for x in borrowers if os.path.isdir(x)]
+            if borrower not in borrowers:
+                borrowers.append(borrower)
+        info["borrowers"] = borrowers
+        self.write_info(mirror_path, info)
@@ -51,6 +51,8 @@ def _reset_hard_to_local_refs_name(git, remote_name, ref, raises=True):
     need_to_fetch, _ = git.call("show", "--oneline", ref, "--", raises=False)
     if need_to_fetch:
         git.fetch(remote_name, "--tags", "--prune")
+        # Or it is older than the history of a shallow clone
+        git.deepen(remote_name, ref)
     # else: SHA-1 already exists locally, no need to fetch
     _, tag_list = git.tag("-l", ref, raises=False)
     is_tag = ref == tag_list
@@ -78,6 +80,9 @@ def clever_reset_ref(git_project, ref, raises=True):
         # Maybe this is a newly pushed tag, try to fetch:
         git.fetch(remote_name, "--prune")
         rc, ref_sha1 = git.call("rev-parse", ref, "--", raises=False)
+        # Or it is older than the history of a shallow clone
+        if rc != 0 and git.deepen(remote_name, ref):
+            rc, ref_sha1 = git.call("rev-parse", ref, "--", raises=False)
         if rc != 0:
             return False, "Could not parse %s as a valid ref" % ref
     _, actual_sha1 = git.call("rev-parse", "HEAD", raises=False)
@@ -7,43 +7,73 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import os
+import threading
+
 import qisrc.git
+import qisys.parallel
 from qisys import ui
 
 
-def stat_tracking_remote(git, branch, tracking):
-    """ Check if branch is ahead and / or behind tracking. """
-    if branch is None or tracking is None:
-        return 0, 0
-    _, local_ref = git.call("rev-parse", branch, raises=False)
-    _, remote_ref = git.call("rev-parse", tracking, raises=False)
-    return stat_ahead_behind(git, local_ref, remote_ref)
-
-
-def stat_fixed_ref(git, remote_ref):
-    """ Check is HEAD is and and / or behind given ref. """
-    _, local_ref = git.call("rev-parse", "HEAD", raises=False)
-    return stat_ahead_behind(git, local_ref, remote_ref)
-
-
 def stat_ahead_behind(git, local_ref, remote_ref):
     """
     Returns a tuple (ahead, behind) describing how far
     from the remote ref the local ref is.
     """
-    behind = 0
-    ahead = 0
-    (ret, out) = git.call("rev-list", "--left-right",
-                          "%s..%s" % (remote_ref, local_ref), raises=False)
-    if ret == 0:
-        ahead = len(out.split())
-    (ret, out) = git.call("rev-list", "--left-right",
-                          "%s..%s" % (local_ref, remote_ref), raises=False)
-    if ret == 0:
-        behind = len(out.split())
+    (ret, out) = git.call("rev-list", "--left-right", "--count",
+                          "%s...%s" % (remote_ref, local_ref), raises=False)
+    if ret != 0:
+        return 0, 0
+    try:
+        behind, ahead = [int(x) for x in out.split()]
+    except ValueError:
+        return 0, 0
     return ahead, behind
 
 
+def parse_status_v2(output):
+    """
+    Parse the output of ``git status --porcelain=v2 --branch``.
+    Return a dict containing the current branch ("head", None if
+    not on a branch), its "upstream", how far "ahead" and "behind"
+    of its upstream it is, and the changes as "lines", in the same
+    format as ``git status --porcelain``.
+    """
+    res = {"head": None, "upstream": None, "ahead": 0, "behind": 0, "lines": list()}
+    for line in output.splitlines():
+        if line.startswith("# branch.head "):
+            head = line[len("# branch.head "):]
+            if head != "(detached)":
+                res["head"] = head
+        elif line.startswith("# branch.upstream "):
+            res["upstream"] = line[len("# branch.upstream "):]
+        elif line.startswith("# branch.ab "):
+            ahead, behind = line[len("# branch.ab "):].split()
+            res["ahead"] = int(ahead)
+            res["behind"] = -int(behind)
+        elif line.startswith("1 "):
+            # 1 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <path>
+            fields = line.split(" ", 8)
+            res["lines"].append(_xy(fields[1]) + " " + fields[8])
+        elif line.startswith("2 "):
+            # 2 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <X><score> <path><tab><origPath>
+            fields = line.split(" ", 9)
+            path, orig_path = fields[9].split("\t", 1)
+            res["lines"].append(_xy(fields[1]) + " " + orig_path + " -> " + path)
+        elif line.startswith("u "):
+            # u <XY> <sub> <m1> <m2> <m3> <mW> <h1> <h2> <h3> <path>
+            fields = line.split(" ", 10)
+            res["lines"].append(_xy(fields[1]) + " " + fields[10])
+        elif line.startswith("? "):
+            res["lines"].append("?? " + line[2:])
+    return res
+
+
+def _xy(xy):
+    """ Convert the XY field of porcelain v2 to the porcelain v1 format """
+    return xy.replace(".", " ")
+
+
 class ProjectState(object):
     """ A class which represent a project and is cleanlyness. """
 
@@ -76,20 +106,24 @@ class ProjectState(object):
 
 
 def check_state(project, untracked):
-    """ Check and register the state of a project. """
+    """
+    Check and register the state of a project.
+    Runs ``git status`` once, and ``git rev-list`` at most once.
+    """
     state_project = ProjectState(project)
     git = qisrc.git.Git(project.path)
-    if not git.is_valid():
+    status = get_status_v2(git, untracked)
+    if status is None:
         state_project.valid = False
         return state_project
-    state_project.clean = git.is_clean(untracked=untracked)
+    state_project.clean = not status["lines"]
     if project.fixed_ref:
-        state_project.ahead, state_project.behind = stat_fixed_ref(git, project.fixed_ref)
+        state_project.ahead, state_project.behind = stat_ahead_behind(git, "HEAD", project.fixed_ref)
         state_project.fixed_ref = project.fixed_ref
-        _set_status(git, state_project, untracked=untracked)
+        _set_status(status, state_project)
         return state_project
-    state_project.current_branch = git.get_current_branch()
-    state_project.tracking = git.get_tracking_branch()
+    state_project.current_branch = status["head"]
+    state_project.tracking = status["upstream"]
     if project.default_remote and project.default_branch:
         state_project.manifest_branch = "%s/%s" % (project.default_remote.name, project.default_branch.name)
     if state_project.current_branch is None:
@@ -98,27 +132,58 @@ def check_state(project, untracked):
     if project.default_branch:
         if state_project.current_branch != project.default_branch.name:
             state_project.incorrect_proj = True
-    (state_project.ahead, state_project.behind) = stat_tracking_remote(
-        git,
-        state_project.current_branch,
-        state_project.tracking)
+    state_project.ahead = status["ahead"]
+    state_project.behind = status["behind"]
     if state_project.incorrect_proj:
-        (state_project.ahead_manifest, state_project.behind_manifest) = stat_tracking_remote(
-            git, state_project.current_branch, "%s/%s" % (
-                project.default_remote.name, project.default_branch.name))
-    _set_status(git, state_project, untracked=untracked)
+        (state_project.ahead_manifest, state_project.behind_manifest) = stat_ahead_behind(
+            git, state_project.current_branch, state_project.manifest_branch)
+    _set_status(status, state_project)
     return state_project
 
 
-def _set_status(git, state_project, untracked=False):
+def get_status_v2(git, untracked):
+    """
+    Return the parsed output of ``git status --porcelain=v2 --branch``,
+    or None if the project is not a valid git repository
+    """
+    if not os.path.isdir(git.repo):
+        return None
+    args = ["--porcelain=v2", "--branch"]
+    if not untracked:
+        args.append("--untracked-files=no")
+    (rc, out) = git.status(*args, raises=False)
+    if rc != 0:
+        return None
+    return parse_status_v2(out)
+
+
+def check_states(projects, untracked, num_jobs=1, on_done=None):
+    """
+    Check the states of the projects, running up to num_jobs checks
+    at the same time. Return the states, in the same order as the projects.
+    :param on_done: called with the number of checked projects after each check
+    """
+    states = dict()
+    lock = threading.Lock()
+
+    def check(project):
+        """ Check one project """
+        state = check_state(project, untracked)
+        with lock:
+            states[project.src] = state
+            if on_done:
+                on_done(len(states))
+    qisys.parallel.foreach(projects, check, n_jobs=num_jobs)
+    return [states[x.src] for x in projects]
+
+
+def _set_status(status, state_project):
     """
     When project is not clean, display git status.
     (untracked files and the like)
     """
     if not state_project.sync_and_clean:
-        out = git.get_status(untracked)
-        if out is not None:
-            state_project.status = [x for x in out.splitlines() if x.strip()]
+        state_project.status = status["lines"]
 
 
 def _print_behind_ahead(behind, ahead):
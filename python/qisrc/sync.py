@@ -8,10 +8,13 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
+import posixpath
+import threading
 
 import qisrc.git
 import qisrc.manifest
 import qisys.qixml
+import qisys.parallel
 from qisys import ui
 from qisys.qixml import etree
 
@@ -33,19 +36,20 @@ class WorkTreeSyncer(object):
         self.old_repos = list()
         self.new_repos = list()
 
-    def sync(self):
+    def sync(self, num_jobs=1):
         """
         Synchronize with a remote manifest:
         * clone missing repos
         * move repos that needs to be moved
         * reconfigure remotes and default branches
         * synchronizes build profiles
+        :param num_jobs: number of repos to clone at the same time
         :returns: True in case of success, False otherwise
         """
         # backup old repos configuration now, so that
         # we know what to sync
         self.old_repos = self.get_old_repos()
-        return self.sync_repos()
+        return self.sync_repos(num_jobs=num_jobs)
 
     @property
     def manifest_xml(self):
@@ -73,7 +77,7 @@ class WorkTreeSyncer(object):
             git.commit("-m", "initial commit")
         return res
 
-    def sync_repos(self, force=False):
+    def sync_repos(self, force=False, num_jobs=1):
         """ Update the manifest, inspect changes,
         and updates the git worktree accordingly.
         """
@@ -88,7 +92,8 @@ class WorkTreeSyncer(object):
             ui.info()
         self._sync_manifest()
         self.new_repos = self.read_remote_manifest()
-        res = self._sync_repos(self.old_repos, self.new_repos, force=force)
+        res = self._sync_repos(self.old_repos, self.new_repos, force=force,
+                               num_jobs=num_jobs)
         # re-read self.old_repos so we can do several syncs:
         self.old_repos = self.get_old_repos(warn_if_missing_group=False)
         # if everything went well, save the manifests configurations:
@@ -141,6 +146,10 @@ class WorkTreeSyncer(object):
                                                            default=True)
         self.manifest.all_repos = qisys.qixml.parse_bool_attr(manifest_elem, "all_repos",
                                                               default=False)
+        depth = manifest_elem.get("depth")
+        if depth is not None:
+            self.manifest.depth = int(depth)
+        self.manifest.clone_filter = manifest_elem.get("filter")
 
     def dump_manifest_config(self):
         """ Save the manifest config in .qi/manifest.xml """
@@ -154,12 +163,22 @@ class WorkTreeSyncer(object):
             manifest_elem.set("review", "true")
         else:
             manifest_elem.set("review", "false")
+        if self.manifest.depth is not None:
+            manifest_elem.set("depth", str(self.manifest.depth))
+        if self.manifest.clone_filter:
+            manifest_elem.set("filter", self.manifest.clone_filter)
         tree = etree.ElementTree(root)
         qisys.qixml.write(tree, self.manifest_xml)
 
     def configure_manifest(self, url, branch="master", groups=None, all_repos=False,
-                           ref=None, review=None, force=False):
-        """ Add a manifest to the list. Will be stored in .qi/manifests/<name> """
+                           ref=None, review=None, force=False, num_jobs=1,
+                           depth=None, clone_filter=None):
+        """
+        Add a manifest to the list. Will be stored in .qi/manifests/<name>
+        :param depth: number of commits to fetch when cloning the repos
+        :param clone_filter: filter used to make partial clones, for
+                             instance "blob:none"
+        """
         if review is None:
             # not set explicitely by the user,
             # (i.e not from qisrc init --no-review)
@@ -172,7 +191,11 @@ class WorkTreeSyncer(object):
         self.manifest.ref = ref
         self.manifest.review = review
         self.manifest.all_repos = all_repos
-        res = self.sync_repos(force=force)
+        if depth is not None:
+            self.manifest.depth = depth
+        if clone_filter is not None:
+            self.manifest.clone_filter = clone_filter
+        res = self.sync_repos(force=force, num_jobs=num_jobs)
         self.configure_projects()
         self.dump_manifest_config()
         return res
@@ -263,7 +286,8 @@ class WorkTreeSyncer(object):
             import_manifest.default_branch = import_manifest.branch
         else:
             import_manifest.default_branch = self.manifest.branch
-        self._sync_git(repo, import_manifest.remotes[0].url, import_manifest.default_branch, import_manifest.fixed_ref)
+        self._sync_git(repo, import_manifest.remotes[0].url, import_manifest.default_branch,
+                       import_manifest.fixed_ref, depth=self.manifest.depth)
 
     def _sync_manifest(self):
         """ Update the local manifest clone with the remote """
@@ -273,28 +297,37 @@ No manifest set for worktree in {root}
 Please run `qisrc init MANIFEST_URL`
 """
             raise Exception(mess.format(root=self.git_worktree.root))
-        self._sync_git(self.manifest_repo, self.manifest.url, self.manifest.branch, self.manifest.ref)
+        self._sync_git(self.manifest_repo, self.manifest.url, self.manifest.branch,
+                       self.manifest.ref, depth=self.manifest.depth)
 
     @staticmethod
-    def _sync_git(repo, url, branch, ref):
+    def _sync_git(repo, url, branch, ref, depth=None):
         """ Sync Git """
         git = qisrc.git.Git(repo)
         git.set_remote("origin", url)
         if git.get_current_branch() != branch:
             git.checkout("-B", branch)
         with git.transaction() as transaction:
-            git.call("remote", "update", "--prune", "origin")
-            git.fetch("origin")
+            if depth:
+                git.fetch("--prune", "--depth=%i" % depth, "origin")
+            else:
+                git.call("remote", "update", "--prune", "origin")
+                git.fetch("origin")
             if ref:
                 to_reset = ref
+                if depth:
+                    git.deepen("origin", to_reset)
                 git.reset("--hard", to_reset)
             else:
                 git.reset("--hard", "origin/%s" % branch)
         if not transaction.ok:
             raise Exception("Update failed\n" + transaction.output)
 
-    def _sync_repos(self, old_repos, new_repos, force=False):
-        """ Sync the remote repo configurations with the git worktree """
+    def _sync_repos(self, old_repos, new_repos, force=False, num_jobs=1):
+        """
+        Sync the remote repo configurations with the git worktree
+        :param num_jobs: number of repos to clone at the same time
+        """
         res = True
         # 1/ create, remove or move the git projects:
         # Compute the work that needs to be done:
@@ -321,36 +354,90 @@ Please run `qisrc init MANIFEST_URL`
                 project = self.git_worktree.get_git_project(new_repo.src)
                 project.read_remote_config(new_repo)
                 project.save_config()
-        for repo in to_rm:
-            self.git_worktree.remove_repo(repo)
-        if to_add:
-            ui.info(ui.green, ":: Cloning new repositories ...")
-        for i, repo in enumerate(to_add):
-            ui.info_count(i, len(to_add),
-                          ui.blue, repo.project,
-                          ui.green, "->",
-                          ui.blue, repo.src,
-                          ui.white, "(%s)" % repo.default_branch)
-            project = self.git_worktree.get_git_project(repo.src)
-            if project:  # Repo is already there, re-apply config
-                project.read_remote_config(repo)
-                project.save_config()
-                continue
-            if not self.git_worktree.clone_missing(repo):
-                res = False
-            else:
-                project = self.git_worktree.get_git_project(repo.src)
-                project.read_remote_config(repo)
-                project.save_config()
-        if to_move:
-            ui.info(ui.green, ":: Moving repositories ...")
-        for (repo, new_src) in to_move:
-            if self.git_worktree.move_repo(repo, new_src, force=force):
-                project = self.git_worktree.get_git_project(new_src)
-                project.read_remote_config(repo)
-                project.save_config()
-            else:
-                res = False
+        # Group the changes made to the worktree, so that worktree.xml is
+        # written and every qiproject.xml re-parsed only once
+        with self.git_worktree.worktree.transaction():
+            for repo in to_rm:
+                self.git_worktree.remove_repo(repo)
+            if to_add:
+                ui.info(ui.green, ":: Cloning new repositories ...")
+                if not self._clone_repos(to_add, num_jobs=num_jobs):
+                    res = False
+            if to_move:
+                ui.info(ui.green, ":: Moving repositories ...")
+            for (repo, new_src) in to_move:
+                if self.git_worktree.move_repo(repo, new_src, force=force):
+                    project = self.git_worktree.get_git_project(new_src)
+                    project.read_remote_config(repo)
+                    project.save_config()
+                else:
+                    res = False
+        return res
+
+    def _clone_repos(self, repos, num_jobs=1):
+        """
+        Clone the missing repos, num_jobs at a time, then add them all to
+        the worktree and apply their configuration.
+        :returns: True if all the clones succeeded
+        """
+        git_worktree = self.git_worktree
+        to_clone = [x for x in repos if not git_worktree.get_git_project(x.src)]
+        max_src = max(len(x.src) for x in repos)
+        # src -> (status, message), see GitWorkTree.fetch_missing
+        results = dict()
+        lock = threading.Lock()
+
+        def clone(repo):
+            """ Clone one repo, and report its progress """
+            try:
+                (status, message) = git_worktree.fetch_missing(repo)
+            except Exception as e:
+                (status, message) = (False, str(e))
+            with lock:
+                ui.info_count(len(results), len(to_clone),
+                              ui.blue, repo.project,
+                              ui.green, "->",
+                              ui.blue, repo.src.ljust(max_src),
+                              ui.white, "(%s)" % repo.default_branch)
+                if status is False:
+                    ui.info(ui.red, "  [failed]")
+                results[repo.src] = (status, message)
+
+        # A repo cannot be cloned while an other one is being cloned
+        # inside it, so nested repos are cloned one after the other
+        nested = get_nested_srcs([x.src for x in to_clone])
+        qisys.parallel.foreach([x for x in to_clone if x.src not in nested],
+                               clone, n_jobs=num_jobs)
+        for repo in to_clone:
+            if repo.src in nested:
+                clone(repo)
+        res = True
+        to_configure = list()
+        for repo in repos:
+            project = git_worktree.get_git_project(repo.src)
+            if not project:
+                (status, message) = results[repo.src]
+                if status is False:
+                    ui.error("Cloning", repo.src, "failed\n" + message)
+                    res = False
+                    continue
+                project = git_worktree.register_clone(repo, cloned=status)
+            project.read_remote_config(repo)
+            to_configure.append(project)
+        # Exceptions would be lost in the worker threads
+        errors = list()
+
+        def configure(project):
+            """ Apply the configuration of one project """
+            try:
+                project.apply_config()
+            except Exception as e:
+                errors.append(e)
+
+        qisys.parallel.foreach(to_configure, configure, n_jobs=num_jobs)
+        git_worktree.save_git_config()
+        if errors:
+            raise errors[0]
         return res
 
     def sync_from_manifest_file(self, xml_path):
@@ -382,6 +469,9 @@ class LocalManifest(object):
         # don't want the head of a branch
         self.review = True
         self.all_repos = False
+        # used when cloning the repos, see RepoConfig
+        self.depth = None
+        self.clone_filter = None
 
     @property
     def groups(self):
@@ -407,6 +497,20 @@ class LocalManifest(object):
             self.all_repos == other.all_repos
 
 
+def get_nested_srcs(srcs):
+    """ Return the set of srcs which contain an other src, or are inside one """
+    srcs = set(srcs)
+    res = set()
+    for src in srcs:
+        parent = posixpath.dirname(src)
+        while parent:
+            if parent in srcs:
+                res.add(src)
+                res.add(parent)
+            parent = posixpath.dirname(parent)
+    return res
+
+
 def compute_repo_diff(old_repos, new_repos):
     """
     Compute the work that needs to be done.
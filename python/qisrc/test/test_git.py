@@ -150,3 +150,28 @@ def test_ending_newlines(cd_to_tmpdir):
     assert rc == 0
     assert out[-1] != "\n"
     assert out != content_1
+
+
+def test_batched_queries(cd_to_tmpdir, git_server):
+    """ Test Batched Queries """
+    git_server.create_repo("foo.git")
+    git = TestGit()
+    git.clone(git_server.srv.join("foo.git").strpath)
+    context = qisrc.git.get_context()
+    num_processes = context.num_processes
+    assert git.get_current_branch() == "master"
+    assert git.get_tracking_branch() == "origin/master"
+    assert git.get_tracking_branch("master") == "origin/master"
+    # One git for-each-ref each time
+    assert context.num_processes - num_processes == 3
+    local_sha1 = git.get_ref_sha1("refs/heads/master")
+    assert len(local_sha1) == 40
+    num_processes = context.num_processes
+    sha1s = git.get_ref_sha1s(["refs/heads/master", "refs/heads/nope",
+                               "refs/remotes/origin/master"])
+    assert context.num_processes - num_processes == 1
+    assert sha1s == {"refs/heads/master": local_sha1,
+                     "refs/heads/nope": None,
+                     "refs/remotes/origin/master": local_sha1}
+    git.checkout("--detach")
+    assert git.get_current_branch() is None
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Test QiSrc Cache """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+
+import pytest
+
+import qisrc.mirror
+from qisrc.test.conftest import TestGitWorkTree, TestGit
+
+
+def test_clones_use_mirrors(qisrc_action, git_server, tmpdir, monkeypatch):
+    """ Test Clones Use Mirrors """
+    monkeypatch.setenv("QISRC_MIRROR_DIR", tmpdir.join("mirrors").strpath)
+    git_server.create_repo("foo.git")
+    git_server.push_file("foo.git", "foo.txt", "foo\n")
+    qisrc_action("init", git_server.manifest_url)
+    git_worktree = TestGitWorkTree()
+    foo_proj = git_worktree.get_git_project("foo")
+    # The cache is not enabled yet
+    assert not qisrc.mirror.read_alternates(foo_proj.path)
+    qisrc_action("cache", "update")
+    mirror_cache = qisrc.mirror.MirrorCache()
+    foo_mirror = mirror_cache.get_mirror_path(foo_proj.clone_url)
+    assert mirror_cache.get_mirrors() == [(foo_proj.clone_url, foo_mirror)]
+    # Projects already cloned use the mirror too
+    assert qisrc.mirror.read_alternates(foo_proj.path) == [os.path.join(foo_mirror, "objects")]
+    git_server.create_repo("bar.git")
+    git_server.push_file("bar.git", "bar.txt", "bar\n")
+    qisrc_action("sync")
+    git_worktree = TestGitWorkTree()
+    bar_proj = git_worktree.get_git_project("bar")
+    bar_mirror = mirror_cache.get_mirror_path(bar_proj.clone_url)
+    assert qisrc.mirror.read_alternates(bar_proj.path) == [os.path.join(bar_mirror, "objects")]
+    assert os.path.exists(os.path.join(bar_proj.path, "bar.txt"))
+    # The clones still work once their mirrors are removed
+    qisrc_action("cache", "prune", "--all")
+    assert not mirror_cache.get_mirrors()
+    for git_project in [foo_proj, bar_proj]:
+        assert not qisrc.mirror.read_alternates(git_project.path)
+        rc, _out = TestGit(git_project.path).call("fsck", "--full", raises=False)
+        assert rc == 0
+
+
+def test_prune_keeps_recent_mirrors(tmpdir, git_server):
+    """ Test Prune Keeps Recent Mirrors """
+    foo_repo = git_server.create_repo("foo.git")
+    mirror_cache = qisrc.mirror.MirrorCache(root=tmpdir.join("mirrors").strpath)
+    ok, _message = mirror_cache.update(foo_repo.clone_url)
+    assert ok
+    assert mirror_cache.prune() == list()
+    assert mirror_cache.prune(max_age=0) == [mirror_cache.get_mirror_path(foo_repo.clone_url)]
+
+
+def test_prune_keeps_mirrors_with_broken_info(tmpdir, git_server):
+    """ Test Prune Keeps Mirrors With Broken Info """
+    foo_repo = git_server.create_repo("foo.git")
+    mirror_cache = qisrc.mirror.MirrorCache(root=tmpdir.join("mirrors").strpath)
+    ok, _message = mirror_cache.update(foo_repo.clone_url)
+    assert ok
+    foo_mirror = mirror_cache.get_mirror_path(foo_repo.clone_url)
+    with open(os.path.join(foo_mirror, "qisrc.json"), "w") as fp:
+        fp.write('{"url": ')
+    assert mirror_cache.read_info(foo_mirror) is None
+    assert mirror_cache.prune(max_age=0) == list()
+    assert os.path.isdir(foo_mirror)
+    # Using the mirror does not overwrite the borrowers we do not know about
+    ok, _message = mirror_cache.update(foo_repo.clone_url)
+    assert ok
+    assert mirror_cache.read_info(foo_mirror) is None
+
+
+def test_write_info_replaces_the_file(tmpdir, monkeypatch):
+    """ Test Write Info Replaces The File """
+    mirror_path = tmpdir.mkdir("foo.git")
+    mirror_cache = qisrc.mirror.MirrorCache(root=tmpdir.strpath)
+    with mirror_cache.locked(mirror_path.strpath):
+        mirror_cache.write_info(mirror_path.strpath, {"url": "foo"})
+
+    def broken_dump(*_args, **_kwargs):
+        """ Fail in the middle of the write """
+        raise IOError("disk full")
+
+    monkeypatch.setattr(qisrc.mirror.json, "dump", broken_dump)
+    with pytest.raises(IOError):
+        mirror_cache.write_info(mirror_path.strpath, {"url": "bar"})
+    assert mirror_cache.read_info(mirror_path.strpath) == {"url": "foo"}
+    assert sorted(os.listdir(mirror_path.strpath)) == ["qisrc.json", "qisrc.lock"]
@@ -242,3 +242,43 @@ def test_init_submodule(qisrc_action, git_server):
     bar_local_path = cwd.join("foo").join("bar")
     assert bar_local_path.isdir()
     assert bar_local_path.join("README").isfile()
+
+
+def test_shallow(qisrc_action, git_server):
+    """ Test Shallow """
+    git_server.create_repo("foo.git")
+    git_server.push_file("foo.git", "a.txt", "a\n")
+    first_sha1 = TestGit(git_server.src.join("foo").strpath).get_ref_sha1("HEAD")
+    git_server.push_file("foo.git", "b.txt", "b\n")
+    qisrc_action("init", git_server.manifest_url, "--depth", "1")
+    git_worktree = TestGitWorkTree()
+    foo_git = TestGit(git_worktree.get_git_project("foo").path)
+    assert foo_git.is_shallow()
+    _rc, count = foo_git.call("rev-list", "--count", "HEAD", raises=False)
+    assert count == "1"
+    # New repos are shallow too
+    git_server.create_repo("bar.git")
+    qisrc_action("sync")
+    bar_git = TestGit(TestGitWorkTree().get_git_project("bar").path)
+    assert bar_git.is_shallow()
+    # Fetch more history when a fixed ref is older than the clone
+    git_server.set_fixed_ref("foo.git", first_sha1)
+    qisrc_action("sync")
+    assert foo_git.get_ref_sha1("HEAD") == first_sha1
+
+
+def test_partial_and_sparse(qisrc_action, git_server):
+    """ Test Partial And Sparse """
+    foo_repo = git_server.create_repo("foo.git")
+    git_server.push_file("foo.git", "a/a.txt", "a\n")
+    git_server.push_file("foo.git", "b/b.txt", "b\n")
+    TestGit(git_server.srv.join("foo.git").strpath).set_config("uploadpack.allowFilter", "true")
+    foo_repo.sparse = ["/a/"]
+    git_server.manifest.dump()
+    git_server.push_manifest("foo: only check out a/")
+    git_server.manifest.load()
+    qisrc_action("init", git_server.manifest_url, "--filter", "blob:none")
+    foo_path = py.path.local(TestGitWorkTree().get_git_project("foo").path)  # pylint:disable=no-member
+    assert foo_path.join("a", "a.txt").check(file=True)
+    assert not foo_path.join("b").check()
+    assert TestGit(foo_path.strpath).get_config("remote.origin.promisor") == "true"
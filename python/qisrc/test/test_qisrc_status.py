@@ -10,6 +10,7 @@ from __future__ import print_function
 import py
 
 import qisrc.git
+import qisrc.status
 from qisrc.test.conftest import TestGitWorkTree
 
 
@@ -95,3 +96,49 @@ def test_fixed_ref_behind(qisrc_action, git_server, record_messages):
     git.call("reset", "--hard", "HEAD~1")
     qisrc_action("status")
     assert record_messages.find("fixed ref v0.1 -1")
+
+
+def test_parse_status_v2():
+    """ Test Parse Status V2 """
+    output = """\
+# branch.oid 8d2d7a8b2f0e1a3c4b5d6e7f8091a2b3c4d5e6f7
+# branch.head master
+# branch.upstream origin/master
+# branch.ab +2 -3
+1 .M N... 100644 100644 100644 3b18e512 3b18e512 src/foo.cpp
+1 A. N... 000000 100644 100644 00000000 2e65efe2 new file.txt
+2 R. N... 100644 100644 100644 9daeafb9 9daeafb9 R100 bar.txt\tbaz.txt
+u UU N... 100644 100644 100644 100644 1f2b3c4d 5e6f7a8b 9c0d1e2f conflict.txt
+? untracked
+"""
+    status = qisrc.status.parse_status_v2(output)
+    assert status["head"] == "master"
+    assert status["upstream"] == "origin/master"
+    assert (status["ahead"], status["behind"]) == (2, 3)
+    assert status["lines"] == [
+        " M src/foo.cpp",
+        "A  new file.txt",
+        "R  baz.txt -> bar.txt",
+        "UU conflict.txt",
+        "?? untracked",
+    ]
+    detached = qisrc.status.parse_status_v2("# branch.oid 8d2d7a8b\n# branch.head (detached)\n")
+    assert detached["head"] is None
+
+
+def test_parallel(qisrc_action, git_server, record_messages, capsys):
+    """ Test Parallel """
+    for name in ["foo", "bar", "baz", "spam"]:
+        git_server.create_repo(name + ".git")
+    qisrc_action("init", git_server.manifest_url)
+    git_worktree = TestGitWorkTree()
+    foo1 = git_worktree.get_git_project("foo")
+    git_server.push_file("foo.git", "new_file", "")
+    qisrc.git.Git(foo1.path).fetch()
+    spam_path = py.path.local(git_worktree.get_git_project("spam").path)  # pylint:disable=no-member
+    spam_path.join(".gitignore").write("*.o\n")
+    qisrc_action("status", "-j", "4")
+    assert record_messages.find("Dirty projects: 2 / 4")
+    assert record_messages.find(r"foo\s+: master tracking -1")
+    out, _ = capsys.readouterr()
+    assert " M spam/.gitignore" in out
@@ -649,3 +649,21 @@ def test_sync_replacing_dirty_directory_with_submodule_fails(qisrc_action, git_s
     assert bar_local_path.isdir()
     assert not bar_local_path.join("README").isfile()
     assert bar_local_path.join("DONTREADME").exists()
+
+
+def test_parallel_clone(qisrc_action, git_server, record_messages):
+    """ Test Parallel Clone """
+    git_server.create_repo("foo.git")
+    qisrc_action("init", git_server.manifest_url, "-j", "4")
+    for name in ["bar", "baz", "spam", "foo/eggs", "broken"]:
+        git_server.create_repo(name + ".git")
+    git_server.srv.join("broken.git").remove()
+    rc = qisrc_action("sync", "-j", "4", retcode=True)
+    assert rc != 0
+    assert record_messages.find("Cloning broken failed")
+    git_worktree = TestGitWorkTree()
+    assert sorted(x.src for x in git_worktree.git_projects) == \
+        ["bar", "baz", "foo", "foo/eggs", "spam"]
+    for git_project in git_worktree.git_projects:
+        git = TestGit(git_project.path)
+        assert git.get_tracking_branch() == "origin/master"
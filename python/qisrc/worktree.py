@@ -13,6 +13,7 @@ import operator
 
 import qisrc.git
 import qisrc.sync
+import qisrc.mirror
 import qisrc.snapshot
 import qisrc.project
 import qisys.worktree
@@ -46,17 +47,21 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         self._root_xml = qisys.qixml.read(self.git_xml).getroot()
         worktree.register(self)
         self.git_projects = list()
+        self._git_projects_index = qisys.worktree.ProjectIndex(operator.attrgetter("src"))
         self.load_git_projects()
         self.syncer = qisrc.sync.WorkTreeSyncer(self)
         self.branch = self.syncer.manifest.branch
 
     def configure_manifest(self, manifest_url, groups=None, all_repos=False,
-                           branch="master", ref=None, review=None, force=False):
+                           branch="master", ref=None, review=None, force=False,
+                           num_jobs=1, depth=None, clone_filter=None):
         """ Add a new manifest to this worktree """
         self.branch = branch
         return self.syncer.configure_manifest(manifest_url, groups=groups,
                                               branch=branch, ref=ref, review=review,
-                                              force=force, all_repos=all_repos)
+                                              force=force, all_repos=all_repos,
+                                              num_jobs=num_jobs, depth=depth,
+                                              clone_filter=clone_filter)
 
     def configure_projects(self, projects):
         """ Configure Projects """
@@ -66,19 +71,23 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         """ Run a sync using just the xml file given as parameter """
         return self.syncer.sync_from_manifest_file(xml_path)
 
-    def sync(self):
+    def sync(self, num_jobs=1):
         """ Delegates to WorkTreeSyncer """
-        return self.syncer.sync()
+        return self.syncer.sync(num_jobs=num_jobs)
 
     def load_git_projects(self):
         """ Build a list of git projects using the xml configuration """
         self.git_projects = list()
+        # Same as _get_elem(), without scanning git.xml for each project
+        git_elems = dict()
+        for xml_elem in self._root_xml.findall("project"):
+            git_elems.setdefault(xml_elem.get("src"), xml_elem)
         for worktree_project in self.worktree.projects:
             project_src = worktree_project.src
             if not qisrc.git.is_git(worktree_project.path):
                 continue
             git_project = qisrc.project.GitProject(self, worktree_project)
-            git_elem = self._get_elem(project_src)
+            git_elem = git_elems.get(project_src)
             if git_elem is not None:
                 git_project.load_xml(git_elem)
             self.git_projects.append(git_project)
@@ -86,9 +95,9 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
     def get_git_project(self, path, raises=False, auto_add=False):
         """ Get a git project by its sources """
         src = self.worktree.normalize_path(path)
-        for git_project in self.git_projects:
-            if git_project.src == src:
-                return git_project
+        git_project = self._git_projects_index.get(self.git_projects, src)
+        if git_project is not None:
+            return git_project
         if auto_add:
             # In the case of submodules, the project may already be found
             # in the qisys WorkTree, but not yet in the GitWorkTree.
@@ -187,48 +196,109 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         """ Add a new project.
         :returns: a boolean telling if the clone succeeded
         """
-        worktree_project = self.worktree.add_project(repo.src)
-        git_project = qisrc.project.GitProject(self, worktree_project)
-        if os.path.exists(git_project.path):
-            git = qisrc.git.Git(git_project.path)
-            git_root = qisrc.git.get_repo_root(git_project.path)
-            if not git_root == git_project.path:
+        status, message = self.fetch_missing(repo)
+        if status is False:
+            ui.error("Cloning repo failed\n" + message)
+            return False
+        self.register_clone(repo, cloned=status)
+        qisys.qixml.write(self._root_xml, self.git_xml)
+        return True
+
+    def fetch_missing(self, repo):
+        """
+        Clone the repo on disk, but do not add it to the worktree, so
+        that several repos can be fetched in parallel.
+        Call register_clone() afterwards.
+        Return a tuple (status, message), where status can be:
+            - None: the repo was already there
+            - False: the clone failed
+            - True: the clone succeeded
+        """
+        path = qisys.sh.to_native_path(os.path.join(self.root, repo.src))
+        # Settings of the repo in the manifest win over the ones of the worktree
+        depth = repo.depth
+        if depth is None:
+            depth = self.manifest.depth
+        clone_filter = repo.clone_filter or self.manifest.clone_filter
+        if os.path.exists(path):
+            git = qisrc.git.Git(path)
+            git_root = qisrc.git.get_repo_root(path)
+            if not git_root == path:
                 # Nested git projects:
-                return self._clone_missing(git_project, repo)
+                return self._clone_missing(path, repo, depth=depth,
+                                           clone_filter=clone_filter)
             if git.is_valid() and git.is_empty():
-                ui.warning("Removing empty git project in", git_project.src)
-                qisys.sh.rm(git_project.path)
+                ui.warning("Removing empty git project in", repo.src)
+                qisys.sh.rm(path)
             else:
                 # Do nothing, the remote will be re-configured later
                 # anyway
-                return True
-        return self._clone_missing(git_project, repo)
+                return None, ""
+        return self._clone_missing(path, repo, depth=depth, clone_filter=clone_filter)
 
-    def _clone_missing(self, git_project, repo):
+    @staticmethod
+    def _clone_missing(path, repo, depth=None, clone_filter=None):
         """ Clone Missing """
         branch = repo.default_branch
         fixed_ref = repo.fixed_ref
         clone_url = repo.clone_url
-        qisys.sh.mkdir(git_project.path, recursive=True)
-        git = qisrc.git.Git(git_project.path)
+        qisys.sh.mkdir(path, recursive=True)
+        git = qisrc.git.Git(path)
         remote_name = repo.default_remote.name
-        try:
+        fetch_args = [remote_name, "--quiet"]
+        if depth:
+            fetch_args.append("--depth=%i" % depth)
+        if clone_filter:
+            fetch_args.append("--filter=%s" % clone_filter)
+        mirror_cache = qisrc.mirror.MirrorCache()
+        if mirror_cache.enabled:
+            ok, message = mirror_cache.update(clone_url)
+            if not ok:
+                ui.warning("Could not update the mirror of", clone_url, "\n" + message)
+        with git.transaction() as transaction:
             git.init()
+            if transaction.ok and mirror_cache.enabled:
+                mirror_cache.borrow(clone_url, path)
             git.remote("add", remote_name, clone_url)
-            git.fetch(remote_name, "--quiet")
+            if transaction.ok and repo.sparse:
+                git.set_sparse_checkout(repo.sparse)
+            git.fetch(*fetch_args)
+            if transaction.ok and fixed_ref and depth:
+                git.deepen(remote_name, fixed_ref)
             if branch:
                 git.checkout("-b", branch, "%s/%s" % (remote_name, branch))
             if fixed_ref:
                 git.checkout("-q", fixed_ref)
-        except Exception:
-            ui.error("Cloning repo failed")
+        if not transaction.ok:
             if git.is_empty():
-                qisys.sh.rm(git_project.path)
-            self.worktree.remove_project(repo.src)
-            return False
-        self.save_project_config(git_project)
-        self.load_git_projects()
-        return True
+                qisys.sh.rm(path)
+            return False, transaction.output
+        return True, ""
+
+    def register_clone(self, repo, cloned=True):
+        """
+        Add a repo fetched by fetch_missing() to the worktree.
+        .qi/git.xml is not written, so that it can be done only once
+        after registering several repos
+        """
+        worktree_project = self.worktree.add_project(repo.src)
+        git_project = qisrc.project.GitProject(self, worktree_project)
+        if cloned:
+            self._set_elem(git_project.src, git_project.dump_xml())
+        self._add_git_project(git_project)
+        return git_project
+
+    def _add_git_project(self, git_project):
+        """
+        Add a freshly cloned project to the list of git projects.
+        No need to re-read every git project, and the observers are not
+        reloaded yet when the worktree is in a transaction
+        """
+        git_elem = self._get_elem(git_project.src)
+        if git_elem is not None:
+            git_project.load_xml(git_elem)
+        self.git_projects = [x for x in self.git_projects if x.src != git_project.src]
+        self.git_projects.append(git_project)
 
     def move_repo(self, repo, new_src, force=False):
         """ Move a project in the worktree (same remote url, different src) """
@@ -258,6 +328,7 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
             return False
         self.worktree.move_project(project.src, new_src)
         project.src = new_src
+        self._git_projects_index.invalidate()
         self.save_project_config(project)
         return True
 
@@ -331,6 +402,7 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         # not sure when to use from_disk here ...
         if project in self.worktree.projects:
             self.worktree.remove_project(project.src)
+            self.git_projects = [x for x in self.git_projects if x.src != project.src]
 
     def _get_elem(self, src):
         """ Get Elem """
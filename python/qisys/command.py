@@ -17,6 +17,7 @@ import subprocess
 import six
 
 import qibuild.config
+import qisys.supervisor
 from qisys import ui
 
 # Cache for find_program()
@@ -41,6 +42,10 @@ class Process(object):
     * Process.INTERRUPTED (exit code is < 0)
     * Process.NOT_RUN (could not start the process)
     * Process.ZOMBIE (could not kill process after it timed out)
+    When ``max_output`` is set, only the first ``head_output`` bytes and
+    the last ``max_output`` bytes of the output are kept. When the
+    :py:mod:`qisys.supervisor` is available, it runs the process, and the
+    rest of the output is never stored.
     """
 
     OK = 0
@@ -50,7 +55,8 @@ class Process(object):
     INTERRUPTED = 4
     NOT_RUN = 5
 
-    def __init__(self, cmd, cwd=None, env=None, capture=True):
+    def __init__(self, cmd, cwd=None, env=None, capture=True, max_output=None,
+                 head_output=0):
         """ Process Init """
         self.cmd = cmd
         self.cwd = cwd
@@ -61,12 +67,52 @@ class Process(object):
         self.exception = None
         self.return_type = Process.FAILED
         self.capture = capture
+        self.max_output = max_output
+        self.head_output = head_output
         self._thread = None
         self._should_stop_reading = False
         self._reading_thread = None
 
     def run(self, timeout=None):
         """ Run Process """
+        if qisys.supervisor.is_available():
+            self._run_supervised(timeout)
+        else:
+            self._run_with_threads(timeout)
+
+    def _run_supervised(self, timeout):
+        """ Run the process with the shared :py:class:`qisys.supervisor.Supervisor` """
+        ui.debug("Process.run() Calling:", subprocess.list2cmdline(self.cmd))
+        if SIGINT_EVENT.is_set():
+            self.return_type = Process.INTERRUPTED
+            return
+        output = qisys.supervisor.OutputBuffer(max_size=self.max_output,
+                                               head_size=self.head_output)
+        try:
+            child = qisys.supervisor.get_supervisor().spawn(
+                self.cmd, cwd=self.cwd, env=self.env, timeout=timeout,
+                capture=self.capture, output=output)
+        except Exception as e:
+            self.exception = e
+            self.return_type = Process.NOT_RUN
+            return
+        self.returncode = child.wait()
+        if self.capture:
+            self.out = output.getvalue()
+        if child.error:
+            self.exception = child.error
+        elif child.interrupted:
+            self.return_type = Process.INTERRUPTED
+        elif child.killed:
+            self.return_type = Process.ZOMBIE
+        elif child.timed_out:
+            ui.debug("Process.run() Process timed out")
+            self.return_type = Process.TIME_OUT
+        elif self.returncode == 0:
+            self.return_type = Process.OK
+
+    def _run_with_threads(self, timeout):
+        """ Run the process and watch it with helper threads """
         def target():
             """ Target """
             ui.debug("Process.run() Starting thread.")
@@ -99,6 +145,9 @@ class Process(object):
             def read_target():
                 """ Read Target """
                 self.out = self._process.communicate()[0]
+                if self.out and self.max_output is not None:
+                    self.out = qisys.supervisor.head_and_tail(self.out, self.head_output,
+                                                              self.max_output)
 
             self._should_stop_reading = False
             self._reading_thread = threading.Thread(target=read_target)
@@ -163,6 +212,15 @@ class Process(object):
         self._thread.join()
 
 
+def interrupt():
+    """
+    Kill every process run by :py:class:`Process`, and mark them as
+    interrupted. The processes run after this are not even started.
+    """
+    SIGINT_EVENT.set()
+    qisys.supervisor.interrupt_all()
+
+
 def str_from_signal(code):
     """
     Return a description about what happened when the
@@ -515,7 +573,8 @@ def check_is_in_path(executable, env=None):
         raise NotInPath(executable, env=env)
 
 
-def call(cmd, cwd=None, env=None, ignore_ret_code=False, quiet=False, build_config=None):
+def call(cmd, cwd=None, env=None, ignore_ret_code=False, quiet=False, build_config=None,
+         pass_fds=None):
     """
     Execute a command line.
     If ignore_ret_code is False:
@@ -532,6 +591,8 @@ def call(cmd, cwd=None, env=None, ignore_ret_code=False, quiet=False, build_conf
       * NotInPath  if first arg of cmd is not in %PATH%
       * And a normal exception if cwd is given and is not
         an existing directory.
+    pass_fds is a list of file descriptors which must be inherited
+    by the process (on Python2, every file descriptor is inherited).
     """
     exe_full_path = find_program(cmd[0], env=env, build_config=build_config)
     if not exe_full_path:
@@ -549,12 +610,39 @@ def call(cmd, cwd=None, env=None, ignore_ret_code=False, quiet=False, build_conf
     call_kwargs = {"env": env, "cwd": cwd}
     if quiet or ui.CONFIG.get("quiet"):
         call_kwargs["stdout"] = subprocess.PIPE
-    returncode = subprocess.call(cmd, **call_kwargs)
+    if pass_fds and six.PY3:
+        call_kwargs["pass_fds"] = pass_fds
+    if qisys.supervisor.is_available():
+        returncode = _call_supervised(cmd, **call_kwargs)
+    else:
+        returncode = subprocess.call(cmd, **call_kwargs)
     if returncode != 0 and not ignore_ret_code:
         raise CommandFailedException(cmd, returncode, cwd)
     return returncode
 
 
+def _call_supervised(cmd, **kwargs):
+    """
+    Same as subprocess.call(), but using the shared supervisor.
+    The process stays in our process group, so that it gets the
+    signals sent by the terminal.
+    """
+    if kwargs.get("stdout") == subprocess.PIPE:
+        # Nobody would read it
+        kwargs["stdout"] = subprocess.DEVNULL
+    supervisor = qisys.supervisor.get_supervisor()
+    child = supervisor.spawn(cmd, capture=False, new_session=False, **kwargs)
+    try:
+        returncode = child.wait()
+    except BaseException:
+        supervisor.kill(child)
+        child.wait()
+        raise
+    if child.error:
+        raise child.error
+    return returncode
+
+
 @contextlib.contextmanager
 def call_background(cmd, cwd=None, env=None):
     """
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Local daemon serving the read-only actions of qibuild, qisrc and qitoolchain.
+
+The daemon is started with ``qibuild daemon``, and listens on a Unix
+socket in ``~/.cache/qi/``. When it is running, ``qisys.main`` sends the
+actions listed in :py:data:`SERVED_ACTIONS` to the daemon, which runs them
+with the Python modules, the parsed worktree.xml, qiproject.xml and
+qibuild.xml files and the toolchains already loaded. When it is not, actions run in-process as usual.
+
+The daemon runs one action at a time. It answers each request at once
+with "accepted" or "busy": when busy, or when it does not answer, the
+client runs the action itself. Once accepted, the client waits for the
+action to finish, however long it takes.
+
+Models kept by the daemon are validated by the stat signatures of the
+files they were read from, see :py:func:`cached`.
+
+Set the QI_NO_DAEMON environment variable to never use the daemon.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import traceback
+import six
+
+import qisys.sh
+from qisys import ui
+
+# Actions which do not modify anything, and can be run by the daemon
+SERVED_ACTIONS = {
+    "qibuild": ["depends", "find", "info", "list", "list-binaries",
+                "list-configs", "list-profiles", "status"],
+    "qisrc": ["info", "list", "list-groups", "status"],
+    "qitoolchain": ["info", "list", "package-info", "status"],
+}
+
+# Files modified less than RACY_DELAY seconds ago may be modified again
+# without their stat signature changing, so they are not cached
+RACY_DELAY = 2
+
+# Seconds a client waits for the daemon to say whether it accepts the
+# request. connect() returns as soon as the connection is in the listen
+# backlog, so the accept timeout is the one telling that the daemon is stuck
+CONNECT_TIMEOUT = 1
+ACCEPT_TIMEOUT = 2
+
+# Set when running in the daemon: key -> (signatures, value)
+_MODELS = None
+
+
+def get_socket_path():
+    """ Path to the socket of the daemon """
+    return qisys.sh.get_cache_path("qi", "daemon.sock")
+
+
+def get_signature(path):
+    """ Return the stat signature of the file, or None if it does not exist """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size, st.st_ino]
+
+
+def is_racy(signature, now=None):
+    """ True if the file was modified too recently for its signature to be trusted """
+    if now is None:
+        now = time.time()
+    return signature is not None and now - signature[0] < RACY_DELAY
+
+
+def cached(key, paths, factory):
+    """
+    Return factory(), memoized across the requests when running in
+    the daemon, until one of the files in paths changes.
+    Outside of the daemon, this is just factory()
+    """
+    if _MODELS is None:
+        return factory()
+    signatures = [get_signature(x) for x in paths]
+    entry = _MODELS.get(key)
+    if entry and entry[0] == signatures:
+        return entry[1]
+    value = factory()
+    # the factory may have created some of the files
+    signatures = [get_signature(x) for x in paths]
+    if not any(is_racy(x) for x in signatures):
+        _MODELS[key] = (signatures, value)
+    return value
+
+
+def is_served(script_name, args):
+    """ True if the command line can be sent to the daemon """
+    if not hasattr(socket, "AF_UNIX") or os.environ.get("QI_NO_DAEMON"):
+        return False
+    if not args:
+        return False
+    # --home changes global settings, --pdb needs a terminal
+    if any(x == "--pdb" or x.startswith("--home") for x in args):
+        return False
+    return args[0] in SERVED_ACTIONS.get(script_name, list())
+
+
+def try_run(script_name, args, socket_path=None):
+    """
+    Run the command line in the daemon.
+    Return its exit code, or None if there is no daemon to run it
+    """
+    if not is_served(script_name, args):
+        return None
+    if socket_path is None:
+        socket_path = get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    request = {
+        "script_name": script_name,
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(socket_path)
+        sock.settimeout(ACCEPT_TIMEOUT)
+        fp = sock.makefile("rwb")
+        _write_message(fp, request)
+        reply = _read_message(fp)
+        if not reply.get("accepted"):
+            ui.debug("qi daemon in", socket_path, "is busy")
+            return None
+        # The action is running, it takes as long as it takes
+        sock.settimeout(None)
+        response = _read_message(fp)
+        fp.close()
+    except (socket.error, ValueError) as e:
+        # socket.timeout is a socket.error. The served actions do not
+        # modify anything, so running them again is fine
+        ui.debug("Could not use qi daemon in", socket_path, e)
+        return None
+    finally:
+        sock.close()
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["returncode"]
+
+
+def is_running(socket_path=None):
+    """ True if a daemon is listening on the socket """
+    if socket_path is None:
+        socket_path = get_socket_path()
+    try:
+        _send(socket_path, {"ping": True})
+    except (socket.error, ValueError):
+        return False
+    return True
+
+
+def stop(socket_path=None):
+    """ Ask the daemon to stop, return False if it was not running """
+    if socket_path is None:
+        socket_path = get_socket_path()
+    try:
+        _send(socket_path, {"stop": True})
+    except (socket.error, ValueError):
+        return False
+    return True
+
+
+def _send(socket_path, request):
+    """ Send a request answered at once by the daemon, and return its response """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(ACCEPT_TIMEOUT)
+        sock.connect(socket_path)
+        fp = sock.makefile("rwb")
+        _write_message(fp, request)
+        response = _read_message(fp)
+        fp.close()
+    finally:
+        sock.close()
+    return response
+
+
+def _write_message(fp, message):
+    """ Send one JSON message, on one line """
+    fp.write(json.dumps(message).encode("utf-8") + b"\n")
+    fp.flush()
+
+
+def _read_message(fp):
+    """ Read one JSON message, raise ValueError if the connection was closed """
+    line = fp.readline()
+    if not line:
+        raise ValueError("Connection closed")
+    return json.loads(line.decode("utf-8"))
+
+
+def run_request(request):
+    """
+    Run an action as if it was called from the command line of the
+    client, and return a response with its outputs and exit code
+    """
+    import qisys.script
+    script_name = request["script_name"]
+    old_cwd = os.getcwd()
+    old_environ = dict(os.environ)
+    old_config = dict(ui.CONFIG)
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    stdout, stderr = six.StringIO(), six.StringIO()
+    returncode = 0
+    try:
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.stdout, sys.stderr = stdout, stderr
+        parser = argparse.ArgumentParser(prog=script_name)
+        qisys.script.lazy_root_command_main(script_name, parser,
+                                            "%s.actions" % script_name,
+                                            args=request["args"])
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            stderr.write("%s\n" % e.code)
+            returncode = 1
+    except Exception:
+        stderr.write(traceback.format_exc())
+        returncode = 2
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+        os.environ.clear()
+        os.environ.update(old_environ)
+        ui.CONFIG.clear()
+        ui.CONFIG.update(old_config)
+        os.chdir(old_cwd)
+    return {"returncode": returncode,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue()}
+
+
+def preload():
+    """ Import the served actions, so that the first requests are fast too """
+    import qisys.script
+    for (script_name, actions) in SERVED_ACTIONS.items():
+        package_name = "%s.actions" % script_name
+        index = qisys.script.get_action_index(package_name)
+        for action in actions:
+            if action in index:
+                qisys.script.import_action(index[action][0])
+
+
+def serve(socket_path=None, ready=None):
+    """
+    Serve the requests until asked to stop.
+    Each connection has its own thread, but actions are run one at a time,
+    since they change the current directory and the environment
+    :param ready: a threading.Event, set when the daemon is listening
+    """
+    global _MODELS
+    from six.moves import socketserver
+    if socket_path is None:
+        socket_path = get_socket_path()
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            raise Exception("A qi daemon is already running on %s" % socket_path)
+        # left by a daemon which was killed
+        os.remove(socket_path)
+
+    run_lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        """ Handle one request """
+
+        def handle(self):
+            """ Handle """
+            request = _read_message(self.rfile)
+            if request.get("ping"):
+                _write_message(self.wfile, {"pong": True})
+            elif request.get("stop"):
+                _write_message(self.wfile, {"stopping": True})
+                threading.Thread(target=self.server.shutdown).start()
+            elif not run_lock.acquire(False):
+                _write_message(self.wfile, {"busy": True})
+            else:
+                try:
+                    _write_message(self.wfile, {"accepted": True})
+                    ui.info(ui.green, "*", ui.reset, request["script_name"], " ".join(request["args"]))
+                    response = run_request(request)
+                finally:
+                    run_lock.release()
+                _write_message(self.wfile, response)
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """ Answer while an action is running """
+        daemon_threads = True
+
+    preload()
+    _MODELS = dict()
+    server = Server(socket_path, Handler)
+    ui.info(ui.green, "qi daemon listening on", ui.blue, socket_path)
+    if ready:
+        ready.set()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        _MODELS = None
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    ui.info(ui.green, "qi daemon stopped")
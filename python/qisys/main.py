@@ -11,13 +11,15 @@ import os
 import sys
 import argparse
 
-import qibuild
-import qibuild.cmake
+import qisys.daemon
 import qisys.script
 
 
 def print_version(script_name):
     """ Print QiBuild Version """
+    # Only imported here, to keep the startup fast
+    import qibuild
+    import qibuild.cmake
     # TODO: Version number should be at one place only
     sys.stdout.write("%s version 3.16\n" % script_name)
     qibuild_dir = os.path.dirname(qibuild.__file__)
@@ -37,11 +39,13 @@ def main():
     script_name = os.path.basename(script_name)
     parser = argparse.ArgumentParser()
     package_name = ("%s.actions" % script_name)
-    modules = qisys.script.action_modules_from_package(package_name)
     if len(sys.argv) == 2 and sys.argv[1] == '--version':
         print_version(script_name)
         sys.exit(0)
-    qisys.script.root_command_main(script_name, parser, modules)
+    returncode = qisys.daemon.try_run(script_name, sys.argv[1:])
+    if returncode is not None:
+        sys.exit(returncode)
+    qisys.script.lazy_root_command_main(script_name, parser, package_name)
 
 
 if __name__ == "__main__":
@@ -20,15 +20,19 @@ class WorkTreeProject(object):
     It can have nested subprojects.
     """
 
-    def __init__(self, worktree, src):
+    def __init__(self, worktree, src, path=None, subprojects=None):
         """ WorkTreeProject Init """
         self.worktree = worktree
         self.src = src
-        self.subprojects = list()
+        self.subprojects = subprojects or list()
+        # Known when loaded from the worktree snapshot
+        self._path = path
 
     @property
     def path(self):
         """ Give the path in native form. """
+        if self._path:
+            return self._path
         path = os.path.join(self.worktree.root, self.src)
         return qisys.sh.to_native_path(path)
 
@@ -47,11 +51,18 @@ class WorkTreeProject(object):
         """ Write the Licence """
         qisrc.license.write_license(self.qiproject_xml, value)
 
+    def read_qiproject_xml(self):
+        """
+        Return the parsed qiproject.xml, or None if there is none.
+        The tree is shared by every user of the project and must not be modified.
+        """
+        return self.worktree.qiproject_cache.read(self.qiproject_xml)
+
     def parse_qiproject_xml(self):
         """ Parse the qiproject.xml, filling the subprojects list """
-        if not os.path.exists(self.qiproject_xml):
+        tree = self.read_qiproject_xml()
+        if tree is None:
             return
-        tree = qisys.qixml.read(self.qiproject_xml)
         project_elems = tree.findall("project")
         for project_elem in project_elems:
             sub_src = qisys.qixml.parse_required_attr(project_elem, "src",
@@ -8,13 +8,15 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import os
+import ast
 import sys
 import copy
-import doctest
+import json
 import operator
 import argparse
 import six
 
+import qisys.sh
 from qisys import ui
 
 
@@ -195,19 +197,8 @@ def root_command_main(name, parser, modules, args=None):
             print("Warning, skipping", module.__name__)
             print(err)
             continue
-        name = module.__name__.split(".")[-1]
-        # we want to type `foo bar-baz', and not type `foo bar_baz',
-        # even if "bar-baz" is not a valid module name.
-        name = name.replace("_", "-")
-        configurator = module.configure_parser
-        first_doc_line = module.__doc__.splitlines()[0]
-        action_parser = subparsers.add_parser(name, help=first_doc_line)
-        configurator(action_parser)
-        action_parser.formatter_class = argparse.RawDescriptionHelpFormatter
-        doc_lines = module.__doc__.splitlines()
-        epilog = "\n".join(doc_lines[1:])
-        if epilog:
-            action_parser.epilog = first_doc_line + "\n" + epilog
+        name = action_name(module.__name__)
+        add_action_parser(subparsers, name, module)
         action_modules[name] = module
     (help_requested, action) = parse_args_for_help(args)
     if help_requested:
@@ -230,6 +221,142 @@ def root_command_main(name, parser, modules, args=None):
     return True
 
 
+def lazy_root_command_main(name, parser, package_name, args=None):
+    """
+    Same as :py:func:`root_command_main`, but only the module of the
+    action which is run is imported and configured.
+    The list of actions comes from :py:func:`get_action_index`
+        name : name of the main program
+        parser : an instance of ArgumentParser class
+        package_name : the package containing the actions, for instance "qibuild.actions"
+    """
+    if not args:
+        args = sys.argv[1:]
+    index = get_action_index(package_name)
+    subparsers = parser.add_subparsers(dest="action", title="actions")
+    (help_requested, action) = parse_args_for_help(args)
+    if help_requested and action:
+        args = [action, "--help"]
+    elif help_requested:
+        for (name, (_module_name, first_doc_line)) in sorted(index.items()):
+            subparsers.add_parser(name, help=first_doc_line)
+        parser.print_help()
+        sys.exit(0)
+    action = args[0]
+    if action not in index:
+        if help_requested:
+            print("Invalid action!")
+            print("Choose between: ", " ".join(sorted(index.keys())))
+            print("")
+        # Let argparse display the usage and the list of actions
+        for (name, (_module_name, first_doc_line)) in sorted(index.items()):
+            subparsers.add_parser(name, help=first_doc_line)
+        if help_requested:
+            parser.print_help()
+            sys.exit(0)
+        parser.parse_args(args)
+        parser.error("no action given")
+    module = import_action(index[action][0])
+    add_action_parser(subparsers, action, module)
+    pargs = parser.parse_args(args)
+    ui.configure_logging(pargs)
+    _dump_arguments(module.__name__, pargs)
+    main_wrapper(module, pargs)
+    return True
+
+
+def action_name(module_name):
+    """
+    Name of the action implemented in the given module:
+    we want to type `foo bar-baz', and not type `foo bar_baz',
+    even if "bar-baz" is not a valid module name.
+    """
+    return module_name.split(".")[-1].replace("_", "-")
+
+
+def add_action_parser(subparsers, name, module):
+    """ Add the sub parser of an action module """
+    first_doc_line = module.__doc__.splitlines()[0]
+    action_parser = subparsers.add_parser(name, help=first_doc_line)
+    module.configure_parser(action_parser)
+    action_parser.formatter_class = argparse.RawDescriptionHelpFormatter
+    doc_lines = module.__doc__.splitlines()
+    epilog = "\n".join(doc_lines[1:])
+    if epilog:
+        action_parser.epilog = first_doc_line + "\n" + epilog
+    return action_parser
+
+
+def import_action(module_name):
+    """ Import an action module, raise InvalidAction if it is not an action """
+    package_name, module_path = module_name.rsplit(".", 1)
+    if six.PY2:
+        module_path = str(module_path)
+    try:
+        _tmp = __import__(package_name, globals(), locals(), [module_path])
+        module = getattr(_tmp, module_path)
+    except (ImportError, AttributeError) as err:
+        raise InvalidAction(module_name, str(err))
+    check_module(module)
+    return module
+
+
+def get_action_index(package_name):
+    """
+    Return a dict action name -> (module name, first doc line) for the
+    actions of the given package, without importing them.
+    The index is cached in ~/.cache/qi/actions/, and computed again
+    when a module of the package changes.
+    """
+    package = _import_package(package_name)
+    base_path = os.path.dirname(package.__file__)
+    signature = list()
+    for filename in sorted(os.listdir(base_path)):
+        if not filename.endswith(".py") or filename == "__init__.py":
+            continue
+        st = os.stat(os.path.join(base_path, filename))
+        signature.append([filename, st.st_mtime, st.st_size])
+    cache_path = qisys.sh.get_cache_path("qi", "actions", package_name + ".json")
+    try:
+        with open(cache_path, "r") as fp:
+            cache = json.load(fp)
+        if cache["path"] == base_path and cache["signature"] == signature:
+            return dict((k, tuple(v)) for (k, v) in cache["actions"].items())
+    except (IOError, ValueError, KeyError, TypeError):
+        pass
+    index = dict()
+    for (filename, _mtime, _size) in signature:
+        with open(os.path.join(base_path, filename), "rb") as fp:
+            try:
+                tree = ast.parse(fp.read())
+            except SyntaxError as err:
+                print("Skipping %s (%s)" % (filename, err))
+                continue
+        functions = set(x.name for x in tree.body if isinstance(x, ast.FunctionDef))
+        doc = ast.get_docstring(tree, clean=False)
+        if doc is None or not functions.issuperset(["do", "configure_parser"]):
+            print("Warning, skipping", filename, "(not an action)")
+            continue
+        module_name = package_name + "." + filename[:-3]
+        first_doc_line = doc.splitlines()[0] if doc else ""
+        index[action_name(module_name)] = (module_name, first_doc_line)
+    try:
+        with open(cache_path, "w") as fp:
+            json.dump({"path": base_path, "signature": signature, "actions": index}, fp)
+    except IOError as err:
+        ui.debug("Could not write action index", cache_path, err)
+    return index
+
+
+def _import_package(package_name):
+    """ Import a package and return it """
+    splitted = package_name.split(".")[1:]
+    last_part = ".".join(splitted)
+    if six.PY2:
+        last_part = str(last_part)
+    return __import__(package_name, globals(), locals(), [last_part])
+
+
 def check_module(module):
     """
     Check that a module really is an action.
@@ -269,11 +396,7 @@ def action_modules_from_package(package_name):
             [actions.foo.spam, actions.foo.eggs]
     """
     res = list()
-    splitted = package_name.split(".")[1:]
-    last_part = ".".join(splitted)
-    if six.PY2:
-        last_part = str(last_part)
-    package = __import__(package_name, globals(), locals(), [last_part])
+    package = _import_package(package_name)
     base_path = os.path.dirname(package.__file__)
     module_paths = os.listdir(base_path)
     module_paths = [x[:-3] for x in module_paths if x.endswith(".py")]
@@ -294,4 +417,5 @@ def action_modules_from_package(package_name):
 
 
 if __name__ == "__main__":
+    import doctest
     doctest.testmod()
@@ -14,8 +14,10 @@ import time
 import errno
 import ntpath
 import shutil
+import hashlib
 import tempfile
 import warnings
+import threading
 import posixpath
 import contextlib
 import subprocess
@@ -33,6 +35,10 @@ CONFIG_PATH = xdg_config_home
 CACHE_PATH = xdg_cache_home
 SHARE_PATH = xdg_data_home
 
+# From linux/fs.h
+FICLONE = 0x40049409
+COPY_MODES = ["copy", "reflink", "hardlink"]
+
 
 def set_home(home):
     """ Set Home """
@@ -197,7 +203,7 @@ def _handle_dirs(src, dest, root, directories, filter_fun, quiet):
     return installed
 
 
-def _handle_files(src, dest, root, files, filter_fun, quiet):
+def _handle_files(src, dest, root, files, filter_fun, quiet, copier=None):
     """ Helper function used by install() """
     installed = list()
     rel_root = os.path.relpath(root, src)
@@ -223,12 +229,15 @@ def _handle_files(src, dest, root, files, filter_fun, quiet):
             # We do not want to fail if dest exists but is read only
             # (following what `install` does, but not what `cp` does)
             rm(fdest)
-            shutil.copy(fsrc, fdest)
+            if copier:
+                copier.copy(fsrc, fdest)
+            else:
+                shutil.copy(fsrc, fdest)
             installed.append(rel_path)
     return installed
 
 
-def install(src, dest, filter_fun=None, quiet=False):
+def install(src, dest, filter_fun=None, quiet=False, copier=None):
     """
     Install a directory or a file to a destination.
     If filter_fun is not None, then the file will only be
@@ -243,6 +252,7 @@ def install(src, dest, filter_fun=None, quiet=False):
             |__ 4        -> 4.0
             |__ 4.0
     Return the list of files installed (with relative paths)
+    The files are copied by ``copier``, a :py:class:`FileCopier`, if given.
     """
     installed = list()
     # FIXME: add a `safe mode` ala install?
@@ -263,7 +273,7 @@ def install(src, dest, filter_fun=None, quiet=False):
             raise Exception("source and destination are the same directory")
         for (root, dirs, files) in os.walk(src):
             dirs = _handle_dirs(src, dest, root, dirs, filter_fun, quiet)
-            files = _handle_files(src, dest, root, files, filter_fun, quiet)
+            files = _handle_files(src, dest, root, files, filter_fun, quiet, copier=copier)
             installed.extend(files)
     else:
         # Emulate posix `install' behavior:
@@ -279,11 +289,122 @@ def install(src, dest, filter_fun=None, quiet=False):
         # We do not want to fail if dest exists but is read only
         # (following what `install` does, but not what `cp` does)
         rm(dest)
-        shutil.copy(src, dest)
+        if copier:
+            copier.copy(src, dest)
+        else:
+            shutil.copy(src, dest)
         installed.append(os.path.basename(src))
     return installed
 
 
+def md5_checksum(path):
+    """ Compute the md5 checksum of a file """
+    md5 = hashlib.md5()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def reflink(src, dest):
+    """
+    Make dest a copy-on-write clone of src.
+    Raise OSError or IOError if it is not supported, for instance
+    when src and dest are not on the same btrfs or xfs file system.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, "rb") as src_fp:
+        with open(dest, "wb") as dest_fp:
+            try:
+                fcntl.ioctl(dest_fp.fileno(), FICLONE, src_fp.fileno())
+            except (IOError, OSError):
+                dest_fp.close()
+                rm(dest)
+                raise
+    shutil.copymode(src, dest)
+
+
+class FileCopier(object):
+    """
+    Copy files, used by :py:func:`install`.
+
+    :param mode: ``copy`` for regular copies, ``reflink`` to make
+                 copy-on-write clones when the file system supports it, or
+                 ``hardlink`` to make hard links when source and destination
+                 are on the same file system. Note that a hard linked file
+                 must never be modified in place.
+                 Fall back to regular copies when not possible.
+    :param fingerprint_filter: a function called with the destination path,
+                 returning True if the md5 checksum of the file should be
+                 computed during the copy and stored in ``fingerprints``
+
+    Thread-safe.
+    """
+
+    def __init__(self, mode="copy", fingerprint_filter=None):
+        """ FileCopier Init """
+        if mode not in COPY_MODES:
+            raise Exception("Invalid copy mode: %s (choose from %s)" % (mode, ", ".join(COPY_MODES)))
+        self.mode = mode
+        self.fingerprint_filter = fingerprint_filter
+        # destination path -> md5 checksum
+        self.fingerprints = dict()
+        # (source device, destination device) -> False if linking failed
+        self._can_link = dict()
+        self._lock = threading.Lock()
+
+    def copy(self, src, dest):
+        """ Copy src to dest, dest being a file path """
+        fingerprint = None
+        with_fingerprint = self.fingerprint_filter and self.fingerprint_filter(dest)
+        if not (self.mode != "copy" and self._link(src, dest)):
+            if with_fingerprint:
+                fingerprint = self._copy_with_md5(src, dest)
+            else:
+                shutil.copy(src, dest)
+        if with_fingerprint:
+            self.add_fingerprint(dest, fingerprint=fingerprint)
+
+    def add_fingerprint(self, path, fingerprint=None):
+        """ Store the md5 checksum of path, computing it if not given """
+        if fingerprint is None:
+            fingerprint = md5_checksum(path)
+        with self._lock:
+            self.fingerprints[path] = fingerprint
+
+    def _link(self, src, dest):
+        """ Try to hard link or reflink src to dest, return True on success """
+        key = (os.stat(src).st_dev, os.stat(os.path.dirname(dest)).st_dev)
+        if self._can_link.get(key) is False:
+            return False
+        try:
+            if self.mode == "hardlink":
+                os.link(src, dest)
+            else:
+                reflink(src, dest)
+        except (IOError, OSError) as e:
+            ui.debug("Could not", self.mode, src, "to", dest, ":", e)
+            with self._lock:
+                self._can_link[key] = False
+            return False
+        return True
+
+    @staticmethod
+    def _copy_with_md5(src, dest):
+        """ Copy src to dest, computing the md5 checksum of the data at the same time """
+        md5 = hashlib.md5()
+        with open(src, "rb") as src_fp:
+            with open(dest, "wb") as dest_fp:
+                for chunk in iter(lambda: src_fp.read(1024 * 1024), b""):
+                    md5.update(chunk)
+                    dest_fp.write(chunk)
+        shutil.copymode(src, dest)
+        return md5.hexdigest()
+
+
 def safe_copy(src, dest):
     """
     Copy a source file to a destination but
@@ -7,7 +7,7 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
-__all__ = ["DagError", "assert_dag", "topological_sort"]
+__all__ = ["DagError", "assert_dag", "find_cycle", "topological_sort", "topological_levels"]
 
 
 class DagError(Exception):
@@ -26,6 +26,48 @@ class DagError(Exception):
                % (self.node, self.parent, self.node, self.result)
 
 
+def find_cycle(data):
+    """
+    Return a list of nodes forming a cycle in data (the first node
+    being repeated at the end), or None if data is a dag
+    >>> find_cycle({
+    ...   'a' : ( 'g', 'b', 'c', 'd' ),
+    ...   'b' : ( 'e', 'c' ),
+    ...   'e' : ( 'g', 'c' )})
+    >>> find_cycle({
+    ...   'a' : ( 'g', 'b', 'c', 'd' ),
+    ...   'b' : ( 'e', 'c' ),
+    ...   'e' : ( 'a', 'c' )})
+    ['a', 'b', 'e', 'a']
+    """
+    # nodes being visited, in the order of the current path
+    path = list()
+    on_path = set()
+    done = set()
+    for start in data:
+        if start in done:
+            continue
+        path.append(start)
+        on_path.add(start)
+        stack = [iter(data.get(start, ()))]
+        while stack:
+            for dep in stack[-1]:
+                if dep in on_path:
+                    return path[path.index(dep):] + [dep]
+                if dep in done:
+                    continue
+                path.append(dep)
+                on_path.add(dep)
+                stack.append(iter(data.get(dep, ())))
+                break
+            else:
+                stack.pop()
+                node = path.pop()
+                on_path.discard(node)
+                done.add(node)
+    return None
+
+
 def assert_dag(data):
     """
     Check if data is a dag
@@ -39,10 +81,11 @@ def assert_dag(data):
     ...   'e' : ( 'e', 'c' )})
     Traceback (most recent call last):
         ...
-    DagError: Circular dependency error: Starting from 'e', node 'e' depends on 'e', complete path []
+    DagError: Circular dependency error: Starting from 'e', node 'e' depends on 'e', complete path ['e', 'e']
     """
-    for node, _ in data.items():
-        _topological_sort(data, node, node, True)
+    cycle = find_cycle(data)
+    if cycle:
+        raise DagError(cycle[0], cycle[-2], cycle)
 
 
 def topological_sort(data, heads):
@@ -59,6 +102,7 @@ def topological_sort(data, heads):
              If a depend on b and b depend on a, the solution is [ a, b ].
              This is ok in our case but could be a problem in other situation.
              (you know what? try to use the result you will see if it work!).
+             Use :py:func:`assert_dag` to detect cycles.
     >>> topological_sort({
     ...   'head'         : ['telepathe', 'opennao-tools', 'naoqi'],
     ...   'toolchain'    : [],
@@ -102,37 +146,65 @@ def topological_sort(data, heads):
     ...   'e' : ( 'g', 'c' )}, [ 'a', 'q' ])
     ['g', 'c', 'e', 'b', 'd', 'a', 'u', 'y', 'o', 'i', 'q']
     """
-    if isinstance(heads, list):
-        data['internalfakehead'] = heads
-        head = 'internalfakehead'
-        result = _topological_sort(data, head, head)
-        return [x for x in result if x != 'internalfakehead']
-    head = heads
-    return _topological_sort(data, head, head)
-
-
-def _topological_sort(data, head, top_node, raise_exception=False, result=None, visited=None):
-    """ Internal function """
-    if not result:
-        result = []
-    if not visited:
-        visited = []
-    deps = data.get(head, list())
-    if head in visited:
-        if head == top_node and raise_exception:
-            raise DagError(head, head, result)
-        return result
-    visited.append(head)
-    for i in deps:
-        try:
-            result.index(i)
-        except ValueError:
-            # the item does not exist
-            result = _topological_sort(data, i, top_node, raise_exception, result, visited)
-    result.append(head)
+    if not isinstance(heads, list):
+        heads = [heads]
+    result = list()
+    done = set()
+    visited = set()
+    for head in heads:
+        if head not in done:
+            _topological_sort(data, head, result, done, visited)
     return result
 
 
+def topological_levels(data, heads):
+    """
+    Same as :py:func:`topological_sort`, but group the result in levels:
+    the nodes of a level only depend on nodes of the previous levels, so
+    the nodes of a given level can be processed in parallel.
+    Inside a level, nodes are in the order of :py:func:`topological_sort`.
+    >>> topological_levels({
+    ...   'a' : ( 'g', 'b', 'c', 'd' ),
+    ...   'b' : ( 'e', 'c' ),
+    ...   'e' : ( 'g', 'c' )}, 'a')
+    [['g', 'c', 'd'], ['e'], ['b'], ['a']]
+    """
+    levels = list()
+    node_level = dict()
+    for node in topological_sort(data, heads):
+        # dependencies not seen yet are part of a cycle, ignore them
+        dep_levels = [node_level[x] for x in data.get(node, ()) if x in node_level]
+        level = max(dep_levels) + 1 if dep_levels else 0
+        node_level[node] = level
+        if level == len(levels):
+            levels.append(list())
+        levels[level].append(node)
+    return levels
+
+
+def _topological_sort(data, head, result, done, visited):
+    """
+    Internal function: iterative depth-first search from head,
+    appending the nodes to result in post-order
+    """
+    if head in visited:
+        return
+    visited.add(head)
+    stack = [(head, iter(data.get(head, ())))]
+    while stack:
+        node, deps = stack[-1]
+        for dep in deps:
+            if dep in done or dep in visited:
+                continue
+            visited.add(dep)
+            stack.append((dep, iter(data.get(dep, ()))))
+            break
+        else:
+            stack.pop()
+            result.append(node)
+            done.add(node)
+
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Run many child processes from a single thread.
+
+The :py:class:`Supervisor` waits for the output, the exit and the timeout
+of all its children with one selector, instead of using helper threads
+for each of them. Timeouts use a monotonic clock, the output is read into
+a bounded :py:class:`OutputBuffer`, and children which time out are killed
+along with their process group.
+
+The supervisor needs Python 3 on a POSIX system, see :py:func:`is_available`.
+Elsewhere, :py:class:`qisys.command.Process` keeps using threads.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import time
+import errno
+import signal
+import threading
+import subprocess
+import collections
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
+# Seconds left to a child to exit after SIGTERM, before it is killed
+KILL_DELAY = 5
+# How often to check for the exit of the children we cannot select on
+POLL_INTERVAL = 0.05
+# Size of the reads on the pipes
+CHUNK_SIZE = 64 * 1024
+
+_SUPERVISOR = None
+_SUPERVISOR_LOCK = threading.Lock()
+
+
+def is_available():
+    """ True if the supervisor can be used on this platform """
+    return selectors is not None and os.name == "posix"
+
+
+def get_supervisor():
+    """ Return the supervisor shared by the whole process """
+    global _SUPERVISOR
+    with _SUPERVISOR_LOCK:
+        if _SUPERVISOR is None:
+            _SUPERVISOR = Supervisor()
+        return _SUPERVISOR
+
+
+def interrupt_all():
+    """ Kill the children of the shared supervisor, if there is one """
+    with _SUPERVISOR_LOCK:
+        supervisor = _SUPERVISOR
+    if supervisor:
+        supervisor.interrupt()
+
+
+def skipped_marker(num_bytes, like=b""):
+    """ What replaces the middle of a long output """
+    marker = "\n[... %i bytes skipped ...]\n" % num_bytes
+    if isinstance(like, bytes):
+        return marker.encode("utf-8")
+    return marker
+
+
+def head_and_tail(data, head_size, tail_size):
+    """ Keep the beginning and the end of a long output (bytes or text) """
+    if len(data) <= head_size + tail_size:
+        return data
+    tail = data[len(data) - tail_size:]
+    return data[:head_size] + skipped_marker(len(data) - head_size - tail_size, like=data) + tail
+
+
+class OutputBuffer(object):
+    """
+    Output of a child process.
+
+    :param max_size: only the last ``max_size`` bytes are kept in memory,
+                     everything is kept if None
+    :param head_size: the first ``head_size`` bytes are kept too
+    :param spill_path: if set, the whole output is also written to this file
+    """
+
+    def __init__(self, max_size=None, spill_path=None, head_size=0):
+        """ OutputBuffer Init """
+        self.max_size = max_size
+        self.head_size = head_size
+        self.spill_path = spill_path
+        # Number of bytes received
+        self.size = 0
+        self._head = b""
+        self._chunks = collections.deque()
+        self._length = 0
+        self._spill = None
+        if spill_path:
+            self._spill = open(spill_path, "wb")
+
+    @property
+    def truncated(self):
+        """ True if some of the output is no longer in memory """
+        return len(self._head) + self._length < self.size
+
+    def write(self, data):
+        """ Append some output """
+        self.size += len(data)
+        if self._spill:
+            self._spill.write(data)
+        if self.max_size is not None and len(self._head) < self.head_size:
+            missing = self.head_size - len(self._head)
+            self._head += data[:missing]
+            data = data[missing:]
+        self._chunks.append(data)
+        self._length += len(data)
+        if self.max_size is None:
+            return
+        while self._length > self.max_size:
+            excess = self._length - self.max_size
+            first = self._chunks[0]
+            if len(first) <= excess:
+                self._chunks.popleft()
+                self._length -= len(first)
+            else:
+                self._chunks[0] = first[excess:]
+                self._length -= excess
+
+    def close(self):
+        """ Close the spill file """
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+    def getvalue(self):
+        """ Return the output kept in memory, as bytes """
+        tail = b"".join(self._chunks)
+        skipped = self.size - len(self._head) - len(tail)
+        if not skipped:
+            return self._head + tail
+        return self._head + skipped_marker(skipped) + tail
+
+
+class Child(object):
+    """ A process started by :py:meth:`Supervisor.spawn` """
+
+    def __init__(self, popen, timeout, output, new_session):
+        """ Child Init """
+        self.popen = popen
+        self.pid = popen.pid
+        self.output = output
+        self.new_session = new_session
+        self.returncode = None
+        self.timed_out = False
+        # Still running KILL_DELAY seconds after it timed out
+        self.killed = False
+        self.interrupted = False
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = time.monotonic() + timeout
+        self.kill_deadline = None
+        self.stream = popen.stdout
+        self.pidfd = None
+        # Exception raised by the supervisor while watching this child
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        """ True once the child exited and its output was read """
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """ Wait for the child to be done, and return its return code """
+        self._done.wait(timeout)
+        return self.returncode
+
+
+class Supervisor(object):
+    """
+    Start child processes, and wait for all of them from one thread.
+    Children are spawned from any thread, the supervisor thread is
+    started with the first one.
+    """
+
+    def __init__(self):
+        """ Supervisor Init """
+        self._lock = threading.Lock()
+        self._pending = list()
+        self._children = list()
+        self._interrupt = False
+        self._thread = None
+        self._pid = None
+        self._selector = None
+        self._wakeup_fds = None
+
+    def spawn(self, cmd, cwd=None, env=None, timeout=None, capture=True,
+              output=None, new_session=True, **kwargs):
+        """
+        Start a child process, and return a :py:class:`Child`.
+        Exceptions raised by Popen are not caught.
+
+        :param capture: read stdout and stderr into ``output``
+                        (an unbounded :py:class:`OutputBuffer` by default)
+        :param new_session: run the child in its own process group, so that
+                            the whole group is killed when it times out
+        :param kwargs: other arguments for ``subprocess.Popen``
+        """
+        if capture:
+            kwargs["stdout"] = subprocess.PIPE
+            kwargs["stderr"] = subprocess.STDOUT
+        if new_session:
+            kwargs["start_new_session"] = True
+        kwargs.setdefault("close_fds", True)
+        if output is None:
+            output = OutputBuffer()
+        popen = subprocess.Popen(cmd, cwd=cwd, env=env, **kwargs)
+        child = Child(popen, timeout, output, new_session)
+        with self._lock:
+            self._start()
+            self._pending.append(child)
+        self._wakeup()
+        return child
+
+    def interrupt(self):
+        """ Kill all the children, marking them as interrupted """
+        with self._lock:
+            if not self._thread:
+                return
+            self._interrupt = True
+        self._wakeup()
+
+    def kill(self, child):
+        """ Kill a child now """
+        self._signal(child, signal.SIGKILL)
+
+    def _start(self):
+        """ Start the supervisor thread, called with the lock held """
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        if self._thread and self._pid == os.getpid():
+            # The thread died: release the children it was watching,
+            # the pending ones are watched by the new thread
+            for child in list(self._children):
+                self._fail(child, RuntimeError("process supervisor thread died"))
+            self._selector.close()
+            for fd in self._wakeup_fds:
+                os.close(fd)
+        else:
+            # First child, or first child since a fork()
+            self._pending = list()
+            self._children = list()
+        self._pid = os.getpid()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_fds = os.pipe()
+        os.set_blocking(self._wakeup_fds[1], False)
+        self._selector.register(self._wakeup_fds[0], selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._loop, name="ProcessSupervisor")
+        # Never prevent Python from exiting
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _wakeup(self):
+        """ Make the supervisor thread look at its pending requests """
+        with self._lock:
+            if not self._wakeup_fds:
+                return
+            try:
+                os.write(self._wakeup_fds[1], b"x")
+            except BlockingIOError:
+                # Already plenty of wake up calls to read
+                pass
+
+    def _loop(self):
+        """ Body of the supervisor thread """
+        while True:
+            try:
+                self._step()
+            except Exception as e:  # pylint:disable=broad-except
+                # Not related to a given child: give up on all of them,
+                # rather than letting their callers wait forever
+                for child in list(self._children):
+                    self._fail(child, e)
+
+    def _step(self):
+        """ One iteration of the supervisor loop """
+        with self._lock:
+            pending, self._pending = self._pending, list()
+            interrupt, self._interrupt = self._interrupt, False
+        for child in pending:
+            self._children.append(child)
+            self._guard(child, self._register, child)
+        if interrupt:
+            for child in list(self._children):
+                child.interrupted = True
+                self._guard(child, self.kill, child)
+        now = time.monotonic()
+        for child in list(self._children):
+            self._guard(child, self._check_deadline, child, now)
+        for (key, _events) in self._selector.select(self._get_select_timeout()):
+            if key.data is None:
+                os.read(key.fd, CHUNK_SIZE)
+                continue
+            child, callback = key.data
+            if child in self._children:
+                self._guard(child, callback, child)
+        for child in list(self._children):
+            self._guard(child, self._maybe_finish, child)
+
+    def _guard(self, child, func, *args):
+        """ Call func, releasing the child with an error if it raises """
+        try:
+            func(*args)
+        except Exception as e:  # pylint:disable=broad-except
+            self._fail(child, e)
+
+    def _fail(self, child, error):
+        """ Kill the child and release it, ``child.error`` tells why """
+        child.error = error
+        for fileobj in [child.stream, child.pidfd]:
+            if fileobj is None:
+                continue
+            try:
+                self._selector.unregister(fileobj)
+            except (KeyError, ValueError):
+                pass
+            try:
+                if fileobj is child.stream:
+                    child.stream.close()
+                else:
+                    os.close(child.pidfd)
+            except OSError:
+                pass
+        child.stream = None
+        child.pidfd = None
+        try:
+            self._signal(child, signal.SIGKILL)
+            child.popen.wait()
+        except OSError:
+            pass
+        child.output.close()
+        child.returncode = child.popen.returncode
+        if child in self._children:
+            self._children.remove(child)
+        child._done.set()
+
+    def _register(self, child):
+        """ Start watching the output and the exit of a child """
+        if child.stream:
+            self._selector.register(child.stream, selectors.EVENT_READ,
+                                    (child, self._on_output))
+        pidfd_open = getattr(os, "pidfd_open", None)
+        if pidfd_open:
+            try:
+                child.pidfd = pidfd_open(child.pid)
+            except OSError:
+                child.pidfd = None
+        if child.pidfd is not None:
+            self._selector.register(child.pidfd, selectors.EVENT_READ,
+                                    (child, self._on_exit))
+
+    def _on_output(self, child):
+        """ Read what the child wrote """
+        data = os.read(child.stream.fileno(), CHUNK_SIZE)
+        if data:
+            child.output.write(data)
+            return
+        self._selector.unregister(child.stream)
+        child.stream.close()
+        child.stream = None
+
+    def _on_exit(self, child):
+        """ Called when the pidfd of the child is readable """
+        self._selector.unregister(child.pidfd)
+        os.close(child.pidfd)
+        child.pidfd = None
+        child.popen.poll()
+
+    def _maybe_finish(self, child):
+        """ Release the child if it exited and all its output was read """
+        if child.popen.poll() is None:
+            return
+        if child.stream:
+            if not (child.killed or child.interrupted):
+                return
+            # Processes outside of its group may still hold the pipe
+            self._selector.unregister(child.stream)
+            child.stream.close()
+            child.stream = None
+        if child.pidfd is not None:
+            self._selector.unregister(child.pidfd)
+            os.close(child.pidfd)
+            child.pidfd = None
+        child.output.close()
+        child.returncode = child.popen.returncode
+        self._children.remove(child)
+        child._done.set()
+
+    def _check_deadline(self, child, now):
+        """ Terminate the child if it timed out, kill it if still alive after KILL_DELAY """
+        if child.deadline is not None and not child.timed_out and now >= child.deadline:
+            child.timed_out = True
+            child.kill_deadline = now + KILL_DELAY
+            self._signal(child, signal.SIGTERM)
+        elif child.kill_deadline is not None and not child.killed and now >= child.kill_deadline:
+            child.killed = True
+            self.kill(child)
+
+    def _get_select_timeout(self):
+        """ Time until the next deadline, or until the next poll of a child """
+        now = time.monotonic()
+        res = None
+        for child in self._children:
+            if child.pidfd is None and not child.stream:
+                # Only popen.poll() can tell us it exited
+                deadline = now + POLL_INTERVAL
+            elif child.timed_out:
+                deadline = child.kill_deadline if not child.killed else None
+            else:
+                deadline = child.deadline
+            if deadline is not None:
+                remaining = max(deadline - now, 0)
+                if res is None or remaining < res:
+                    res = remaining
+        return res
+
+    @staticmethod
+    def _signal(child, signum):
+        """ Send a signal to the child, and to its process group if it has its own """
+        try:
+            if child.new_session:
+                os.killpg(child.pid, signum)
+            else:
+                os.kill(child.pid, signum)
+        except OSError as e:
+            # Already exited
+            if e.errno != errno.ESRCH:
+                raise
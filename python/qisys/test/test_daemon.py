@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Automatic testing for qisys.daemon """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import time
+import socket
+import threading
+
+import mock
+import pytest
+
+import qisys.daemon
+
+
+@pytest.fixture
+def daemon(tmpdir):
+    """ Run a qi daemon in a thread """
+    if not hasattr(socket, "AF_UNIX"):
+        pytest.skip("Unix sockets are not available")
+    socket_path = tmpdir.join("daemon.sock").strpath
+    ready = threading.Event()
+    thread = threading.Thread(target=qisys.daemon.serve,
+                              kwargs={"socket_path": socket_path, "ready": ready})
+    thread.start()
+    ready.wait()
+    yield socket_path
+    qisys.daemon.stop(socket_path)
+    thread.join()
+
+
+def test_run_in_daemon(daemon, capsys):
+    """ Test Run In Daemon """
+    assert qisys.daemon.is_running(daemon)
+    rc = qisys.daemon.try_run("qitoolchain", ["list"], socket_path=daemon)
+    assert rc == 0
+    out, _err = capsys.readouterr()
+    assert "No toolchain yet" in out
+    rc = qisys.daemon.try_run("qitoolchain", ["info", "no-such-toolchain"], socket_path=daemon)
+    assert rc == 2
+    _out, err = capsys.readouterr()
+    assert "No such toolchain" in err
+
+
+def test_fallback_without_daemon(tmpdir):
+    """ Test Fallback Without Daemon """
+    socket_path = tmpdir.join("daemon.sock").strpath
+    assert qisys.daemon.try_run("qitoolchain", ["list"], socket_path=socket_path) is None
+    # Never sent to the daemon
+    assert not qisys.daemon.is_served("qibuild", ["make"])
+    assert not qisys.daemon.is_served("qibuild", ["find", "--home", "/tmp"])
+
+
+def test_fallback_when_daemon_does_not_answer(tmpdir, monkeypatch):
+    """ Test Fallback When The Daemon Does Not Answer """
+    if not hasattr(socket, "AF_UNIX"):
+        pytest.skip("Unix sockets are not available")
+    monkeypatch.setattr(qisys.daemon, "ACCEPT_TIMEOUT", 0.5)
+    socket_path = tmpdir.join("daemon.sock").strpath
+    # accepts the connection, but never answers
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(1)
+    try:
+        start = time.time()
+        assert qisys.daemon.try_run("qitoolchain", ["list"], socket_path=socket_path) is None
+        assert time.time() - start < 5
+    finally:
+        server.close()
+
+
+def test_fallback_when_daemon_is_busy(daemon, monkeypatch):
+    """ Test Fallback When The Daemon Is Busy """
+    started = threading.Event()
+    finish = threading.Event()
+
+    def slow_run_request(request):
+        """ Block until the test is done """
+        started.set()
+        finish.wait(10)
+        return {"returncode": 0, "stdout": "slow\n", "stderr": ""}
+
+    monkeypatch.setattr(qisys.daemon, "run_request", slow_run_request)
+    result = dict()
+    thread = threading.Thread(target=lambda: result.update(
+        rc=qisys.daemon.try_run("qitoolchain", ["list"], socket_path=daemon)))
+    thread.start()
+    try:
+        assert started.wait(10)
+        start = time.time()
+        assert qisys.daemon.try_run("qitoolchain", ["list"], socket_path=daemon) is None
+        assert time.time() - start < 1
+        assert qisys.daemon.is_running(daemon)
+    finally:
+        finish.set()
+        thread.join()
+    # Accepted requests are waited for, without timeout
+    assert result["rc"] == 0
+
+
+def test_long_action_is_waited_for(daemon, monkeypatch, capsys):
+    """ Test Long Action Is Waited For """
+    monkeypatch.setattr(qisys.daemon, "ACCEPT_TIMEOUT", 0.2)
+
+    def slow_run_request(request):
+        """ Take longer than ACCEPT_TIMEOUT """
+        time.sleep(0.5)
+        return {"returncode": 3, "stdout": "done\n", "stderr": ""}
+
+    monkeypatch.setattr(qisys.daemon, "run_request", slow_run_request)
+    assert qisys.daemon.try_run("qitoolchain", ["list"], socket_path=daemon) == 3
+    out, _err = capsys.readouterr()
+    assert out.endswith("done\n")
+
+
+def test_cached(tmpdir):
+    """ Test Cached """
+    xml = tmpdir.join("foo.xml")
+    xml.write("<foo />")
+    xml.setmtime(time.time() - 10)
+    factory = mock.Mock(side_effect=lambda: object())
+    # Outside of the daemon, nothing is cached
+    assert qisys.daemon.cached("foo", [xml.strpath], factory) is not \
+        qisys.daemon.cached("foo", [xml.strpath], factory)
+    with mock.patch("qisys.daemon._MODELS", dict()):
+        first = qisys.daemon.cached("foo", [xml.strpath], factory)
+        assert qisys.daemon.cached("foo", [xml.strpath], factory) is first
+        xml.write("<foo bar=\"baz\" />")
+        # Modified too recently to be cached
+        second = qisys.daemon.cached("foo", [xml.strpath], factory)
+        assert second is not first
+        assert qisys.daemon.cached("foo", [xml.strpath], factory) is not second
+        os.utime(xml.strpath, (time.time() - 5, time.time() - 5))
+        third = qisys.daemon.cached("foo", [xml.strpath], factory)
+        assert qisys.daemon.cached("foo", [xml.strpath], factory) is third
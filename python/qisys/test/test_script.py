@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Automatic testing for qisys.script """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import sys
+import subprocess
+
+import mock
+import pytest
+
+import qisys.script
+import qibuild.actions.make
+
+ENTRY_POINTS = ["qibuild", "qisrc", "qitest", "qitoolchain", "qipy", "qilinguist", "qidoc", "qipkg"]
+
+# Run in a separate interpreter, so that nothing is imported yet
+STARTUP_CODE = """
+import sys
+import time
+import argparse
+start = time.time()
+import qisys.script
+if sys.argv[2] == "lazy":
+    qisys.script.get_action_index(sys.argv[1] + ".actions")
+else:
+    qisys.script.action_modules_from_package(sys.argv[1] + ".actions")
+print(time.time() - start)
+"""
+
+DISPATCH_CODE = """
+import sys
+import argparse
+import qisys.script
+try:
+    qisys.script.lazy_root_command_main("qibuild", argparse.ArgumentParser(),
+                                        "qibuild.actions", args=["list-profiles", "--help"])
+except SystemExit:
+    pass
+print(" ".join(sorted(x for x in sys.modules if x.startswith("qibuild.actions."))))
+"""
+
+
+def run_python(tmpdir, code, *args):
+    """ Run some code in a new interpreter, using tmpdir as HOME """
+    this_dir = os.path.dirname(__file__)
+    env = os.environ.copy()
+    env["HOME"] = tmpdir.strpath
+    env["PYTHONPATH"] = os.path.abspath(os.path.join(this_dir, "..", ".."))
+    cmd = [sys.executable, "-c", code]
+    cmd.extend(args)
+    output = subprocess.check_output(cmd, env=env)
+    return output.decode("utf-8").splitlines()[-1]
+
+
+def test_action_index():
+    """ Test Action Index """
+    index = qisys.script.get_action_index("qibuild.actions")
+    first_doc_line = qibuild.actions.make.__doc__.splitlines()[0]
+    assert index["make"] == ("qibuild.actions.make", first_doc_line)
+    assert index["list-configs"][0] == "qibuild.actions.list_configs"
+    # Second time, the index comes from the cache
+    with mock.patch("ast.parse") as mock_parse:
+        assert qisys.script.get_action_index("qibuild.actions") == index
+        assert not mock_parse.called
+
+
+def test_lazy_dispatch_imports_one_action(tmpdir):
+    """ Test Lazy Dispatch Imports One Action """
+    imported = run_python(tmpdir, DISPATCH_CODE)
+    assert imported == "qibuild.actions.list_profiles"
+
+
+@pytest.mark.skipif(not os.environ.get("QI_BENCHMARKS"), reason="set QI_BENCHMARKS to run the benchmarks")
+def test_benchmark_startup(tmpdir):
+    """ Benchmark the time needed to list the actions of each entry point """
+    timings = dict()
+    for entry_point in ENTRY_POINTS:
+        # Fill the cache
+        run_python(tmpdir, STARTUP_CODE, entry_point, "lazy")
+        lazy = float(run_python(tmpdir, STARTUP_CODE, entry_point, "lazy"))
+        eager = float(run_python(tmpdir, STARTUP_CODE, entry_point, "eager"))
+        timings[entry_point] = (lazy, eager)
+        print("%-12s lazy: %.3fs, importing every action: %.3fs" % (entry_point, lazy, eager))
+    lazy, eager = timings["qibuild"]
+    assert lazy < eager
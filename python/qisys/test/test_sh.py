@@ -120,3 +120,30 @@ def test_install_qt_symlinks(tmpdir):
     dest = tmpdir.join("dest")
     qisys.sh.install(qt_src.strpath, dest.strpath, filter_fun=qisys.sh.is_runtime)
     assert dest.join("QtCore.framework").islink()
+
+
+def test_file_copier(tmpdir):
+    """ Test File Copier """
+    src = tmpdir.mkdir("src")
+    src.ensure("lib", "libfoo.so").write("foo")
+    src.ensure("share", "foo.txt").write("foo")
+    dest = tmpdir.join("dest")
+
+    def fingerprint_filter(path):
+        """ Only compute the checksums of libraries """
+        return path.endswith(".so")
+
+    copier = qisys.sh.FileCopier(fingerprint_filter=fingerprint_filter)
+    qisys.sh.install(src.strpath, dest.strpath, copier=copier)
+    assert dest.join("share", "foo.txt").read() == "foo"
+    libfoo = dest.join("lib", "libfoo.so").strpath
+    assert copier.fingerprints == {libfoo: qisys.sh.md5_checksum(libfoo)}
+
+
+def test_file_copier_hardlink(tmpdir):
+    """ Test File Copier With Hard Links """
+    src = tmpdir.ensure("src", "foo.txt")
+    dest = tmpdir.join("dest")
+    copier = qisys.sh.FileCopier(mode="hardlink")
+    qisys.sh.install(src.dirname, dest.strpath, copier=copier)
+    assert os.stat(dest.join("foo.txt").strpath).st_ino == os.stat(src.strpath).st_ino
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Test Sort """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import time
+import random
+import pytest
+
+import qisys.sort
+
+
+def make_random_dag(num_nodes, max_deps=5, seed=42):
+    """ Generate a DAG where each node only depends on nodes with a lower index """
+    rand = random.Random(seed)
+    data = dict()
+    for i in range(num_nodes):
+        num_deps = min(i, rand.randint(0, max_deps))
+        data["n%i" % i] = ["n%i" % x for x in rand.sample(range(i), num_deps)]
+    return data
+
+
+def assert_sorted(data, result):
+    """ Check every node comes after its dependencies """
+    position = dict((name, i) for (i, name) in enumerate(result))
+    for name in result:
+        for dep in data.get(name, ()):
+            assert position[dep] < position[name]
+
+
+def test_keeps_order():
+    """ Test the order of the recursive implementation is kept """
+    data = {
+        'a': ('g', 'b', 'c', 'd'),
+        'b': ('e', 'c'),
+        'q': ('u', 'i'),
+        'i': ('y', 'o'),
+        'e': ('g', 'c'),
+    }
+    assert qisys.sort.topological_sort(data, ['a', 'q']) == \
+        ['g', 'c', 'e', 'b', 'd', 'a', 'u', 'y', 'o', 'i', 'q']
+    assert qisys.sort.topological_sort(data, 'a') == ['g', 'c', 'e', 'b', 'd', 'a']
+    # data is left untouched
+    assert sorted(data.keys()) == ['a', 'b', 'e', 'i', 'q']
+
+
+def test_cycle_is_still_sorted():
+    """ Test Cycle Is Still Sorted """
+    assert qisys.sort.topological_sort({'a': ['b'], 'b': ['a']}, 'a') == ['b', 'a']
+
+
+def test_find_cycle():
+    """ Test Find Cycle """
+    assert qisys.sort.find_cycle({'a': ['b'], 'b': ['c']}) is None
+    cycle = qisys.sort.find_cycle({'a': ['b'], 'b': ['c'], 'c': ['a']})
+    assert len(cycle) == 4
+    assert cycle[0] == cycle[-1]
+    with pytest.raises(qisys.sort.DagError) as e:
+        qisys.sort.assert_dag({'x': ['a'], 'a': ['b'], 'b': ['a']})
+    assert e.value.result == ['a', 'b', 'a']
+
+
+def test_levels():
+    """ Test Levels """
+    data = {
+        'app': ['libfoo', 'libbar'],
+        'libfoo': ['libcore'],
+        'libbar': ['libcore'],
+        'tool': [],
+    }
+    assert qisys.sort.topological_levels(data, ['app', 'tool']) == \
+        [['libcore', 'tool'], ['libfoo', 'libbar'], ['app']]
+
+
+def test_deep_chain():
+    """ Test a chain much longer than the recursion limit """
+    num_nodes = 10000
+    data = dict(("n%i" % i, ["n%i" % (i - 1)]) for i in range(1, num_nodes))
+    result = qisys.sort.topological_sort(data, "n%i" % (num_nodes - 1))
+    assert result == ["n%i" % i for i in range(num_nodes)]
+    assert len(qisys.sort.topological_levels(data, "n%i" % (num_nodes - 1))) == num_nodes
+
+
+def test_10k_nodes():
+    """ Test sorting a random DAG of 10,000 nodes """
+    data = make_random_dag(10000)
+    heads = list(data.keys())
+    result = qisys.sort.topological_sort(data, heads)
+    assert len(result) == 10000
+    assert_sorted(data, result)
+    levels = qisys.sort.topological_levels(data, heads)
+    assert sum(len(x) for x in levels) == 10000
+    qisys.sort.assert_dag(data)
+
+
+@pytest.mark.skipif(not os.environ.get("QI_BENCHMARKS"), reason="set QI_BENCHMARKS to run the benchmarks")
+def test_benchmark_10k_nodes():
+    """ Benchmark sorting a random DAG of 10,000 nodes """
+    data = make_random_dag(10000)
+    heads = list(data.keys())
+    start = time.time()
+    qisys.sort.topological_sort(data, heads)
+    sort_time = time.time() - start
+    start = time.time()
+    qisys.sort.topological_levels(data, heads)
+    levels_time = time.time() - start
+    start = time.time()
+    qisys.sort.assert_dag(data)
+    check_time = time.time() - start
+    print("topological_sort: %.3fs, topological_levels: %.3fs, assert_dag: %.3fs" %
+          (sort_time, levels_time, check_time))
+    # The previous recursive implementation needed about 10s for the sort alone
+    assert sort_time + levels_time + check_time < 10
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Automatic testing for qisys.supervisor """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import pytest
+
+import qisys.command
+import qisys.supervisor
+
+pytestmark = pytest.mark.skipif(not qisys.supervisor.is_available(),
+                                reason="no process supervisor on this platform")
+
+
+def python_cmd(code):
+    """ Command running some Python code """
+    return [sys.executable, "-c", code]
+
+
+def is_running(pid):
+    """ False if the process exited, even if it was not reaped yet """
+    stat = "/proc/%i/stat" % pid
+    if not os.path.exists(stat):
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return False
+        return True
+    with open(stat, "r") as fp:
+        state = fp.read().rsplit(")", 1)[1].split()[0]
+    return state not in ["Z", "X"]
+
+
+def test_output_buffer(tmpdir):
+    """ Test Output Buffer """
+    spill = tmpdir.join("out.log")
+    output = qisys.supervisor.OutputBuffer(max_size=5, spill_path=spill.strpath)
+    output.write(b"abc")
+    assert not output.truncated
+    output.write(b"defg")
+    output.write(b"h")
+    output.close()
+    assert output.getvalue() == b"\n[... 3 bytes skipped ...]\ndefgh"
+    assert output.truncated
+    assert output.size == 8
+    assert spill.read() == "abcdefgh"
+
+
+def test_many_children():
+    """ Test Many Children """
+    supervisor = qisys.supervisor.Supervisor()
+    children = [supervisor.spawn(python_cmd("import time; time.sleep(0.5); print(%i)" % i))
+                for i in range(10)]
+    start = time.time()
+    for i, child in enumerate(children):
+        assert child.wait() == 0
+        assert child.output.getvalue().strip() == str(i).encode()
+    # Run at the same time
+    assert time.time() - start < 5
+
+
+def test_timeout_kills_process_group(tmpdir):
+    """ Test Timeout Kills Process Group """
+    pid_file = tmpdir.join("pid")
+    code = """
+import subprocess, sys, time
+grand_child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+open(%r, "w").write(str(grand_child.pid))
+time.sleep(60)
+""" % pid_file.strpath
+    supervisor = qisys.supervisor.Supervisor()
+    start = time.time()
+    child = supervisor.spawn(python_cmd(code), timeout=1.5)
+    child.wait()
+    assert child.timed_out
+    assert not child.killed
+    assert 1.5 <= time.time() - start < 5
+    grand_child_pid = int(pid_file.read())
+    time.sleep(0.2)
+    assert not is_running(grand_child_pid)
+
+
+def test_killed_after_delay(monkeypatch):
+    """ Test Killed After Delay """
+    monkeypatch.setattr(qisys.supervisor, "KILL_DELAY", 0.5)
+    code = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); " \
+           "print('ready', flush=True); time.sleep(60)"
+    supervisor = qisys.supervisor.Supervisor()
+    child = supervisor.spawn(python_cmd(code), timeout=1)
+    child.wait()
+    assert child.timed_out
+    assert child.killed
+    assert child.returncode < 0
+
+
+def test_error_on_one_child(monkeypatch):
+    """ Test Error On One Child """
+    supervisor = qisys.supervisor.Supervisor()
+    on_output = supervisor._on_output
+
+    def failing_on_output(child):
+        """ Fail for the first child only """
+        if child is first:
+            raise OSError("read failed")
+        on_output(child)
+
+    monkeypatch.setattr(supervisor, "_on_output", failing_on_output)
+    first = supervisor.spawn(python_cmd("import time; print('first', flush=True); time.sleep(60)"))
+    second = supervisor.spawn(python_cmd("import time; time.sleep(0.5); print('second')"))
+    first.wait(timeout=10)
+    assert first.done
+    assert str(first.error) == "read failed"
+    assert not is_running(first.pid)
+    assert second.wait(timeout=10) == 0
+    assert second.error is None
+    assert second.output.getvalue().strip() == b"second"
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_restart_dead_thread(monkeypatch):
+    """ Test Restart Dead Thread """
+    supervisor = qisys.supervisor.Supervisor()
+    assert supervisor.spawn(python_cmd("pass")).wait(timeout=10) == 0
+
+    def dying_step():
+        """ Kill the supervisor thread """
+        raise SystemExit()
+
+    monkeypatch.setattr(supervisor, "_step", dying_step)
+    supervisor._wakeup()
+    supervisor._thread.join(10)
+    assert not supervisor._thread.is_alive()
+    monkeypatch.undo()
+    child = supervisor.spawn(python_cmd("print('again')"))
+    assert child.wait(timeout=10) == 0
+    assert child.output.getvalue().strip() == b"again"
+
+
+def test_process_return_types():
+    """ Test Process Return Types """
+    process = qisys.command.Process(python_cmd("print('hello')"))
+    process.run(timeout=10)
+    assert process.return_type == qisys.command.Process.OK
+    assert process.out.strip() == b"hello"
+    process = qisys.command.Process(python_cmd("import time; time.sleep(60)"))
+    process.run(timeout=0.5)
+    assert process.return_type == qisys.command.Process.TIME_OUT
+    process = qisys.command.Process(["/does/not/exist"])
+    process.run()
+    assert process.return_type == qisys.command.Process.NOT_RUN
+    process = qisys.command.Process(python_cmd("print('x' * 1000)"), max_output=10)
+    process.run()
+    assert process.out.endswith(b"\n[... 991 bytes skipped ...]\n" + b"x" * 9 + b"\n")
+
+
+def test_call():
+    """ Test Call """
+    assert qisys.command.call(python_cmd("import sys; sys.exit(3)"),
+                              ignore_ret_code=True) == 3
+    with pytest.raises(qisys.command.CommandFailedException):
+        qisys.command.call(python_cmd("import sys; sys.exit(1)"), quiet=True)
+
+
+def test_head_and_tail():
+    """ Test Head And Tail """
+    output = qisys.supervisor.OutputBuffer(max_size=3, head_size=2)
+    for data in [b"a", b"bcd", b"efghij"]:
+        output.write(data)
+    assert output.getvalue() == b"ab\n[... 5 bytes skipped ...]\nhij"
+    assert qisys.supervisor.head_and_tail("abcdefghij", 2, 3) == "ab\n[... 5 bytes skipped ...]\nhij"
+    assert qisys.supervisor.head_and_tail("abcde", 2, 3) == "abcde"
@@ -9,10 +9,13 @@ from __future__ import print_function
 
 import os
 import py
+import time
 import mock
 import pytest
 
 import qisys.sh
+import qisys.qixml
+import qisys.project
 import qisys.worktree
 
 
@@ -150,6 +153,28 @@ def test_observers_are_notified(worktree):
     assert mock_observer.reload.called
 
 
+def test_transaction(worktree):
+    """ Test Transaction """
+    worktree.create_project("foo")
+    for name in ["bar", "baz", "spam"]:
+        worktree.tmpdir.mkdir(name)
+    mock_observer = mock.Mock()
+    worktree.register(mock_observer)
+    with mock.patch("qisys.qixml.write", wraps=qisys.qixml.write) as mock_write:
+        with worktree.transaction():
+            bar = worktree.add_project("bar")
+            assert bar.src == "bar"
+            worktree.add_project("baz")
+            worktree.remove_project("foo")
+            worktree.move_project("baz", "spam")
+            assert [p.src for p in worktree.projects] == ["bar", "spam"]
+            assert not mock_observer.reload.called
+        assert mock_write.call_count == 1
+    assert mock_observer.reload.call_count == 1
+    worktree2 = qisys.worktree.WorkTree(worktree.root)
+    assert [p.src for p in worktree2.projects] == ["bar", "spam"]
+
+
 def test_add_nested_projects(worktree):
     """ Test Add Nested Project """
     worktree.create_project("foo")
@@ -182,3 +207,99 @@ def test_non_ascii_path(tmpdir):
     """ Test Non ASCII Path """
     coffee_dir = tmpdir.mkdir("café")
     qisys.worktree.WorkTree(coffee_dir.strpath)
+
+
+def test_benchmark_project_lookup(worktree):
+    """ Benchmark project lookups, from 10 to 10,000 projects """
+    num_lookups = 10000
+    timings = list()
+    for num_projects in [10, 100, 1000, 10000]:
+        worktree.projects = [qisys.project.WorkTreeProject(worktree, "p%i" % i)
+                             for i in range(num_projects)]
+        srcs = ["p%i" % (i % num_projects) for i in range(num_lookups)]
+        # build the index
+        worktree.get_project("p0")
+        start = time.time()
+        for src in srcs:
+            assert worktree.get_project(src).src == src
+        timings.append(time.time() - start)
+        print("%5i projects: %.2f us per lookup" %
+              (num_projects, timings[-1] * 1e6 / num_lookups))
+    # A linear scan is about 1000 times slower with 10,000 projects
+    assert timings[-1] < timings[0] * 10
+
+
+def test_qiproject_cache(worktree):
+    """ Test QiProject Cache """
+    foo = worktree.tmpdir.mkdir("foo")
+    foo.mkdir("bar")
+    foo.join("qiproject.xml").write("<project />")
+    # recently modified files are not cached
+    foo.join("qiproject.xml").setmtime(time.time() - 10)
+    worktree.add_project("foo")
+    with mock.patch("qisys.qixml.read", wraps=qisys.qixml.read) as mock_read:
+        worktree.reload()
+        assert [p.src for p in worktree.projects] == ["foo"]
+        assert foo.join("qiproject.xml").strpath not in [x[0][0] for x in mock_read.call_args_list]
+    foo.join("qiproject.xml").write("""\
+<project>
+  <project src="bar" />
+</project>
+""")
+    worktree.reload()
+    assert [p.src for p in worktree.projects] == ["foo", "foo/bar"]
+
+
+def test_worktree_xml_shared_in_daemon(worktree):
+    """ Test Worktree Xml Shared In Daemon """
+    worktree.tmpdir.mkdir("foo")
+    worktree.add_project("foo")
+    worktree_xml = py.path.local(worktree.worktree_xml)  # pylint:disable=no-member
+    worktree_xml.setmtime(time.time() - 10)
+    with mock.patch("qisys.daemon._MODELS", dict()):
+        first = qisys.worktree.WorkTree(worktree.root)
+        second = qisys.worktree.WorkTree(worktree.root)
+        assert second.cache.xml_root is first.cache.xml_root
+        # Changes are not seen by the other worktrees
+        worktree.tmpdir.mkdir("bar")
+        with first.transaction():
+            first.add_project("bar")
+            assert [p.src for p in second.projects] == ["foo"]
+            assert len(second.cache.get_srcs()) == 1
+        third = qisys.worktree.WorkTree(worktree.root)
+        assert third.cache.get_srcs() == ["foo", "bar"]
+
+
+def test_snapshot(worktree):
+    """ Test Snapshot """
+    foo = worktree.tmpdir.mkdir("foo")
+    foo.mkdir("sub")
+    foo.join("qiproject.xml").write("""\
+<project>
+  <project src="sub" />
+</project>
+""")
+    worktree.tmpdir.mkdir("bar")
+    with worktree.transaction():
+        worktree.add_project("foo")
+        worktree.add_project("bar")
+    # recently modified files are not trusted
+    assert not qisys.worktree.WorkTree(worktree.root).snapshot.load()
+    past = time.time() - 10
+    for path in [worktree.worktree_xml, foo.join("qiproject.xml").strpath]:
+        os.utime(path, (past, past))
+    worktree.reload()
+    with mock.patch("qisys.qixml.read", wraps=qisys.qixml.read) as mock_read:
+        worktree2 = qisys.worktree.WorkTree(worktree.root)
+        assert [p.src for p in worktree2.projects] == ["bar", "foo", "foo/sub"]
+        assert worktree2.get_project("foo").subprojects == ["sub"]
+        assert worktree2.get_project("foo").path == foo.strpath
+        assert foo.join("qiproject.xml").strpath not in [x[0][0] for x in mock_read.call_args_list]
+    # Projects without a qiproject.xml which were removed
+    worktree.tmpdir.join("bar").remove()
+    worktree3 = qisys.worktree.WorkTree(worktree.root)
+    assert [p.src for p in worktree3.projects] == ["foo", "foo/sub"]
+    foo.join("qiproject.xml").write("<project />")
+    os.utime(foo.join("qiproject.xml").strpath, (past, past))
+    worktree4 = qisys.worktree.WorkTree(worktree.root)
+    assert [p.src for p in worktree4.projects] == ["foo"]
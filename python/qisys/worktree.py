@@ -9,15 +9,19 @@ from __future__ import print_function
 
 import os
 import abc
+import copy
+import json
 import ntpath
 import locale
 import operator
 import posixpath
+import contextlib
 import six
 
 import qibuild.config
 import qisys.sh
 import qisys.qixml
+import qisys.daemon
 import qisys.project
 import qisys.command
 from qisys import ui
@@ -40,11 +44,24 @@ Could not open WorkTree in {0}.
 This path does not exist
 """.format(root))
         self._observers = list()
+        # > 0 while in a transaction(), see below
+        self._transaction_depth = 0
+        self._transaction_dirty = False
+        self._projects_index = ProjectIndex(lambda x: self.normalize_path(x.src))
         self.root = root
-        self.cache = self.load_cache()
-        # Re-parse every qiproject.xml to visit the subprojects
-        self.projects = list()
-        self.load_projects()
+        # Shared by the requests when running in a qi daemon
+        self.qiproject_cache = qisys.daemon.cached(("qiproject_cache", root), [], QiProjectCache)
+        self.snapshot = WorkTreeSnapshot(self)
+        if self.snapshot.load():
+            # Nothing changed since the projects were last parsed
+            self.cache = WorkTreeCache(self.worktree_xml)
+            self.projects = [qisys.project.WorkTreeProject(self, src, path=path, subprojects=subprojects)
+                             for (src, path, subprojects) in self.snapshot.projects]
+        else:
+            self.cache = self.load_cache()
+            # Re-parse every qiproject.xml to visit the subprojects
+            self.projects = list()
+            self.load_projects()
         if sanity_check:
             self.check()
         self.register_self()
@@ -82,11 +99,66 @@ This path does not exist
         Re-read every qiproject.xml.
         Useful when projects are added or removed, or when qiproject.xml change
         """
+        # do not lose the changes made in a transaction
+        self.cache.flush()
         self.cache = self.load_cache()
         self.load_projects()
         for observer in self._observers:
             observer.reload()
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group several calls to :py:meth:`add_project`, :py:meth:`remove_project`
+        and :py:meth:`move_project`, to be used in a "with" statement::
+            with worktree.transaction():
+                for src in srcs:
+                    worktree.add_project(src)
+        Inside the block, the projects list is updated incrementally.
+        At the end of the block, worktree.xml is written once, every
+        qiproject.xml is parsed once, and the observers are notified once.
+        Note that the observers are not up to date inside the block.
+        """
+        if self._transaction_depth == 0:
+            self.cache.auto_write = False
+        self._transaction_depth += 1
+        try:
+            yield self
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.cache.auto_write = True
+                self.cache.flush()
+                if self._transaction_dirty:
+                    self._transaction_dirty = False
+                    self.load_projects()
+                    for observer in self._observers:
+                        observer.reload()
+
+    def _on_projects_changed(self, added=None, removed=None):
+        """
+        Called when sources were added to or removed from the cache:
+        re-parse every project and notify the observers, or, in a
+        transaction, only update the projects list
+        """
+        if not self._transaction_depth:
+            self.load_projects()
+            for observer in self._observers:
+                observer.reload()
+            return
+        self._transaction_dirty = True
+        # The observers must not use the models of the old projects
+        self.snapshot.clear()
+        if removed:
+            self.projects = [x for x in self.projects
+                             if x.src != removed and not x.src.startswith(removed + "/")]
+        if added:
+            project = qisys.project.WorkTreeProject(self, added)
+            project.parse_qiproject_xml()
+            res = set([project])
+            self._rec_parse_sub_projects(project, res)
+            self.projects = sorted(set(self.projects) | res, key=operator.attrgetter("src"))
+
     def check(self):
         """ Perform a few sanity checks """
         # Check that we are not in an other worktree:
@@ -116,8 +188,7 @@ This path does not exist
     def has_project(self, path):
         """ Return True if the Path is a Projet """
         src = self.normalize_path(path)
-        srcs = (self.normalize_path(p.src) for p in self.projects)
-        return src in srcs
+        return self._projects_index.get(self.projects, src) is not None
 
     def load_projects(self):
         """ For every project in cache, re-read the subprojects and and them to the list """
@@ -131,6 +202,7 @@ This path does not exist
         for project in self.projects:
             self._rec_parse_sub_projects(project, res)
         self.projects = sorted(res, key=operator.attrgetter("src"))
+        self.snapshot.reset(self.projects)
 
     def _rec_parse_sub_projects(self, project, res):
         """ Recursively parse every project and subproject, filling up the res list. """
@@ -151,16 +223,12 @@ This path does not exist
             False and project is not found
         """
         src = self.normalize_path(src)
-        if not self.has_project(src):
-            if not raises:
-                return None
+        project = self._projects_index.get(self.projects, src)
+        if project is None and raises:
             mess = ui.did_you_mean("No project in '%s'\n" % src,
                                    src, [self.normalize_path(x.src) for x in self.projects])
             raise WorkTreeError(mess)
-        match = (p for p in self.projects if self.normalize_path(p.src) == src)
-        if six.PY3:
-            return match.__next__()
-        return match.next()
+        return project
 
     def add_project(self, path):
         """
@@ -175,11 +243,8 @@ This path does not exist
             mess += "Current worktree: %s" % self.root
             raise WorkTreeError(mess)
         self.cache.add_src(src)
-        self.load_projects()
-        project = self.get_project(src)
-        for observer in self._observers:
-            observer.reload()
-        return project
+        self._on_projects_changed(added=src)
+        return self.get_project(src)
 
     def remove_project(self, path, from_disk=False):
         """
@@ -193,9 +258,7 @@ This path does not exist
         if from_disk:
             qisys.sh.rm(project.path)
         self.cache.remove_src(src)
-        self.load_projects()
-        for observer in self._observers:
-            observer.reload()
+        self._on_projects_changed(removed=src)
 
     def move_project(self, path, new_path):
         """ Move a project from a worktree """
@@ -209,9 +272,7 @@ This path does not exist
             raise WorkTreeError(mess)
         self.cache.remove_src(src)
         self.cache.add_src(new_src)
-        self.load_projects()
-        for observer in self._observers:
-            observer.reload()
+        self._on_projects_changed(added=new_src, removed=src)
 
     def normalize_path(self, path):
         """ Make sure the path is a POSIX path, relative to the worktree root """
@@ -277,28 +338,259 @@ class WorkTreeObserver(object):
         pass
 
 
+class ProjectIndex(object):
+    """
+    A dict-based index of a list of projects, used to look up
+    projects without scanning the whole list.
+
+    The index follows the list it was last used with: it is built
+    again when the list is replaced or shrinks, and only the new
+    projects are indexed when projects are appended to it.
+    Call :py:meth:`invalidate` when a project key changes in place.
+
+    :param key: a function returning the key of a project
+    """
+
+    def __init__(self, key):
+        """ ProjectIndex Init """
+        self.key = key
+        self._projects = None
+        self._count = 0
+        self._index = dict()
+
+    def get(self, projects, key):
+        """ Return the first project in projects with the given key, or None """
+        if projects is not self._projects or len(projects) < self._count:
+            # Keep a reference to the list, so that its id is not reused
+            self._projects = projects
+            self._count = 0
+            self._index = dict()
+        if len(projects) > self._count:
+            for project in projects[self._count:]:
+                self._index.setdefault(self.key(project), project)
+            self._count = len(projects)
+        return self._index.get(key)
+
+    def invalidate(self):
+        """ Build the index again the next time it is used """
+        self._projects = None
+
+
+class QiProjectCache(object):
+    """
+    Parsed qiproject.xml files of a worktree, validated by their stat
+    signature, so that each file is parsed only once per process, even
+    if the worktree and each of its observers need it. In a qi daemon,
+    the cache is shared by the requests. Files modified very recently
+    are not cached, since they could change again without their
+    signature changing.
+    """
+
+    def __init__(self):
+        """ QiProjectCache Init """
+        # xml path -> (signature, parsed tree)
+        self._trees = dict()
+
+    def read(self, xml_path):
+        """
+        Return a etree object from the qiproject.xml path,
+        or None if it does not exist.
+        The returned tree is shared and must not be modified.
+        """
+        signature = qisys.daemon.get_signature(xml_path)
+        if signature is None:
+            return None
+        cached = self._trees.get(xml_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        tree = qisys.qixml.read(xml_path)
+        if not qisys.daemon.is_racy(signature):
+            self._trees[xml_path] = (signature, tree)
+        return tree
+
+
+class WorkTreeSnapshot(object):
+    """
+    The parsed model of a worktree, stored in ``.qi/worktree_snapshot.json``, so
+    that an unchanged worktree is loaded without opening any qiproject.xml.
+
+    The snapshot holds the projects of the worktree, and the models of the
+    observers, stored with :py:meth:`set_model`. It is only used if the
+    stat signatures of worktree.xml and of every qiproject.xml did not
+    change, and if the directories of the projects are still there.
+    Each model is also validated by the signatures of the other files
+    it was read from.
+    """
+
+    VERSION = 1
+
+    def __init__(self, worktree):
+        """ WorkTreeSnapshot Init """
+        self.worktree = worktree
+        self.path = os.path.join(worktree.dot_qi, "worktree_snapshot.json")
+        # List of (src, path, subprojects), when the snapshot is valid
+        self.projects = None
+        self._data = None
+
+    def load(self):
+        """ Read the snapshot, return False if it is missing or out of date """
+        self.clear()
+        try:
+            with open(self.path, "r") as fp:
+                data = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get("version") != self.VERSION or \
+                data.get("root") != self.worktree.root:
+            return False
+        if not self._is_valid(data["files"], data["dirs"]):
+            return False
+        self.projects = data["projects"]
+        self._data = data
+        return True
+
+    def reset(self, projects):
+        """
+        Start a new snapshot of the given worktree projects, without any
+        model. Called each time the projects are parsed again.
+        """
+        self.clear()
+        files = dict()
+        dirs = dict()
+        files[self.worktree.worktree_xml] = qisys.daemon.get_signature(self.worktree.worktree_xml)
+        for project in projects:
+            project_path = os.path.join(self.worktree.root, project.src)
+            qiproject_xml = os.path.join(project_path, "qiproject.xml")
+            files[qiproject_xml] = qisys.daemon.get_signature(qiproject_xml)
+            if files[qiproject_xml] is None:
+                dirs[project_path] = self._get_inode(project_path)
+        if any(qisys.daemon.is_racy(x) for x in files.values()):
+            # The files may change again without their signatures changing
+            return
+        self._data = {
+            "version": self.VERSION,
+            "root": self.worktree.root,
+            "files": files,
+            "dirs": dirs,
+            "projects": [(x.src, x.path, x.subprojects) for x in projects],
+            "models": dict(),
+        }
+        self._write()
+
+    def clear(self):
+        """ Forget the snapshot, for instance when the projects change in a transaction """
+        self.projects = None
+        self._data = None
+
+    def get_model(self, name):
+        """ Return the model stored by an observer, or None if there is none or if it is out of date """
+        if self._data is None:
+            return None
+        entry = self._data["models"].get(name)
+        if entry is None or not self._is_valid(entry["files"]):
+            return None
+        # A qiproject.xml may have been written since the snapshot was loaded
+        if not self._is_valid(self._data["files"], self._data["dirs"]):
+            return None
+        return entry["model"]
+
+    def set_model(self, name, model, paths=None):
+        """
+        Store the model of an observer, which must be serializable to json.
+        Call this right after building it from the worktree projects.
+        :param paths: the other files the model was read from
+        """
+        if self._data is None:
+            return
+        files = dict((x, qisys.daemon.get_signature(x)) for x in paths or list())
+        if any(qisys.daemon.is_racy(x) for x in files.values()):
+            self._data["models"].pop(name, None)
+            return
+        self._data["models"][name] = {"files": files, "model": model}
+        self._write()
+
+    def _is_valid(self, files, dirs=None):
+        """ True if none of the files and directories changed """
+        for (path, signature) in files.items():
+            if qisys.daemon.get_signature(path) != signature:
+                return False
+        for (path, inode) in (dirs or dict()).items():
+            if self._get_inode(path) != inode:
+                return False
+        return True
+
+    @staticmethod
+    def _get_inode(path):
+        """ Identify a directory, whatever happens inside it """
+        try:
+            return os.stat(path).st_ino
+        except OSError:
+            return None
+
+    def _write(self):
+        """ Write the snapshot, replacing the file at once """
+        tmp_path = "%s.tmp-%i" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(self._data, fp)
+            # os.rename() does not overwrite files on Windows
+            replace = getattr(os, "replace", os.rename)
+            replace(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            ui.debug("Could not write worktree snapshot", self.path, e)
+            qisys.sh.rm(tmp_path)
+
+
 class WorkTreeCache(object):
     """ Cache the paths to all the projects registered in a worktree """
 
     def __init__(self, xml_path):
         """ WorkTreeCache Init """
         self.xml_path = xml_path
-        self.xml_root = qisys.qixml.read(xml_path).getroot()
+        # Shared by the requests when running in a qi daemon,
+        # copied before the first change
+        self.xml_root = qisys.daemon.cached(("worktree_xml", xml_path), [xml_path],
+                                            lambda: qisys.qixml.read(xml_path).getroot())
+        self._shared = True
+        # When False, changes are only written by flush()
+        self.auto_write = True
+        self._dirty = False
 
     def add_src(self, src):
         """ Add a new source to the cache """
+        self._unshare()
         project_elem = qisys.qixml.etree.Element("project")
         project_elem.set("src", src)
         self.xml_root.append(project_elem)
-        qisys.qixml.write(self.xml_root, self.xml_path)
+        self._write()
 
     def remove_src(self, src):
         """ Remove one source from the cache """
+        self._unshare()
         projects_elem = self.xml_root.findall("project")
         for project_elem in projects_elem:
             if project_elem.get("src") == src:
                 self.xml_root.remove(project_elem)
+        self._write()
+
+    def _unshare(self):
+        """ Make sure the changes are not seen by the other users of the parsed tree """
+        if self._shared:
+            self.xml_root = copy.deepcopy(self.xml_root)
+            self._shared = False
+
+    def _write(self):
+        """ Write the cache, unless auto_write is False """
+        self._dirty = True
+        if self.auto_write:
+            self.flush()
+
+    def flush(self):
+        """ Write the pending changes """
+        if not self._dirty:
+            return
         qisys.qixml.write(self.xml_root, self.xml_path)
+        self._dirty = False
 
     def get_srcs(self):
         """ Get all the sources registered in the cache """
@@ -12,6 +12,8 @@ import sys
 import qibuild.gcov
 import qibuild.test_runner
 import qitest.parsers
+import qitest.runner
+import qitest.reporter
 import qitest.actions.list
 import qisys.parsers
 from qisys import ui
@@ -26,26 +28,32 @@ def configure_parser(parser):
 
 def do(args):
     """Main entry point"""
+    if not args.per_test_xml and not args.junit_xml:
+        raise Exception("--no-per-test-xml can only be used with --junit-xml")
     try:
         test_runners = qitest.parsers.get_test_runners(args)
     except qitest.parsers.EmptyTestListException:
         if not args.allow_no_test:
             raise
         test_runners = []
-    global_res = True
-    n = len(test_runners)
-    for i, test_runner in enumerate(test_runners):
-        if n != 1:
-            ui.info(ui.bold, "::", "[%i on %i]" % (i + 1, len(test_runners)),
-                    ui.reset, "Running tests in", ui.blue, test_runner.cwd)
-        if not test_runner.tests and args.allow_no_test:
-            ui.warning("No test to run")
-            continue
-        res = test_runner.run()
-        if args.coverage:
-            build_worktree = qibuild.parsers.get_build_worktree(args, verbose=False)
-            build_project = qibuild.parsers.get_one_build_project(build_worktree, args)
-            qibuild.gcov.generate_coverage_reports(build_project, output_dir=args.coverage_output_dir)
-        global_res = global_res and res
-    if not global_res:
+    if args.allow_no_test and not any(x.tests for x in test_runners):
+        ui.warning("No test to run")
+        return
+    if len(test_runners) > 1:
+        ui.info(ui.bold, "::", ui.reset, "Running tests in", len(test_runners), "projects:")
+        for test_runner in test_runners:
+            ui.info(ui.blue, " *", test_runner.cwd)
+    reporter = None
+    if args.junit_xml or args.events:
+        reporter = qitest.reporter.StreamingReporter(junit_xml=args.junit_xml,
+                                                     events=args.events)
+    ok = qitest.runner.run_test_suites(test_runners, num_jobs=args.num_jobs,
+                                       repeat_until_fail=args.repeat_until_fail,
+                                       failed_first=args.failed_first,
+                                       reporter=reporter)
+    if args.coverage:
+        build_worktree = qibuild.parsers.get_build_worktree(args, verbose=False)
+        build_project = qibuild.parsers.get_one_build_project(build_worktree, args)
+        qibuild.gcov.generate_coverage_reports(build_project, output_dir=args.coverage_output_dir)
+    if not ok:
         sys.exit(1)
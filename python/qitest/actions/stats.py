@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+""" Show the slowest and the flakiest tests, according to the previous runs """
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import qitest.parsers
+import qitest.timings
+import qibuild.parsers
+import qisys.parsers
+from qisys import ui
+
+
+def configure_parser(parser):
+    """ Configure Parser """
+    qitest.parsers.test_parser(parser)
+    qibuild.parsers.project_parser(parser)
+    qisys.parsers.build_parser(parser, include_worktree_parser=False)
+    parser.add_argument("-n", "--number", type=int, default=10,
+                        help="Number of tests to show in each list (default: 10)")
+
+
+def do(args):
+    """ Main Entry Point """
+    test_runners = qitest.parsers.get_test_runners(args)
+    for test_runner in test_runners:
+        sdk_directory = test_runner.project.sdk_directory
+        timing_db = qitest.timings.TimingDB(sdk_directory)
+        stats = timing_db.get_stats()
+        ui.info(ui.green, "Tests in", ui.blue, sdk_directory)
+        if not stats:
+            ui.info("No test run recorded")
+            continue
+        max_len = max(len(x["name"]) for x in stats)
+        slowest = sorted(stats, key=lambda x: x["mean_time"], reverse=True)
+        ui.info(ui.bold, "Slowest tests:")
+        for i, stat in enumerate(slowest[:args.number]):
+            message = "%.2fs (max: %.2fs)" % (stat["mean_time"], stat["max_time"])
+            if stat["timeouts"]:
+                message += ", timed out %i times" % stat["timeouts"]
+            ui.info_count(i, min(args.number, len(slowest)),
+                          ui.blue, stat["name"].ljust(max_len + 2), ui.reset, message)
+        flakiest = [x for x in stats if x["flakiness"] > 0]
+        flakiest.sort(key=lambda x: x["flakiness"], reverse=True)
+        if not flakiest:
+            ui.info(ui.green, "No flaky test")
+            continue
+        ui.info(ui.bold, "Flakiest tests:")
+        for i, stat in enumerate(flakiest[:args.number]):
+            message = "%i%% flaky, failed %i times in %i runs" % (
+                stat["flakiness"] * 100, stat["failures"], stat["runs"])
+            ui.info_count(i, min(args.number, len(flakiest)),
+                          ui.blue, stat["name"].ljust(max_len + 2), ui.reset, message)
@@ -54,15 +54,26 @@ def test_parser(parser, with_num_jobs=True):
                        "directory (instead of build-<platform>/sdk/coverage-results)")
     group.add_argument("--root-output-dir", dest="test_output_dir", metavar="ROOT_OUTPUT_DIR",
                        help="same as --test-output-dir (deprecated)")
+    group.add_argument("--junit-xml", dest="junit_xml", type=os.path.abspath, metavar="FILE",
+                       help="Write the results of all the tests in this JUnit XML file, "
+                       "as they complete")
+    group.add_argument("--events", dest="events", type=os.path.abspath, metavar="FILE",
+                       help="Write the test events in this JSON Lines file, as they happen")
+    group.add_argument("--no-per-test-xml", dest="per_test_xml", action="store_false",
+                       help="Do not keep an XML file per test in the test-results directories")
     group.add_argument("--no-capture", dest="capture", action="store_false")
     group.add_argument("--ignore-timeouts", dest="ignore_timeouts", action="store_true",
                        help="Ignore timeouts when running tests")
     group.add_argument("--lf", "--last-failed", dest="last_failed", action="store_true",
                        help="Run the failing test from previous run")
+    group.add_argument("--failed-first", dest="failed_first", action="store_true",
+                       help="Start the tests which failed during their last run first")
+    group.add_argument("--gtest-shards", dest="gtest_shards", type=int, default=0, metavar="N",
+                       help="Split each gtest binary in N shards, run in parallel")
     group.add_argument("--allow-no-test", dest="allow_no_test", action="store_true",
                        help="Don't fail if no tests to run")
     parser.set_defaults(nightly=False, capture=True, last_failed=False,
-                        ignore_timeouts=False)
+                        failed_first=False, ignore_timeouts=False, per_test_xml=True)
     if with_num_jobs:
         qisys.parsers.parallel_parser(group, default=1)
     return group
@@ -105,7 +116,10 @@ def get_test_runner(args, build_project=None, qitest_json=None):
     test_runner.test_output_dir = args.test_output_dir
     test_runner.capture = args.capture
     test_runner.last_failed = args.last_failed
+    test_runner.failed_first = args.failed_first
     test_runner.ignore_timeouts = args.ignore_timeouts
+    test_runner.gtest_shards = args.gtest_shards
+    test_runner.per_test_xml = args.per_test_xml
     return test_runner
 
 
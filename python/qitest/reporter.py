@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+Report the results of the tests as soon as they are known, in:
+
+* a single JUnit XML file, with one <testsuite> element per test
+* a JSON Lines file, with one event per line: ``run_start``, ``start``,
+  ``result`` and ``run_end``
+
+Both files are flushed after each event, so that they can be followed
+while the tests are running.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import io
+import os
+import re
+import json
+import time
+import threading
+import six
+
+import qisys.sh
+import qisys.qixml
+import qisys.supervisor
+from qisys import ui
+from qisys.qixml import etree
+
+# Parts of the output of a test kept in the XML reports
+OUTPUT_HEAD_SIZE = 4096
+OUTPUT_TAIL_SIZE = 12288
+
+ANSI_RE = re.compile(r"\x1b[^m]*m")
+
+
+def clean_output(out):
+    """
+    Return the beginning and the end of the output of a test, as text
+    without color codes and safe to put in an XML file
+    """
+    if not out:
+        return ""
+    out = qisys.supervisor.head_and_tail(out, OUTPUT_HEAD_SIZE, OUTPUT_TAIL_SIZE)
+    if isinstance(out, bytes):
+        out = out.decode("utf-8", "replace")
+    out = ANSI_RE.sub("", out)
+    return qisys.qixml.sanitize_xml(out)
+
+
+def message_to_string(message):
+    """ The message of a :py:class:`qitest.result.TestResult`, without the colors """
+    return " ".join(six.text_type(x) for x in message if not isinstance(x, ui._Color))
+
+
+def get_project_name(launcher):
+    """ Name of the project of the tests run by the launcher """
+    project = launcher.project
+    return getattr(project, "name", None) or project.sdk_directory
+
+
+def get_status(result):
+    """ pass, fail or interrupted """
+    if result.ok is None:
+        return "interrupted"
+    if result.ok:
+        return "pass"
+    return "fail"
+
+
+def get_test_cases(result):
+    """
+    Return the <testcase> elements of a result: those read from the XML
+    file written by the test, if any, or one built from the result
+    """
+    if result.test_cases:
+        return result.test_cases
+    test_case = etree.Element("testcase")
+    test_case.set("name", result.test["name"])
+    test_case.set("status", "run")
+    test_case.set("time", str(result.time))
+    if result.ok is None:
+        skipped = etree.SubElement(test_case, "skipped")
+        skipped.set("message", "interrupted")
+    elif not result.ok:
+        failure = etree.SubElement(test_case, "failure")
+        failure.set("message", qisys.qixml.sanitize_xml(message_to_string(result.message)))
+        failure.text = clean_output(result.out)
+    return [test_case]
+
+
+def get_test_suite(result, project_name):
+    """ Return a <testsuite> element with the test cases of a result """
+    test_cases = get_test_cases(result)
+    test_suite = etree.Element("testsuite")
+    test_suite.set("name", result.test["name"])
+    test_suite.set("package", project_name)
+    test_suite.set("tests", str(len(test_cases)))
+    for (attr, tag) in [("failures", "failure"), ("errors", "error"), ("skipped", "skipped")]:
+        count = len([x for x in test_cases if x.find(tag) is not None])
+        test_suite.set(attr, str(count))
+    test_suite.set("time", str(result.time))
+    for test_case in test_cases:
+        test_suite.append(test_case)
+    return test_suite
+
+
+class StreamingReporter(object):
+    """
+    Write the results of a :py:class:`qitest.test_queue.TestQueue` while
+    it is running. Its methods are called from the test workers.
+
+    :param junit_xml: path of the aggregated JUnit XML file, or None
+    :param events: path of the JSON Lines file, or None
+    """
+
+    def __init__(self, junit_xml=None, events=None):
+        """ StreamingReporter Init """
+        self.junit_xml = junit_xml
+        self.events = events
+        self._lock = threading.Lock()
+        self._junit_fp = None
+        self._events_fp = None
+
+    def open(self):
+        """ Create the files """
+        if self.junit_xml:
+            qisys.sh.mkdir(os.path.dirname(os.path.abspath(self.junit_xml)), recursive=True)
+            self._junit_fp = io.open(self.junit_xml, "w", encoding="utf-8")
+            self._junit_fp.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="All">\n')
+            self._junit_fp.flush()
+        if self.events:
+            qisys.sh.mkdir(os.path.dirname(os.path.abspath(self.events)), recursive=True)
+            self._events_fp = io.open(self.events, "w", encoding="utf-8")
+
+    def close(self):
+        """ Terminate the JUnit XML file, and close the files """
+        with self._lock:
+            if self._junit_fp:
+                self._junit_fp.write("</testsuites>\n")
+                self._junit_fp.close()
+                self._junit_fp = None
+            if self._events_fp:
+                self._events_fp.close()
+                self._events_fp = None
+
+    def on_run_start(self, num_tests):
+        """ Called when the queue starts running the tests """
+        self._write_event({"event": "run_start", "tests": num_tests})
+
+    def on_run_end(self, ok, elapsed_time):
+        """ Called once all the tests ran """
+        self._write_event({"event": "run_end", "ok": ok, "elapsed_time": elapsed_time})
+
+    def on_start(self, test, launcher, worker_index):
+        """ Called when a test starts """
+        self._write_event({"event": "start", "test": test["name"],
+                           "project": get_project_name(launcher),
+                           "worker": worker_index})
+
+    def on_result(self, result, launcher):
+        """ Called when a test is over """
+        project_name = get_project_name(launcher)
+        self._write_event({"event": "result", "test": result.test["name"],
+                           "project": project_name,
+                           "status": get_status(result),
+                           "time": result.time,
+                           "timeout": result.timeout,
+                           "message": message_to_string(result.message)})
+        if not self.junit_xml:
+            return
+        test_suite = get_test_suite(result, project_name)
+        qisys.qixml.indent(test_suite, level=1)
+        test_suite.tail = "\n"
+        if six.PY3:
+            as_text = etree.tostring(test_suite, encoding="unicode")
+        else:
+            as_text = etree.tostring(test_suite).decode("utf-8")
+        with self._lock:
+            if self._junit_fp:
+                self._junit_fp.write("  " + as_text)
+                self._junit_fp.flush()
+
+    def _write_event(self, event):
+        """ Append an event to the JSON Lines file """
+        if not self.events:
+            return
+        event["timestamp"] = time.time()
+        line = json.dumps(event, sort_keys=True)
+        with self._lock:
+            if self._events_fp:
+                self._events_fp.write(six.text_type(line) + "\n")
+                self._events_fp.flush()
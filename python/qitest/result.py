@@ -16,4 +16,8 @@ class TestResult(object):
         self.test = test
         self.time = 0
         self.ok = False
+        self.timeout = False
         self.message = list()
+        self.out = ""
+        # <testcase> elements read from the XML file written by the test
+        self.test_cases = None
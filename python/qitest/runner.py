@@ -38,6 +38,8 @@ class TestSuiteRunner(object):
         self.test_output_dir = None
         self.capture = True
         self.last_failed = False
+        self.failed_first = False
+        self.per_test_xml = True
         self._tests = project.tests
 
     @abc.abstractproperty
@@ -50,13 +52,21 @@ class TestSuiteRunner(object):
         Run all the tests.
         Return True if and only if the whole suite passed.
         """
-        test_queue = qitest.test_queue.TestQueue(self.tests)
+        test_queue = qitest.test_queue.TestQueue(self.get_queued_tests())
         test_queue.launcher = self.launcher
         test_queue.launcher.capture = self.capture
+        test_queue.failed_first = self.failed_first
         ok = test_queue.run(num_jobs=self.num_jobs,
                             repeat_until_fail=self.repeat_until_fail)
         return ok
 
+    def get_queued_tests(self):
+        """
+        Return the items to put in the test queue. By default, one per
+        selected test, but a test may be split in several items
+        """
+        return self.tests
+
     @property
     def patterns(self):
         """ Patters Getter """
@@ -120,16 +130,57 @@ class TestLauncher(object):
     __metaclass__ = abc.ABCMeta
 
     def __init__(self):
-        """ Set by the test suite, the launcher may need to know about its worker index """
-        self.worker_index = None
+        """ TestLauncher Init """
         self.capture = True
+        # Set when the results must come with the test cases read from
+        # the XML file written by the test
+        self.collect_test_cases = False
 
     @abc.abstractmethod
-    def launch(self, test):
-        """ Should return a :py:class:`.TestResult` """
+    def launch(self, test, worker_index=0):
+        """
+        Should return a :py:class:`.TestResult`.
+        The same launcher is used by all the workers at the same time,
+        worker_index is the index of the worker running the test.
+        """
         pass
 
 
+def run_test_suites(test_runners, num_jobs=1, repeat_until_fail=0,
+                    failed_first=False, reporter=None):
+    """
+    Run the tests of several test suites with a single pool of workers,
+    so that the workers do not wait for the last test of a suite before
+    starting the tests of the next one.
+    Each test is still run by the launcher of its suite.
+    :param reporter: a :py:class:`qitest.reporter.StreamingReporter`, or None
+    Return True if and only if all the suites passed.
+    """
+    tests = list()
+    launchers = list()
+    for test_runner in test_runners:
+        suite_tests = test_runner.get_queued_tests()
+        if not suite_tests:
+            continue
+        launcher = test_runner.launcher
+        launcher.capture = test_runner.capture
+        launcher.collect_test_cases = bool(reporter and reporter.junit_xml)
+        tests.extend(suite_tests)
+        launchers.extend([launcher] * len(suite_tests))
+    test_queue = qitest.test_queue.TestQueue(tests, launchers=launchers)
+    test_queue.failed_first = failed_first
+    if not reporter:
+        return test_queue.run(num_jobs=num_jobs,
+                              repeat_until_fail=repeat_until_fail)
+    test_queue.reporter = reporter
+    reporter.open()
+    try:
+        return test_queue.run(num_jobs=num_jobs,
+                              repeat_until_fail=repeat_until_fail)
+    finally:
+        reporter.close()
+
+
 def match_patterns(patterns, name, default=True):
     """ Retur True if Match Patterns """
     if not patterns:
@@ -9,8 +9,10 @@ from __future__ import print_function
 
 import sys
 import json
+import mock
 
 import qisys.command
+import qisys.qixml
 from qitest.test.conftest import qitest_action
 from qibuild.test.conftest import qibuild_action
 from qibuild.test.conftest import record_messages
@@ -126,3 +128,132 @@ def test_action_coverage(qibuild_action, qitest_action):
     qibuild_action("configure", "cov", "--coverage")
     qibuild_action("make", "cov")
     qitest_action("run", "cov", "--coverage")
+
+
+def test_several_projects(tmpdir, qitest_action, record_messages):
+    """ Test Several Projects """
+    for name in ["foo", "bar"]:
+        project = tmpdir.mkdir(name)
+        tests = [
+            {"name": "test_ok", "cmd": [sys.executable, "--version"]},
+            {"name": "test_%s" % name, "cmd": [sys.executable, "-c", "import sys ; sys.exit(1)"]},
+        ]
+        project.join("qitest.json").write(json.dumps(tests))
+    rc = qitest_action("run", "-j", "2",
+                       "--qitest-json", tmpdir.join("foo", "qitest.json").strpath,
+                       "--qitest-json", tmpdir.join("bar", "qitest.json").strpath,
+                       retcode=True)
+    assert rc != 0
+    # All the tests of the two projects are run in the same queue
+    assert record_messages.find("Ran 4 tests")
+    assert json.loads(tmpdir.join("foo", ".failed.json").read()) == ["test_foo"]
+    assert json.loads(tmpdir.join("bar", ".failed.json").read()) == ["test_bar"]
+
+
+def test_stats(tmpdir, qitest_action, record_messages):
+    """ Test Stats """
+    flag = tmpdir.join("flag")
+    test_flaky = tmpdir.join("test_flaky.py")
+    test_flaky.write("""
+import os, sys
+flag = %s
+if os.path.exists(flag):
+    os.remove(flag)
+    sys.exit(1)
+open(flag, "w").close()
+""" % repr(flag.strpath))
+    tests = [
+        {"name": "test_flaky", "cmd": [sys.executable, test_flaky.strpath], "timeout": 10},
+        {"name": "test_ok", "cmd": [sys.executable, "--version"], "timeout": 10},
+    ]
+    tmpdir.join("qitest.json").write(json.dumps(tests))
+    qitest_action.chdir(tmpdir)
+    for _ in range(3):
+        qitest_action("run", retcode=True)
+    record_messages.reset()
+    qitest_action("stats")
+    assert record_messages.find("Slowest tests")
+    assert record_messages.find(r"test_flaky.*100% flaky, failed 1 times in 3 runs")
+    assert not record_messages.find(r"test_ok.*flaky")
+
+
+FAKE_GTEST = """#!%(python)s
+import os
+import sys
+TESTS = ["Foo.one", "Foo.two", "Foo.three", "Bar.four", "Bar.DISABLED_five"]
+if "--gtest_list_tests" in sys.argv:
+    with open(%(counter)r, "a") as fp:
+        fp.write("list\\n")
+    print("Foo.\\n  one\\n  two\\n  three\\nBar.\\n  four\\n  DISABLED_five")
+    sys.exit(0)
+total = int(os.environ.get("GTEST_TOTAL_SHARDS", "1"))
+index = int(os.environ.get("GTEST_SHARD_INDEX", "0"))
+tests = [x for (i, x) in enumerate(TESTS[:4]) if i %% total == index]
+out = [x for x in sys.argv if x.startswith("--gtest_output=xml:")][0][len("--gtest_output=xml:"):]
+failures = [x for x in tests if x == "Bar.four"]
+cases = "".join('<testcase name="%%s" status="run" time="0.1"/>' %% x for x in tests)
+with open(out, "w") as fp:
+    fp.write('<testsuites tests="%%i" failures="%%i" disabled="0" errors="0" time="0.1" name="All">'
+             '<testsuite name="shard%%i" tests="%%i">%%s</testsuite></testsuites>'
+             %% (len(tests), len(failures), index, len(tests), cases))
+sys.exit(len(failures))
+"""
+
+
+def test_gtest_shards(tmpdir, qitest_action, record_messages):
+    """ Test GTest Shards """
+    counter = tmpdir.join("counter")
+    fake_gtest = tmpdir.join("fake_gtest")
+    fake_gtest.write(FAKE_GTEST % {"python": sys.executable, "counter": counter.strpath})
+    fake_gtest.chmod(0o755)
+    tests = [{"name": "test_fake", "cmd": [fake_gtest.strpath], "gtest": True, "timeout": 10}]
+    tmpdir.join("qitest.json").write(json.dumps(tests))
+    qitest_action.chdir(tmpdir)
+    rc = qitest_action("run", "--gtest-shards", "3", "-j", "3", retcode=True)
+    assert rc != 0
+    assert record_messages.find("Ran 3 tests")
+    # The shards results are merged in a single XML file
+    results_dir = tmpdir.join("test-results")
+    assert [x.basename for x in results_dir.listdir()] == ["test_fake.xml"]
+    root = qisys.qixml.read(results_dir.join("test_fake.xml").strpath).getroot()
+    assert root.get("tests") == "4"
+    assert root.get("failures") == "1"
+    assert len(root.findall("testsuite")) == 3
+    assert json.loads(tmpdir.join(".failed.json").read()) == ["test_fake"]
+    # The list of the test cases is cached until the binary changes
+    qitest_action("run", "--gtest-shards", "3", retcode=True)
+    assert counter.read().count("list") == 1
+
+
+def test_streaming_reports(tmpdir, qitest_action):
+    """ Test Streaming Reports """
+    tests = [
+        {"name": "test_ok", "cmd": [sys.executable, "--version"]},
+        {"name": "test_fail", "cmd": [sys.executable, "-c",
+                                      "print('\\x1b[31m' + 'x' * 100000); import sys; sys.exit(2)"]},
+    ]
+    tmpdir.join("qitest.json").write(json.dumps(tests))
+    junit_xml = tmpdir.join("reports", "results.xml")
+    events = tmpdir.join("reports", "events.jsonl")
+    qitest_action.chdir(tmpdir)
+    rc = qitest_action("run", "-j", "2", "--junit-xml", junit_xml.strpath,
+                       "--events", events.strpath, "--no-per-test-xml", retcode=True)
+    assert rc != 0
+    root = qisys.qixml.read(junit_xml.strpath).getroot()
+    test_suites = dict((x.get("name"), x) for x in root.findall("testsuite"))
+    assert sorted(test_suites) == ["test_fail", "test_ok"]
+    assert test_suites["test_ok"].get("failures") == "0"
+    assert test_suites["test_fail"].get("failures") == "1"
+    failure = test_suites["test_fail"].find("testcase/failure")
+    assert "bytes skipped" in failure.text
+    assert "\x1b" not in failure.text
+    lines = [json.loads(x) for x in events.read().splitlines()]
+    assert [x["event"] for x in lines if x["event"].startswith("run")] == ["run_start", "run_end"]
+    results = dict((x["test"], x["status"]) for x in lines if x["event"] == "result")
+    assert results == {"test_ok": "pass", "test_fail": "fail"}
+    # Only the aggregated report is kept
+    assert not tmpdir.join("test-results").listdir()
+    # The XML files of the tests are only read for the aggregated report
+    with mock.patch("qibuild.test_runner.read_test_cases") as read_test_cases:
+        qitest_action("run", "--events", events.strpath, retcode=True)
+        assert not read_test_cases.called
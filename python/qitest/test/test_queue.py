@@ -7,11 +7,13 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import json
 import time
 
 import qitest.runner
 import qitest.result
 import qitest.test_queue
+import qitest.timings
 from qisys import ui
 
 
@@ -31,9 +33,12 @@ class DummyLauncher(qitest.runner.TestLauncher):
         super(DummyLauncher, self).__init__()
         self.results = dict()
         self.project = DummyProject(tmpdir)
+        # test name -> index of the worker which ran it
+        self.worker_indexes = dict()
 
-    def launch(self, test):
+    def launch(self, test, worker_index=0):
         """ Launch """
+        self.worker_indexes[test["name"]] = worker_index
         default_time = 0.2
         default_result = qitest.result.TestResult(test)
         default_result.ok = True
@@ -47,6 +52,7 @@ class DummyLauncher(qitest.runner.TestLauncher):
             if fate.get('raises'):
                 raise Exception("Kaboom!")
         time.sleep(sleep_time)
+        result.time = sleep_time
         return result
 
 
@@ -104,6 +110,19 @@ def test_one_job(tmpdir):
     assert test_queue.ok
 
 
+def test_worker_index(tmpdir):
+    """ Test Tests Run At The Same Time Get Their Own Worker Index """
+    tests = [
+        {"name": "one"},
+        {"name": "two"},
+    ]
+    test_queue = qitest.test_queue.TestQueue(tests)
+    dummy_launcher = DummyLauncher(tmpdir)
+    test_queue.launcher = dummy_launcher
+    test_queue.run(num_jobs=2)
+    assert sorted(dummy_launcher.worker_indexes.values()) == [0, 1]
+
+
 def test_no_tests(tmpdir):
     """ Test No Tests """
     tests = list()
@@ -123,7 +142,7 @@ class SporadicallyFailingLauncher(qitest.runner.TestLauncher):
         self.num_runs = 0
         self.project = DummyProject(tmpdir)
 
-    def launch(self, test):
+    def launch(self, test, worker_index=0):
         """ Launch """
         result = qitest.result.TestResult(test)
         if self.num_runs == 3:
@@ -147,3 +166,71 @@ def test_repeat_until_fail(tmpdir):
     test_queue.launcher = fake_launcher
     test_queue.run(repeat_until_fail=3)
     assert test_queue.ok is False
+
+
+def test_several_launchers(tmpdir):
+    """ Test Several Launchers """
+    tests = [
+        {"name": "one"},
+        {"name": "two"},
+        {"name": "one"},
+    ]
+    foo_launcher = DummyLauncher(tmpdir.mkdir("foo"))
+    bar_launcher = DummyLauncher(tmpdir.mkdir("bar"))
+    fail_result = qitest.result.TestResult(tests[2])
+    fail_result.ok = False
+    fail_result.message = (ui.red, "[FAIL]")
+    bar_launcher.results = {"one": {"result": fail_result}}
+    launchers = [foo_launcher, foo_launcher, bar_launcher]
+    test_queue = qitest.test_queue.TestQueue(tests, launchers=launchers)
+    test_queue.run(num_jobs=2)
+    assert not test_queue.ok
+    assert len(test_queue.results) == 3
+    assert json.loads(tmpdir.join("foo", ".failed.json").read()) == list()
+    assert json.loads(tmpdir.join("bar", ".failed.json").read()) == ["one"]
+
+
+def test_longest_first(tmpdir):
+    """ Test Longest First """
+    tests = [
+        {"name": "short"},
+        {"name": "long"},
+        {"name": "new"},
+        {"name": "failing"},
+    ]
+    timing_db = qitest.timings.TimingDB(tmpdir.strpath)
+    for (name, duration, ok) in [("short", 0.1, True), ("long", 3, True), ("failing", 1, False)]:
+        result = qitest.result.TestResult({"name": name})
+        result.time = duration
+        result.ok = ok
+        timing_db.record(result)
+    timing_db.save()
+    test_queue = qitest.test_queue.TestQueue(list(tests))
+    test_queue.launcher = DummyLauncher(tmpdir)
+    test_queue.sort_tests()
+    assert [x["name"] for x in test_queue.tests] == ["new", "long", "failing", "short"]
+    test_queue = qitest.test_queue.TestQueue(list(tests))
+    test_queue.launcher = DummyLauncher(tmpdir)
+    test_queue.failed_first = True
+    test_queue.sort_tests()
+    assert [x["name"] for x in test_queue.tests] == ["failing", "new", "long", "short"]
+
+
+def test_timings_are_recorded(tmpdir):
+    """ Test Timings Are Recorded """
+    tests = [
+        {"name": "one"},
+        {"name": "two"},
+    ]
+    dummy_launcher = DummyLauncher(tmpdir)
+    dummy_launcher.results = {"two": {"sleep_time": 0.4}}
+    for _ in range(2):
+        test_queue = qitest.test_queue.TestQueue(list(tests))
+        test_queue.launcher = dummy_launcher
+        test_queue.run(num_jobs=1)
+    timing_db = qitest.timings.TimingDB(tmpdir.strpath)
+    assert len(timing_db.runs["one"]) == 2
+    assert timing_db.expected_time("two") > timing_db.expected_time("one")
+    assert timing_db.flakiness("one") == 0
+    # The longest test was started first during the second run
+    assert [x["name"] for x in test_queue.tests] == ["two", "one"]
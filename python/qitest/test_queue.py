@@ -11,7 +11,6 @@ import os
 import io
 import sys
 import json
-import time
 import signal
 import datetime
 import traceback
@@ -20,6 +19,7 @@ import collections
 import six
 
 import qitest.result
+import qitest.timings
 import qisys.command
 from qisys import ui
 
@@ -28,26 +28,47 @@ if six.PY3:
 else:
     import Queue
 
+# How often the main thread wakes up to handle Ctrl-C on Python 2
+JOIN_TIMEOUT = 0.1
+
 
 class TestQueue(object):
-    """ A class able to run tests in parallel """
+    """
+    A class able to run tests in parallel
+
+    :param launchers: when the tests come from several test suites, the
+                      launcher to use for each test. Otherwise, every test
+                      is run with ``self.launcher``
+
+    The tests expected to take the longest, according to the
+    :py:class:`qitest.timings.TimingDB` of their project, are started first.
+    When ``failed_first`` is set, the tests which failed during their last
+    run are started before the others.
+    """
 
     __test__ = False  # Tell PyTest to ignore this Test* named class: This is as test to collect
 
-    def __init__(self, tests):
+    def __init__(self, tests, launchers=None):
         """ TestQueue Init """
         self.tests = tests
+        self.launchers = launchers
         self.test_logger = TestLogger(tests)
         self.task_queue = Queue.Queue()
         self.launcher = None
+        self.failed_first = False
+        # A qitest.reporter.StreamingReporter, if any
+        self.reporter = None
         self.results = collections.OrderedDict()
         self.ok = False
         self._interrupted = False
         self.elapsed_time = 0
         self._workers = list()
+        self._timing_dbs = dict()
 
     def run(self, num_jobs=1, repeat_until_fail=0):
         """ Run all the tests """
+        if self.launcher or self.launchers:
+            self.sort_tests()
         if repeat_until_fail == 0:
             self._run_once(num_jobs)
             return self.ok
@@ -68,6 +89,9 @@ class TestQueue(object):
         if not self.tests:
             ui.warning("No tests selected for run")
         signal.signal(signal.SIGINT, self.sigint_handler)
+        self.results.clear()
+        if self.reporter:
+            self.reporter.on_run_start(len(self.tests))
         start = datetime.datetime.now()
         self._run(num_jobs=num_jobs)
         signal.signal(signal.SIGINT, signal.default_int_handler)
@@ -75,30 +99,70 @@ class TestQueue(object):
         delta = end - start
         self.elapsed_time = float(delta.microseconds) / 10**6 + delta.seconds
         self.summary()
+        self.write_timings()
+        if self.reporter:
+            self.reporter.on_run_end(self.ok, self.elapsed_time)
         return self.ok
 
     def _run(self, num_jobs=1):
         """ Helper function for ._run_once """
-        if not self.launcher:
+        if not self.launcher and not self.launchers:
             ui.error("test launcher not set, cannot run tests")
             return
         for i, test in enumerate(self.tests):
-            self.task_queue.put((test, i))
+            self.task_queue.put((test, i, self.get_launcher(i)))
         if num_jobs == 1:
             self.test_logger.single_job = True
         for i in range(0, num_jobs):
             worker = TestWorker(self.task_queue, i)
-            worker.launcher = self.launcher
-            worker.launcher.worker_index = i
             worker.test_logger = self.test_logger
+            worker.reporter = self.reporter
             worker.results = self.results
             self._workers.append(worker)
             worker.start()
-        while not self.task_queue.empty() and \
-                not self._interrupted:
-            time.sleep(0.1)
+        # The workers stop when the queue is empty, or when interrupted.
+        # On Python 2, join() without a timeout cannot be interrupted,
+        # and sigint_handler would only be called once all the tests ran
+        timeout = None if six.PY3 else JOIN_TIMEOUT
         for worker_thread in self._workers:
-            worker_thread.join()
+            while worker_thread.is_alive():
+                worker_thread.join(timeout)
+
+    def get_launcher(self, index):
+        """ Return the launcher of the test at the given index """
+        if self.launchers:
+            return self.launchers[index]
+        return self.launcher
+
+    def get_timing_db(self, index):
+        """ Return the timing database of the project of the test at the given index """
+        path = self.get_launcher(index).project.sdk_directory
+        if path not in self._timing_dbs:
+            self._timing_dbs[path] = qitest.timings.TimingDB(path)
+        return self._timing_dbs[path]
+
+    def sort_tests(self):
+        """ Sort the tests in the order they should be started """
+        keys = list()
+        for i, test in enumerate(self.tests):
+            timing_db = self.get_timing_db(i)
+            expected_time = timing_db.expected_time(test["name"])
+            if expected_time is None:
+                # Never run: may be long, and we want to know soon
+                expected_time = float("inf")
+            failed = self.failed_first and timing_db.recently_failed(test["name"])
+            keys.append((not failed, -expected_time, i))
+        order = [x[-1] for x in sorted(keys)]
+        self.tests = [self.tests[i] for i in order]
+        if self.launchers:
+            self.launchers = [self.launchers[i] for i in order]
+
+    def write_timings(self):
+        """ Add the results of the run to the timing database of each project """
+        for index, result in self.results.items():
+            self.get_timing_db(index).record(result)
+        for timing_db in self._timing_dbs.values():
+            timing_db.save()
 
     def summary(self):
         """
@@ -126,7 +190,7 @@ class TestQueue(object):
                     ui.info_count(i, num_failed,
                                   ui.blue, failure.test["name"].ljust(max_len + 2),
                                   ui.reset, *failure.message)
-        self.write_failures(failures)
+        self.write_failures()
 
     def sigint_handler(self, *_args):
         """
@@ -139,7 +203,7 @@ class TestQueue(object):
         def double_sigint(_signum, _frame):
             """ Double SigInt """
             sys.exit("Exiting main program \n", "This may leave orphan processes")
-        qisys.command.SIGINT_EVENT.set()
+        qisys.command.interrupt()
         ui.warning("\n!!!",
                    "Interrupted by user, stopping every process.\n"
                    "This may take a few seconds")
@@ -148,13 +212,23 @@ class TestQueue(object):
             worker.stop()
         signal.signal(signal.SIGINT, double_sigint)
 
-    def write_failures(self, failures):
-        """ Write Failures """
-        path = self.launcher.project.sdk_directory
-        fail_json = os.path.join(path, ".failed.json")
-        fail_names = [x.test["name"] for x in failures]
-        with open(fail_json, "w") as fp:
-            json.dump(fail_names, fp)
+    def write_failures(self):
+        """ Write the names of the failing tests, in the sdk directory of each project """
+        fail_names = collections.OrderedDict()
+        for i in range(len(self.tests)):
+            path = self.get_launcher(i).project.sdk_directory
+            fail_names.setdefault(path, list())
+        for index, result in self.results.items():
+            if result.ok is False:
+                path = self.get_launcher(index).project.sdk_directory
+                # The shards of a test are run again with it
+                name = result.test.get("shard_of", result.test["name"])
+                if name not in fail_names[path]:
+                    fail_names[path].append(name)
+        for path, names in fail_names.items():
+            fail_json = os.path.join(path, ".failed.json")
+            with open(fail_json, "w") as fp:
+                json.dump(names, fp)
 
 
 class TestWorker(threading.Thread):
@@ -170,8 +244,8 @@ class TestWorker(threading.Thread):
         super(TestWorker, self).__init__(name="TestWorker#%i" % worker_index)
         self.index = worker_index
         self.queue = queue
-        self.launcher = None
         self.test_logger = None
+        self.reporter = None
         self.results = dict()
         self._should_stop = False
 
@@ -183,20 +257,25 @@ class TestWorker(threading.Thread):
         """ Run """
         while not self._should_stop:
             try:
-                test, index = self.queue.get_nowait()
+                test, index, launcher = self.queue.get_nowait()
             except Queue.Empty:
                 return
             self.test_logger.on_start(test, index)
+            if self.reporter:
+                self.reporter.on_start(test, launcher, self.index)
             result = None
             try:
-                result = self.launcher.launch(test)
+                result = launcher.launch(test, worker_index=self.index)
             except Exception as e:
                 result = qitest.result.TestResult(test)
                 result.ok = False
                 result.message = self.message_for_exception(e)
             if not self._should_stop:
                 self.test_logger.on_completed(test, index, result.message)
-            self.results[test["name"]] = result
+            if self.reporter:
+                self.reporter.on_result(result, launcher)
+            # Tests of different projects may have the same name
+            self.results[index] = result
             self.queue.task_done()
 
     @staticmethod
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012-2021 SoftBank Robotics. All rights reserved.
+# Use of this source code is governed by a BSD-style license (see the COPYING file).
+"""
+History of the test runs of a project.
+
+The last runs of each test (duration, outcome, and whether it timed out)
+are stored in the sdk directory of the project. They are used to start
+the longest tests first, and by ``qitest stats``.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+import json
+import time
+
+# Number of runs kept for each test
+MAX_RUNS = 20
+# Number of runs used to guess how long the next one will take
+NUM_RECENT_RUNS = 5
+
+
+class TimingDB(object):
+    """ Durations and outcomes of the last runs of the tests of a project """
+
+    def __init__(self, sdk_directory):
+        """ TimingDB Init """
+        self.path = os.path.join(sdk_directory, ".timings.json")
+        self.runs = dict()
+        self.load()
+
+    def load(self):
+        """ Read the history, ignoring a missing or corrupted file """
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as fp:
+                self.runs = json.load(fp)
+        except ValueError:
+            self.runs = dict()
+
+    def save(self):
+        """ Save """
+        with open(self.path, "w") as fp:
+            json.dump(self.runs, fp, indent=2, sort_keys=True)
+
+    def record(self, result):
+        """ Add the :py:class:`.TestResult` of a run to the history """
+        if result.ok is None:
+            # Interrupted
+            return
+        runs = self.runs.setdefault(result.test["name"], list())
+        runs.append({
+            "time": round(result.time, 3),
+            "ok": bool(result.ok),
+            "timeout": bool(result.timeout),
+            "date": int(time.time()),
+        })
+        del runs[:-MAX_RUNS]
+
+    def expected_time(self, name):
+        """ Median duration of the last runs, None if the test never ran """
+        runs = self.runs.get(name)
+        if not runs:
+            return None
+        times = sorted(x["time"] for x in runs[-NUM_RECENT_RUNS:])
+        return times[len(times) // 2]
+
+    def recently_failed(self, name):
+        """ True if the last run of the test failed """
+        runs = self.runs.get(name)
+        return bool(runs) and not runs[-1]["ok"]
+
+    def flakiness(self, name):
+        """ Ratio of the runs whose outcome differs from the previous one """
+        runs = self.runs.get(name, list())
+        if len(runs) < 2:
+            return 0.0
+        flips = sum(1 for (a, b) in zip(runs, runs[1:]) if a["ok"] != b["ok"])
+        return float(flips) / (len(runs) - 1)
+
+    def get_stats(self):
+        """ Return a list of dicts with the stats of each test """
+        res = list()
+        for name, runs in sorted(self.runs.items()):
+            if not runs:
+                continue
+            times = [x["time"] for x in runs]
+            res.append({
+                "name": name,
+                "runs": len(runs),
+                "failures": len([x for x in runs if not x["ok"]]),
+                "timeouts": len([x for x in runs if x["timeout"]]),
+                "mean_time": sum(times) / len(times),
+                "max_time": max(times),
+                "flakiness": self.flakiness(name),
+            })
+        return res
@@ -7,6 +7,8 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import qisys.sh
+import qisys.daemon
 from qitoolchain.toolchain import Toolchain
 from qitoolchain.toolchain import get_tc_names
 
@@ -22,7 +24,11 @@ def get_toolchain(tc_name, raises=True):
         if raises:
             raise Exception(mess)
         return None
-    return Toolchain(tc_name)
+    # Kept loaded when running in a qi daemon
+    config_path = qisys.sh.get_config_path("qi", "toolchains", "%s.xml" % tc_name)
+    db_path = qisys.sh.get_share_path("qi", "toolchains", "%s.xml" % tc_name)
+    return qisys.daemon.cached(("toolchain", tc_name), [config_path, db_path],
+                               lambda: Toolchain(tc_name))
 
 
 def ensure_name_is_valid(tc_name):
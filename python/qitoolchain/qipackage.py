@@ -85,7 +85,7 @@ class QiPackage(object):
             element.set("subpkg", self.subpkg)
         return element
 
-    def install(self, destdir, components=None, release=True):
+    def install(self, destdir, components=None, release=True, copier=None):
         """
         Install the given components of the package to the given destination.
         Will read:
@@ -95,26 +95,28 @@ class QiPackage(object):
           installing *runtime* component
         Note that when installing 'test' component, only the
         install_manifest_test.txt manifest file will be read.
+        The files are copied by ``copier``, a :py:class:`qisys.sh.FileCopier`, if given.
         """
         if self.subpkg:
             return list()
         if not components:
-            return self._install_all(destdir)
+            return self._install_all(destdir, copier=copier)
         installed_files = list()
         for component in components:
             installed_for_component = self._install_component(component,
-                                                              destdir, release=release)
+                                                              destdir, release=release,
+                                                              copier=copier)
             installed_files.extend(installed_for_component)
         return installed_files
 
-    def _install_all(self, destdir):
+    def _install_all(self, destdir, copier=None):
         """ Install All """
         def filter_fun(x):
             """ Filter package.xml """
             return x != "package.xml"
-        return qisys.sh.install(self.path, destdir, filter_fun=filter_fun)
+        return qisys.sh.install(self.path, destdir, filter_fun=filter_fun, copier=copier)
 
-    def _install_component(self, component, destdir, release=True):
+    def _install_component(self, component, destdir, release=True, copier=None):
         """ Install Component """
         installed_files = list()
         manifest_name = "install_manifest_%s.txt" % component
@@ -133,11 +135,11 @@ class QiPackage(object):
                 def filter_fun(x):
                     """ Filter Function """
                     return qisys.sh.is_runtime(x) and x != "package.xml"
-                return qisys.sh.install(self.path, destdir, filter_fun=filter_fun)
+                return qisys.sh.install(self.path, destdir, filter_fun=filter_fun, copier=copier)
             # avoid install masks and package.xml
             mask.append(r"exclude .*\.mask")
             mask.append(r"exclude package\.xml")
-            return self._install_with_mask(destdir, mask)
+            return self._install_with_mask(destdir, mask, copier=copier)
         else:
             with open(manifest_path, "r") as fp:
                 lines = fp.readlines()
@@ -145,7 +147,7 @@ class QiPackage(object):
                     line = line.strip()
                     src = os.path.join(self.path, line)
                     dest = os.path.join(destdir, line)
-                    qisys.sh.install(src, dest)
+                    qisys.sh.install(src, dest, copier=copier)
                     installed_files.append(line)
             return installed_files
 
@@ -168,7 +170,7 @@ class QiPackage(object):
                     raise Exception(mess)
             return mask
 
-    def _install_with_mask(self, destdir, mask):
+    def _install_with_mask(self, destdir, mask, copier=None):
         """ Install With Mask """
 
         def get_match(line, src):
@@ -191,7 +193,7 @@ class QiPackage(object):
                 if match:
                     return False
             return True
-        return qisys.sh.install(self.path, destdir, filter_fun=filter_fun)
+        return qisys.sh.install(self.path, destdir, filter_fun=filter_fun, copier=copier)
 
     def load_package_xml(self):
         """